@@ -0,0 +1,81 @@
+"""
+Micro benchmark of the profanity classification
+
+Compare the old per word predict and predict_prob calls with the
+batched and cached ProfanityExtractor.run on the same results
+
+`python benchmarks/bench_classify.py --words 20000`
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# bleepy is in the parent directory of the benchmarks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+
+from profanity_check import predict, predict_prob
+
+from bleepy import ProfanityDetector, ProfanityExtractor
+from bleepy.bleepy import dump_result, get_word_cache
+
+WORDS = ("the", "and", "you", "that", "was", "for", "are", "with", "his", "they",
+         "ang", "ng", "sa", "na", "mga", "hindi", "ako", "ikaw", "siya", "kami",
+         "damn", "shit", "gago", "bobo")
+
+
+def make_results(total, per_result):
+    """Return list of results txt"""
+    results = []
+    start = 0.0
+    for _ in range(total // per_result):
+        words = []
+        for _ in range(per_result):
+            end = start + 0.3
+            words.append({"conf": 1.0, "end": end, "start": start,
+                          "word": random.choice(WORDS)})
+            start = end + 0.1
+        results.append(dump_result(words))
+    return results
+
+
+def legacy_run(results):
+    """The old per word classification"""
+    detector = ProfanityDetector()
+    profanity = []
+    for txt in results:
+        for word in detector.extract_list_of_words(txt):
+            if bool(predict([word["word"]])):
+                word["predict_prob"] = predict_prob([word["word"]])[0]
+                profanity.append(word)
+    return profanity
+
+
+def main():
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, default=20000, help="total number of words")
+    parser.add_argument("--per-result", type=int, default=20, help="words in one result")
+    args = parser.parse_args()
+
+    random.seed(0)
+    results = make_results(args.words, args.per_result)
+    total = len(results) * args.per_result
+
+    begin = time.perf_counter()
+    legacy_run(results)
+    legacy = time.perf_counter() - begin
+    print(f"legacy   {total / legacy:>12,.0f} words/s ({legacy:.3f}s)")
+
+    get_word_cache().clear()
+    begin = time.perf_counter()
+    ProfanityExtractor().run(results)
+    batched = time.perf_counter() - begin
+    print(f"batched  {total / batched:>12,.0f} words/s ({batched:.3f}s)")
+    print(f"speedup  {legacy / batched:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
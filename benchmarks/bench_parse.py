@@ -0,0 +1,111 @@
+"""
+Micro benchmark of parsing the recognizer results
+
+Compare the words per second of the ProfanityDetector json parser
+with the old string splitting parser
+
+`python benchmarks/bench_parse.py --words 200000`
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# bleepy is in the parent directory of the benchmarks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+
+from bleepy import ProfanityDetector
+
+WORDS = ("the", "and", "you", "that", "was", "for", "are", "with", "his", "they",
+         "ang", "ng", "sa", "na", "mga", "hindi", "ako", "ikaw", "siya", "kami")
+
+
+def make_result(count, start = 0.0):
+    """Return a result txt in the same layout as KaldiRecognizer obj.Result()"""
+    items = []
+    words = []
+    for _ in range(count):
+        word = random.choice(WORDS)
+        end = start + random.uniform(0.1, 0.6)
+        items.append(
+            "{\n"+
+            f"      \"conf\" : {random.random():.6f},\n"+
+            f"      \"end\" : {end:.6f},\n"+
+            f"      \"start\" : {start:.6f},\n"+
+            f"      \"word\" : \"{word}\"\n"+
+            "    }")
+        words.append(word)
+        start = end + random.uniform(0.0, 0.3)
+    txt = "{\n  \"result\" : [" + ", ".join(items) + "],\n"
+    txt += f"  \"text\" : \"{' '.join(words)}\"\n}}"
+    return txt, start
+
+
+def legacy_extract_list_of_words(txt):
+    """The old string splitting parser of ProfanityDetector"""
+    words = []
+    if "result" in txt:
+        a_char = txt.split('[')
+        b_char = a_char[1].split(']')
+        c_char = b_char[0].split(', ')
+        for i, _ in enumerate(c_char):
+            c_char[i] = c_char[i].strip("{}")
+            c_char[i] = c_char[i].replace('\n','')
+            c_char[i] = c_char[i].replace('\"','')
+        for item in c_char:
+            attrs= item.split(',')
+            tempdict = {}
+            for attr in attrs:
+                data = attr.split(':')
+                tempdict[data[0].strip()] = data[1].strip()
+            words.append(tempdict)
+    return words
+
+
+def legacy_to_float(words):
+    """The old parser returns strings, the blocker converts it with float()"""
+    for word in words:
+        word["start"] = float(word["start"])
+        word["end"] = float(word["end"])
+        word["conf"] = float(word["conf"])
+
+
+def bench(name, parse, results, total, repeat):
+    """Print the best words per second of the parser"""
+    best = float("inf")
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        for txt in results:
+            parse(txt)
+        best = min(best, time.perf_counter() - begin)
+    print(f"{name:<8} {total / best:>14,.0f} words/s ({best:.3f}s)")
+    return total / best
+
+
+def main():
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, default=200000, help="total number of words")
+    parser.add_argument("--per-result", type=int, default=20, help="words in one result")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    results = []
+    start = 0.0
+    for _ in range(args.words // args.per_result):
+        txt, start = make_result(args.per_result, start)
+        results.append(txt)
+    total = len(results) * args.per_result
+
+    detector = ProfanityDetector()
+    legacy = bench("legacy", lambda txt: legacy_to_float(legacy_extract_list_of_words(txt)),
+                   results, total, args.repeat)
+    current = bench("json", detector.extract_list_of_words, results, total, args.repeat)
+    print(f"speedup  {current / legacy:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
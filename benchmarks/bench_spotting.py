@@ -0,0 +1,78 @@
+"""
+Benchmark of the keyword spotting
+
+Decode the same media with the full vocabulary and with the grammar of
+the profane words of the lexicon, then compare the real time factor and
+the recall of the profanities the full decoding found
+
+`python benchmarks/bench_spotting.py --model vosk-model-small-en-us video.mp4`
+`python benchmarks/bench_spotting.py --stub video.mp4` checks the benchmark without a model
+"""
+import argparse
+import contextlib
+import functools
+import os
+import sys
+
+# bleepy is in the parent directory of the benchmarks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+
+from stub import StubRecognizer
+
+from bleepy import Metrics, ProfanityExtractor, SpeechToText
+from bleepy.batch import get_media_file
+from bleepy.bleepy import get_languages
+
+
+def decode(media, model, lang, spotting, recognizer_factory = None):
+    """Return real time factor and the profanities"""
+    metrics = Metrics()
+    stt = SpeechToText(model, recognizer_factory)
+    stt.set_spotting(spotting, lang)
+    extractor = ProfanityExtractor(get_languages(lang))
+    for stage in (stt, extractor):
+        stage.set_metrics(metrics)
+        stage.set_verbose(False)
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            stt.run(media)
+            extractor.run(stt.get_results())
+    return metrics.get_value("stt.realtime_factor", 0.0), extractor.get_profanities()
+
+
+def get_recall(found, expected, slack = 0.2):
+    """Return fraction of the expected profanities overlapped by a found one"""
+    if len(expected) == 0:
+        return 1.0
+    hits = sum(1 for word in expected
+               if any(other.start < word.end + slack and word.start < other.end + slack
+                      for other in found))
+    return hits / len(expected)
+
+
+def main():
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("media", help="video or audio file")
+    parser.add_argument("--model", default="model",
+                        help="Vosk model that supports grammars, like the small models")
+    parser.add_argument("--lang", default="english")
+    parser.add_argument("--stub", action="store_true",
+                        help="use the stub recognizer, the speed is then not meaningful")
+    args = parser.parse_args()
+
+    factory = functools.partial(StubRecognizer, profanity_every=5) if args.stub else None
+    media = get_media_file(args.media)
+    full_rtf, full = decode(media, args.model, args.lang, False, factory)
+    spot_rtf, spotted = decode(media, args.model, args.lang, True, factory)
+
+    print(f"full      rtf {full_rtf:.3f} profanities {len(full)}")
+    print(f"spotting  rtf {spot_rtf:.3f} profanities {len(spotted)}")
+    if spot_rtf > 0:
+        print(f"speedup   {full_rtf / spot_rtf:.1f}x")
+    print(f"recall    {get_recall(spotted, full):.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Benchmark suite of bleepy
+
+Generate synthetic media with FFMPEG lavfi sources, then time
+SpeechToText (with the stub recognizer), ProfanityExtractor, each engine
+of ProfanityBlocker and the streaming pipeline end to end.
+The results are saved as JSON, and can be compared to a previous run
+to catch throughput regressions.
+
+`python benchmarks/run.py --durations 60 600 --output bench.json`
+`python benchmarks/run.py --compare bench.json`
+"""
+import argparse
+import contextlib
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# bleepy is in the parent directory of the benchmarks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+
+from stub import StubRecognizer
+from synthetic import make_bleep, make_video
+
+import bleepy
+from bleepy import (AudioFile, ProfanityBlocker, ProfanityExtractor,
+                    SpeechToText, VideoFile)
+from bleepy.bleepy import get_word_cache
+
+ENGINES = ("filter", "smart", "remux", "pcm")
+
+
+def measure(name, duration, function, items = 0):
+    """Run the function and return the result of the benchmark"""
+    began = time.perf_counter()
+    began_cpu = time.process_time()
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            function()
+    seconds = time.perf_counter() - began
+    result = {
+        "name": name,
+        "duration": duration,
+        "seconds": round(seconds, 4),
+        "cpu_seconds": round(time.process_time() - began_cpu, 4),
+        "realtime_factor": round(seconds / duration, 6),
+    }
+    if items:
+        result["items"] = items
+        result["items_per_second"] = round(items / seconds, 1)
+    print(f"{name:<24} {duration:>6}s media {seconds:>9.3f}s"+
+          f"  rtf {result['realtime_factor']:.4f}", file=sys.stderr)
+    return result
+
+
+def get_ffmpeg_version():
+    """Return first line of ffmpeg -version"""
+    try:
+        output = subprocess.run(['ffmpeg', '-version'], capture_output=True, check=False)
+        return output.stdout.decode().split("\n", 1)[0]
+    except OSError:
+        return ""
+
+
+def run_duration(duration, args):
+    """Run the benchmarks of one media duration"""
+    os.makedirs(args.directory, exist_ok=True)
+    video = VideoFile()
+    video.set_file(make_video(os.path.join(args.directory, f"video{duration}.mp4"), duration))
+    bleep = AudioFile()
+    bleep.set_file(make_bleep(os.path.join(args.directory, "bleep.wav")))
+    factory = functools.partial(StubRecognizer, work=args.work)
+    results = []
+
+    stt = SpeechToText(recognizer_factory=factory)
+    stt.set_workers(args.workers)
+    results.append(measure("stt", duration, lambda: stt.run(video)))
+
+    words = sum(len(json.loads(result).get("result", [])) for result in stt.get_results())
+    extractor = ProfanityExtractor()
+    get_word_cache().clear()
+    results.append(measure("extract", duration,
+                           lambda: extractor.run(stt.get_results()), words))
+    profanities = extractor.get_profanities()
+
+    for engine in args.engines:
+        blocker = ProfanityBlocker(engine)
+        blocker.set_save_directory(os.path.join(args.directory, "out"))
+        blocker.set_clips_directory(os.path.join(args.directory, "clips"))
+        results.append(measure(f"block[{engine}]", duration,
+                               lambda: blocker.run(video, bleep, profanities),
+                               len(profanities)))
+        if blocker.get_file_location() != "":
+            os.remove(blocker.get_file_location())
+
+    def end_to_end():
+        stream_stt = SpeechToText(recognizer_factory=factory)
+        stream_stt.set_workers(args.workers)
+        blocker = ProfanityBlocker()
+        blocker.set_save_directory(os.path.join(args.directory, "out"))
+        get_word_cache().clear()
+        blocker.run_stream(video, bleep, ProfanityExtractor().stream(stream_stt.stream(video)))
+        if blocker.get_file_location() != "":
+            os.remove(blocker.get_file_location())
+
+    results.append(measure("end_to_end[filter]", duration, end_to_end))
+    return results
+
+
+def compare(results, previous, tolerance):
+    """Print the regressions, return True if there is none"""
+    old = {(result["name"], result["duration"]): result for result in previous["results"]}
+    passed = True
+    for result in results:
+        before = old.get((result["name"], result["duration"]))
+        if before is None:
+            continue
+        change = result["seconds"] / before["seconds"] - 1 if before["seconds"] else 0.0
+        status = "REGRESSION" if change > tolerance else "ok"
+        passed = passed and change <= tolerance
+        print(f"{status:<10} {result['name']:<24} {result['duration']:>6}s"+
+              f" {before['seconds']:.3f}s -> {result['seconds']:.3f}s ({change:+.1%})",
+              file=sys.stderr)
+    return passed
+
+
+def main():
+    """Run the benchmark suite"""
+    parser = argparse.ArgumentParser(description="Benchmark suite of bleepy")
+    parser.add_argument("--durations", type=int, nargs="+", default=[60],
+                        help="seconds of the synthetic media")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES),
+                        choices=ProfanityBlocker.ENGINES)
+    parser.add_argument("--workers", type=int, default=1, help="workers of the STT")
+    parser.add_argument("--work", type=float, default=0.0,
+                        help="CPU work of the stub recognizer for each second of audio")
+    parser.add_argument("--directory", default=".bench", help="directory of the media")
+    parser.add_argument("--output", default="", help="JSON file of the results")
+    parser.add_argument("--compare", default="", help="JSON file of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="slowdown allowed before it is a regression")
+    args = parser.parse_args()
+
+    results = []
+    for duration in args.durations:
+        results.extend(run_duration(duration, args))
+
+    report = {
+        "version": bleepy.get_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "ffmpeg": get_ffmpeg_version(),
+        "timestamp": time.time(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as previous:
+            if not compare(results, json.load(previous), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
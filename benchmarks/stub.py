@@ -0,0 +1,104 @@
+"""
+Stub recognizer of the benchmarks
+
+Behaves like a KaldiRecognizer with SetWords(True), but the words and
+their timings are deterministic, generated from the audio position,
+so SpeechToText can be timed without a Vosk model.
+"""
+import json
+
+CLEAN = ("the", "and", "you", "that", "was", "for", "are", "with", "his", "they",
+         "ang", "ng", "sa", "na", "mga", "hindi", "ako", "ikaw", "siya", "kami")
+PROFANE = ("fuck", "shit", "gago", "putangina")
+
+
+def get_word(index, profanity_every = 20):
+    """Return the word at index, every profanity_every word is profane"""
+    if profanity_every and index % profanity_every == profanity_every - 1:
+        return PROFANE[(index // profanity_every) % len(PROFANE)]
+    return CLEAN[(index * 7) % len(CLEAN)]
+
+
+class StubRecognizer:
+    """
+    Stub Recognizer
+
+    A word every word_interval seconds, lasting word_duration, and
+    a final result every utterance seconds.
+    work = seconds of CPU spent for each second of audio, to mimic decoding
+    grammar = list of the words it can hear, the other words are [unk]
+    """
+
+    def __init__(self, model = "", sample_rate = 16000, grammar = None, word_interval = 0.4,
+                 word_duration = 0.3, utterance = 5.0, profanity_every = 20, work = 0.0):
+        """Init stub recognizer"""
+        self.__sample_rate = sample_rate
+        self.__grammar = None if grammar is None else set(grammar)
+        self.__word_interval = word_interval
+        self.__word_duration = word_duration
+        self.__utterance = utterance
+        self.__profanity_every = profanity_every
+        self.__work = work
+        self.__time = 0.0
+        self.__emitted = 0 # index of the next word to emit
+        self.__next_result = utterance
+
+    def SetWords(self, words): # pylint: disable=invalid-name
+        """Same as KaldiRecognizer, words are always set"""
+
+    def SetPartialWords(self, words): # pylint: disable=invalid-name
+        """Same as KaldiRecognizer, partial words are always set"""
+
+    def __words(self, until, final):
+        """Return the words that end before until"""
+        words = []
+        index = self.__emitted
+        while index * self.__word_interval + self.__word_duration <= until:
+            start = index * self.__word_interval
+            word = get_word(index, self.__profanity_every)
+            if self.__grammar is not None and word not in self.__grammar:
+                word = "[unk]"
+            words.append({"conf": 1.0, "end": round(start + self.__word_duration, 3),
+                          "start": round(start, 3),
+                          "word": word})
+            index += 1
+        if final:
+            self.__emitted = index
+        return words
+
+    def __spend(self, seconds):
+        """Spend CPU like a decoder"""
+        if self.__work > 0:
+            total = 0
+            for i in range(int(seconds * self.__work * 2000000)):
+                total += i
+
+    def AcceptWaveform(self, data): # pylint: disable=invalid-name
+        """Accept audio, return True when a result is final"""
+        seconds = len(data) / 2 / self.__sample_rate
+        self.__spend(seconds)
+        self.__time += seconds
+        if self.__time >= self.__next_result:
+            self.__next_result += self.__utterance
+            return True
+        return False
+
+    def __result(self, words):
+        """Return result txt like KaldiRecognizer"""
+        if not words:
+            return json.dumps({"text": ""})
+        return json.dumps({"result": words, "text": " ".join(w["word"] for w in words)})
+
+    def Result(self): # pylint: disable=invalid-name
+        """Return the final result"""
+        return self.__result(self.__words(self.__time, True))
+
+    def FinalResult(self): # pylint: disable=invalid-name
+        """Return the last final result"""
+        return self.__result(self.__words(self.__time, True))
+
+    def PartialResult(self): # pylint: disable=invalid-name
+        """Return the partial result"""
+        words = self.__words(self.__time, False)
+        return json.dumps({"partial": " ".join(w["word"] for w in words),
+                           "partial_result": words})
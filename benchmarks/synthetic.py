@@ -0,0 +1,32 @@
+"""Synthetic media of the benchmarks, generated by FFMPEG lavfi sources"""
+import os
+import subprocess
+
+
+def make_video(file, duration = 60, size = "640x360", rate = 25, gop = 50):
+    """Make a video of testsrc and a sine tone, h264 and aac"""
+    if os.path.exists(file):
+        return file
+    subprocess.run(
+        ['ffmpeg', '-y', '-loglevel', 'error',
+         '-f', 'lavfi', '-i', f"testsrc=duration={duration}:size={size}:rate={rate}",
+         '-f', 'lavfi', '-i', f"sine=frequency=300:duration={duration}",
+         '-shortest', '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(gop),
+         '-pix_fmt', 'yuv420p', '-c:a', 'aac', file], check=True)
+    return file
+
+
+def make_audio(file, duration = 60, frequency = 300):
+    """Make an audio of a sine tone, the codec is chosen by the extension"""
+    if os.path.exists(file):
+        return file
+    subprocess.run(
+        ['ffmpeg', '-y', '-loglevel', 'error',
+         '-f', 'lavfi', '-i', f"sine=frequency={frequency}:duration={duration}", file],
+        check=True)
+    return file
+
+
+def make_bleep(file, duration = 1):
+    """Make a bleep sound of 1000 Hz"""
+    return make_audio(file, duration, 1000)
@@ -1,7 +1,17 @@
 """Bleepy Package"""
-from .bleepy import (AudioFile, File, MediaFile, ProfanityBlocker,
+from .bleepy import (AudioFile, BleepIntervals, EncoderProbe, File,
+                     MediaFile, ModelRegistry, ProbeCache, ProfanityBlocker,
                      ProfanityDetector, ProfanityExtractor, SpeechToText,
-                     VideoFile)
+                     SubprocessLimiter, VideoFile, WordRecord,
+                     get_encoder_probe, get_model_registry, get_probe_cache,
+                     get_subprocess_limiter)
+from .batch import BatchRunner
+from .cache import TranscriptCache
+from .daemon import BleepyDaemon
+from .edl import EditDecisionList
+from .lexicon import Lexicon, get_lexicon
+from .live import LiveBleeper
+from .metrics import Metrics
 
 VERSION = "0.0.1"
 
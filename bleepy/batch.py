@@ -0,0 +1,306 @@
+"""
+Batch runner of bleepy
+
+Run every media file of a directory or glob through
+SpeechToText, ProfanityExtractor and ProfanityBlocker in a pool of workers.
+The status of each file is saved in a manifest, so a crashed run
+can be resumed without redoing finished files.
+
+`python -m bleepy.batch videos --bleep bleep.mp3 --workers 4`
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from .bleepy import (AudioFile, ProfanityBlocker, ProfanityExtractor,
+                     SpeechToText, VideoFile, check_languages, get_probe_cache)
+from .cache import TranscriptCache
+from .lexicon import get_lexicon
+from .metrics import Metrics
+from .workspace import remove_stale_workspaces
+
+
+def get_media_file(file):
+    """Return VideoFile or AudioFile of the file by its extension"""
+    audio = AudioFile()
+    media = audio if audio.is_allowed_ext(audio.get_extension(file)) else VideoFile()
+    media.set_file(file)
+    return media
+
+
+# Lexicon files already loaded by the process
+LOADED_LEXICONS = set()
+
+
+def load_lexicon(file):
+    """Load the lexicon file into the lexicon of the process, once by each process"""
+    if file not in LOADED_LEXICONS:
+        get_lexicon().load(file)
+        LOADED_LEXICONS.add(file)
+
+
+def process_file(file, options):
+    """
+    Process one file in a worker, return the entry of the manifest
+
+    The model and the lexicon are loaded once by each worker
+    and kept for its next files
+    """
+    began = time.time()
+    entry = {"status": "failed", "started": began}
+    try:
+        if options["cache_directory"]:
+            get_probe_cache().set_directory(os.path.join(options["cache_directory"], "probes"))
+        if options["lexicon"]:
+            load_lexicon(options["lexicon"])
+        media = get_media_file(file)
+        bleep = AudioFile()
+        bleep.set_file(options["bleep"])
+        entry["duration"] = media.get_duration()
+
+        stt = SpeechToText(options["model"])
+        stt.set_vad(options["vad"])
+        stt.set_spotting(options["spotting"], options["lang"])
+        extractor = ProfanityExtractor(options["lang"])
+        blocker = ProfanityBlocker(options["engine"])
+        metrics = Metrics()
+        for stage in (stt, extractor, blocker):
+            stage.set_metrics(metrics)
+            stage.set_verbose(options["verbose"])
+        blocker.set_save_directory(options["save_directory"])
+        blocker.set_clips_directory(options["clips_directory"])
+        blocker.set_encoder(options["encoder"], options["preset"], options["threads"],
+                            options["crf"])
+        if options["cache_directory"]:
+            cache = TranscriptCache(options["cache_directory"])
+            stt.set_cache(cache)
+            extractor.set_cache(cache)
+
+        stt.run(media)
+        extractor.run(stt.get_results())
+        profanities = extractor.get_profanities()
+        blocker.run(media, bleep, profanities)
+
+        if blocker.get_file_location() == "":
+            entry["error"] = "Blocked file was not created"
+        else:
+            entry["status"] = "done"
+            entry["output"] = os.path.abspath(blocker.get_file_location())
+            entry["profanities"] = len(profanities)
+        entry["metrics"] = metrics.to_dict()
+    except (Exception, SystemExit) as error: # pylint: disable=broad-except
+        entry["error"] = repr(error)
+    entry["finished"] = time.time()
+    entry["seconds"] = entry["finished"] - began
+    return entry
+
+
+class BatchRunner:
+    """
+    Batch Runner
+
+    manifest = json file of the status, timings and output of each file
+    """
+
+    def __init__(self, manifest = "bleepy-manifest.json", workers = 2):
+        """Init batch runner"""
+        self.__manifest_file = manifest
+        self.__workers = max(1, int(workers))
+        self.__options = {
+            "model": "model",
+            "lang": "english",
+            "engine": "filter",
+            "bleep": "",
+            "save_directory": "bleeped video",
+            "clips_directory": "clips",
+            "cache_directory": "",
+            "verbose": False,
+            "vad": False,
+            "lexicon": "",
+            "spotting": False,
+            "encoder": "auto",
+            "preset": "veryfast",
+            "threads": 0,
+            "crf": 23,
+        }
+        self.__manifest = {"files": {}, "runs": []}
+        self.load_manifest()
+
+    def set_workers(self, workers):
+        """Set number of workers"""
+        self.__workers = max(1, int(workers))
+
+    def set_option(self, name, value):
+        """
+        Set option of the pipeline
+
+        model, lang, engine, bleep, save_directory, clips_directory,
+        cache_directory (empty to not use the TranscriptCache),
+        verbose (print the progress of each file),
+        vad (skip the audio without speech in the STT),
+        lexicon (lexicon file added to the built in lexicon),
+        spotting (the STT only hears the profane words of the lexicon),
+        encoder, preset, threads, crf (video encoding, see ProfanityBlocker.set_encoder)
+        """
+        if name not in self.__options:
+            print(f"Warning: Option ({name}) not found. Options are {list(self.__options)}")
+            sys.exit()
+        if name == "lang":
+            check_languages(value)
+        self.__options[name] = value
+
+    def get_workers(self):
+        """Get number of workers"""
+        return self.__workers
+
+    def get_options(self):
+        """Get options of the pipeline"""
+        return self.__options
+
+    def get_manifest(self):
+        """Get manifest"""
+        return self.__manifest
+
+    def get_manifest_file(self):
+        """Get manifest file name"""
+        return self.__manifest_file
+
+    def load_manifest(self):
+        """Load manifest file if exist"""
+        if os.path.exists(self.get_manifest_file()):
+            with open(self.get_manifest_file(), encoding="utf-8") as file:
+                self.__manifest = json.load(file)
+
+    def save_manifest(self):
+        """Save manifest, replace the file at once so it is never half written"""
+        temp = f"{self.get_manifest_file()}.tmp"
+        with open(temp, "w", encoding="utf-8") as file:
+            json.dump(self.__manifest, file, indent=2)
+        os.replace(temp, self.get_manifest_file())
+
+    def collect_files(self, source):
+        """Return sorted list of media files of a directory or glob"""
+        if os.path.isdir(source):
+            files = [os.path.join(root, name)
+                     for root, _, names in os.walk(source) for name in names]
+        else:
+            files = glob.glob(source, recursive=True)
+
+        video, audio = VideoFile(), AudioFile()
+        return sorted(os.path.abspath(file) for file in files
+                      if os.path.isfile(file) and "." in file
+                      and (video.is_allowed_ext(video.get_extension(file))
+                           or audio.is_allowed_ext(audio.get_extension(file))))
+
+    def is_done(self, file):
+        """Return boolean if file is done and its output still exist"""
+        entry = self.__manifest["files"].get(file, {})
+        return entry.get("status") == "done" and os.path.exists(entry.get("output", ""))
+
+    def run_pool(self, files, workers):
+        """
+        Process the files in a pool of workers, return the files
+        that failed because a worker crashed and broke the pool
+        """
+        broken = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(process_file, file, self.get_options()): file
+                       for file in files}
+            for future in as_completed(futures):
+                file = futures[future]
+                try:
+                    entry = future.result()
+                except BrokenProcessPool as error:
+                    broken.append(file)
+                    started = self.__manifest["files"][file].get("started", time.time())
+                    entry = {"status": "failed", "started": started, "error": repr(error),
+                             "finished": time.time()}
+                    entry["seconds"] = entry["finished"] - started
+                self.__manifest["files"][file] = entry
+                self.save_manifest()
+                print(f"Batch: {entry['status']} ({file}) in {entry['seconds']:.1f}s")
+        return broken
+
+    def run(self, source):
+        """Run all files of the source that are not done yet"""
+        files = [file for file in self.collect_files(source) if not self.is_done(file)]
+        print(f"Batch: {len(files)} files to process with {self.get_workers()} workers")
+        # Workspaces left by a crashed run
+        remove_stale_workspaces(self.get_options()["clips_directory"] or ".")
+
+        began = time.time()
+        for file in files:
+            self.__manifest["files"][file] = {"status": "running", "started": began}
+        self.save_manifest()
+
+        broken = self.run_pool(files, self.get_workers())
+        # A crashed worker breaks the pool and every file left in it,
+        # they are run again alone so only the file that crashes fails
+        for file in broken:
+            self.run_pool([file], 1)
+
+        wall = time.time() - began
+        media = sum(self.__manifest["files"][file].get("duration", 0.0) for file in files
+                    if self.__manifest["files"][file]["status"] == "done")
+        run = {
+            "started": began,
+            "wall_seconds": wall,
+            "files": len(files),
+            "done": sum(self.__manifest["files"][file]["status"] == "done" for file in files),
+            "media_seconds": media,
+            "media_hours_per_hour": media / wall if wall > 0 else 0.0,
+        }
+        self.__manifest["runs"].append(run)
+        self.save_manifest()
+        print(f"Batch: {run['done']}/{run['files']} done in {wall:.1f}s,"+
+              f" throughput {run['media_hours_per_hour']:.2f} media hours per hour")
+        return run
+
+
+def main():
+    """Run batch from the command line"""
+    parser = argparse.ArgumentParser(description="Bleep profanity in many media files")
+    parser.add_argument("source", help="directory or glob of the media files")
+    parser.add_argument("--bleep", required=True, help="bleep sound")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--manifest", default="bleepy-manifest.json")
+    parser.add_argument("--model", default="model")
+    parser.add_argument("--lang", default="english",
+                        help="languages separated by comma, like english,tagalog")
+    parser.add_argument("--engine", default="filter", choices=ProfanityBlocker.ENGINES)
+    parser.add_argument("--save-directory", default="bleeped video")
+    parser.add_argument("--clips-directory", default="clips")
+    parser.add_argument("--cache-directory", default="",
+                        help="cache of the results and profanities, not used if empty")
+    parser.add_argument("--verbose", action="store_true",
+                        help="print the results and FFMPEG commands of each file")
+    parser.add_argument("--vad", action="store_true",
+                        help="skip the audio without speech in the STT")
+    parser.add_argument("--lexicon", default="",
+                        help="lexicon file made by python -m bleepy.lexicon")
+    parser.add_argument("--spotting", action="store_true",
+                        help="only hear the profane words of the lexicon, faster STT,"+
+                        " the model should support grammars")
+    parser.add_argument("--encoder", default="auto",
+                        help="video encoder like libx264 or h264_nvenc, auto or copy")
+    parser.add_argument("--preset", default="veryfast", help="preset of the video encoder")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="threads of the video encoder, 0 for FFMPEG to decide")
+    parser.add_argument("--crf", type=int, default=23, help="quality of the video encoder")
+    args = parser.parse_args()
+
+    runner = BatchRunner(args.manifest, args.workers)
+    for name in ("model", "lang", "engine", "bleep", "save_directory", "clips_directory",
+                 "cache_directory", "verbose", "vad", "lexicon", "spotting",
+                 "encoder", "preset", "threads", "crf"):
+        runner.set_option(name, getattr(args, name))
+    runner.run(args.source)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,527 @@
 """Bleepy file"""
+import asyncio
+import bisect
+import contextlib
+import hashlib
+import json
+import math
 import os
+import queue
 import subprocess
 import sys
+import threading
+import time
 import uuid  # create unique random id
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 
-from profanity_check import predict, predict_prob
-from vosk import KaldiRecognizer, Model, SetLogLevel
+import numpy as np
+
+from .lexicon import get_lexicon
+from .metrics import Reporter
+from .pcm import (VoiceActivityDetector, apply_bleep, decode_pcm,
+                  get_decode_cmd, sine_tone)
+from .workspace import Workspace
 
 # import wave
 
 
+def get_vosk():
+    """
+    Return the vosk module, imported on first use
+    so rendering from an edit decision list does not need it
+    """
+    import vosk # pylint: disable=import-outside-toplevel
+    return vosk
+
+
+# The languages predict_prob has a classifier of
+LANGUAGES = ("english", "tagalog")
+
+
+def predict_prob(words, lang = "english"):
+    """
+    Return the profanity probability of the words by profanity_check,
+    imported on first use because it loads its classifiers on import
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from profanity_check import predict_prob as profanity_predict_prob
+    if lang == "english":
+        return profanity_predict_prob(words)
+    return profanity_predict_prob(words, lang)
+
+
+class LRUCache:
+    """
+    Least recently used cache, thread safe
+
+    When max_size is reached, the least recently used item is removed
+    """
+
+    def __init__(self, max_size = 100000):
+        """Init LRU cache"""
+        self.__items = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__max_size = max(1, int(max_size))
+        self.__hits = 0
+        self.__misses = 0
+
+    def set_max_size(self, max_size):
+        """Set max number of items"""
+        with self.__lock:
+            self.__max_size = max(1, int(max_size))
+            while len(self.__items) > self.__max_size:
+                self.__items.popitem(last=False)
+
+    def get_max_size(self):
+        """Get max number of items"""
+        return self.__max_size
+
+    def get_hits(self):
+        """Get number of cache hits"""
+        return self.__hits
+
+    def get_misses(self):
+        """Get number of cache misses"""
+        return self.__misses
+
+    def get(self, key, default = None):
+        """Get item, return default if not in the cache"""
+        with self.__lock:
+            if key not in self.__items:
+                self.__misses += 1
+                return default
+            self.__hits += 1
+            self.__items.move_to_end(key)
+            return self.__items[key]
+
+    def put(self, key, value):
+        """Put item"""
+        with self.__lock:
+            self.__items[key] = value
+            self.__items.move_to_end(key)
+            while len(self.__items) > self.__max_size:
+                self.__items.popitem(last=False)
+
+    def clear(self):
+        """Remove all items"""
+        with self.__lock:
+            self.__items.clear()
+
+    def __contains__(self, key):
+        """Return boolean if key is in the cache"""
+        return key in self.__items
+
+    def __len__(self):
+        """Return number of items"""
+        return len(self.__items)
+
+
+class ModelRegistry:
+    """
+    Registry of Vosk models, shared by the whole process
+
+    A model is loaded once on first use and shared by every
+    SpeechToText and thread. Only max_models models stay loaded,
+    the least recently used model is unloaded first.
+    """
+
+    def __init__(self, max_models = 2):
+        """Init model registry"""
+        self.__models = OrderedDict()
+        self.__loading = {}
+        self.__lock = threading.Lock()
+        self.__max_models = max(1, int(max_models))
+
+    def set_max_models(self, max_models):
+        """Set how many models can stay loaded"""
+        with self.__lock:
+            self.__max_models = max(1, int(max_models))
+            self.__evict()
+
+    def get_max_models(self):
+        """Get how many models can stay loaded"""
+        return self.__max_models
+
+    def get_key(self, model):
+        """Return the key of the model path"""
+        return os.path.abspath(model)
+
+    def get_loaded_models(self):
+        """Get list of loaded model paths, least recently used first"""
+        with self.__lock:
+            return list(self.__models)
+
+    def is_loaded(self, model):
+        """Return boolean if model is loaded"""
+        return self.get_key(model) in self.__models
+
+    def __evict(self):
+        """Unload least recently used models, lock should be held"""
+        while len(self.__models) > self.__max_models:
+            self.__models.popitem(last=False)
+
+    def get_model(self, model):
+        """Return the loaded Vosk Model, load it if not loaded yet"""
+        key = self.get_key(model)
+        with self.__lock:
+            if key in self.__models:
+                self.__models.move_to_end(key)
+                return self.__models[key]
+            loading = self.__loading.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock, so other models are not blocked
+        with loading:
+            with self.__lock:
+                if key in self.__models:
+                    self.__models.move_to_end(key)
+                    return self.__models[key]
+            # stderr, the live bleeper can write its audio to stdout
+            print(f"Loading Model ({model})...", file=sys.stderr)
+            loaded = get_vosk().Model(model)
+            with self.__lock:
+                self.__models[key] = loaded
+                self.__loading.pop(key, None)
+                self.__evict()
+        return loaded
+
+    def preload(self, model):
+        """Load the model now"""
+        self.get_model(model)
+
+    def unload(self, model = ""):
+        """Unload the model, unload all if model is empty"""
+        with self.__lock:
+            if model == "":
+                self.__models.clear()
+            else:
+                self.__models.pop(self.get_key(model), None)
+
+    def create_recognizer(self, model, sample_rate = 16000, grammar = None):
+        """
+        Return new KaldiRecognizer of the shared model,
+        grammar = list of the phrases the recognizer can only hear
+        """
+        if grammar is None:
+            recognizer = get_vosk().KaldiRecognizer(self.get_model(model), sample_rate)
+        else:
+            recognizer = get_vosk().KaldiRecognizer(self.get_model(model), sample_rate,
+                                                    json.dumps(grammar))
+        recognizer.SetWords(True)
+        return recognizer
+
+
+MODEL_REGISTRY = ModelRegistry()
+
+
+def get_model_registry():
+    """Return the model registry of the process"""
+    return MODEL_REGISTRY
+
+
+# Profanity probability of words by (lang, word), shared by the process
+WORD_CACHE = LRUCache(100000)
+
+
+def get_word_cache():
+    """Return the word cache of the process"""
+    return WORD_CACHE
+
+
+class ProbeCache:
+    """
+    Cache of the probe of the media files, by path, size and modified time
+
+    Kept in memory, and in the directory too if it is set
+    """
+
+    def __init__(self, max_size = 1024):
+        """Init probe cache"""
+        self.__probes = LRUCache(max_size)
+        self.__directory = ""
+
+    def set_directory(self, directory):
+        """Set directory of the probes on disk, empty to keep in memory only"""
+        self.__directory = directory
+        if directory != "" and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def get_directory(self):
+        """Get directory of the probes on disk"""
+        return self.__directory
+
+    def get_key(self, file, keyframes):
+        """Return the key of the file"""
+        stat = os.stat(file)
+        return f"{os.path.abspath(file)}|{stat.st_size}|{stat.st_mtime_ns}|{keyframes}"
+
+    def __get_path(self, key):
+        """Return the path of the probe on disk"""
+        return os.path.join(self.get_directory(),
+                            hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def get(self, file, keyframes):
+        """Return the probe of the file or None"""
+        key = self.get_key(file, keyframes)
+        probe = self.__probes.get(key)
+        if probe is None and self.get_directory() != "":
+            try:
+                with open(self.__get_path(key), encoding="utf-8") as cached:
+                    probe = json.load(cached)
+                self.__probes.put(key, probe)
+            except (OSError, ValueError):
+                probe = None
+        return probe
+
+    def put(self, file, keyframes, probe):
+        """Save the probe of the file"""
+        key = self.get_key(file, keyframes)
+        self.__probes.put(key, probe)
+        if self.get_directory() != "":
+            temp = f"{self.__get_path(key)}.{threading.get_ident()}.tmp"
+            with open(temp, "w", encoding="utf-8") as cached:
+                json.dump(probe, cached)
+            os.replace(temp, self.__get_path(key))
+
+    def clear(self):
+        """Remove all probes in memory"""
+        self.__probes.clear()
+
+
+PROBE_CACHE = ProbeCache()
+
+
+def get_probe_cache():
+    """Return the probe cache of the process"""
+    return PROBE_CACHE
+
+
+class SubprocessLimiter:
+    """
+    Limit of the FFMPEG subprocesses running at the same time
+    in the async API, each event loop has its own semaphore
+    """
+
+    def __init__(self, limit = 4):
+        """Init subprocess limiter"""
+        self.__limit = max(1, int(limit))
+        self.__semaphores = weakref.WeakKeyDictionary()
+
+    def set_limit(self, limit):
+        """Set how many subprocesses can run at the same time"""
+        self.__limit = max(1, int(limit))
+        self.__semaphores = weakref.WeakKeyDictionary()
+
+    def get_limit(self):
+        """Get how many subprocesses can run at the same time"""
+        return self.__limit
+
+    def get_semaphore(self):
+        """Get semaphore of the running event loop"""
+        loop = asyncio.get_running_loop()
+        semaphore = self.__semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.__limit)
+            self.__semaphores[loop] = semaphore
+        return semaphore
+
+
+SUBPROCESS_LIMITER = SubprocessLimiter(os.cpu_count() or 4)
+
+
+def get_subprocess_limiter():
+    """Return the subprocess limiter of the process"""
+    return SUBPROCESS_LIMITER
+
+
+class EncoderProbe:
+    """
+    Probe of the FFMPEG video encoders, once for each process
+
+    An encoder is working if it can encode a few frames, so a hardware
+    encoder without its device or driver is never picked
+    """
+
+    # Encoders of each codec, fastest first
+    CANDIDATES = {
+        "h264": ("h264_nvenc", "h264_qsv", "libx264", "libopenh264"),
+        "hevc": ("hevc_nvenc", "hevc_qsv", "libx265"),
+    }
+
+    def __init__(self):
+        """Init encoder probe"""
+        self.__encoders = None
+        self.__working = {}
+        self.__lock = threading.Lock()
+
+    def get_list_cmd(self):
+        """Return FFMPEG Command that list the encoders"""
+        return ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-encoders']
+
+    def get_test_cmd(self, encoder):
+        """Return FFMPEG Command that encode a few frames with the encoder"""
+        return ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+                '-i', 'color=size=256x256:rate=25:duration=0.2', '-pix_fmt', 'yuv420p',
+                '-c:v', encoder, '-f', 'null', '-']
+
+    def get_encoders(self):
+        """Get set of the video encoders FFMPEG was built with"""
+        with self.__lock:
+            if self.__encoders is None:
+                try:
+                    output = subprocess.run(self.get_list_cmd(), stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL, check=False).stdout
+                except OSError:
+                    output = b""
+                # " V....D libx264              libx264 H.264 / AVC ..."
+                self.__encoders = {line.split()[1] for line in output.decode().splitlines()
+                                   if len(line.split()) > 1 and line.split()[0][:1] == "V"
+                                   and len(line.split()[0]) == 6}
+            return set(self.__encoders)
+
+    def is_working(self, encoder):
+        """Return boolean if the encoder can encode, tested once"""
+        if encoder not in self.get_encoders():
+            return False
+        with self.__lock:
+            if encoder not in self.__working:
+                self.__working[encoder] = subprocess.run(
+                    self.get_test_cmd(encoder), stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL, check=False).returncode == 0
+            return self.__working[encoder]
+
+    def get_codec(self, encoder):
+        """Return the codec of the encoder like h264, "" if not known"""
+        for codec, encoders in self.CANDIDATES.items():
+            if encoder in encoders or encoder.startswith(f"{codec}_"):
+                return codec
+        return {"libx264rgb": "h264"}.get(encoder, "")
+
+    def get_best(self, codec = "h264"):
+        """Return the fastest working encoder of the codec, "" if none"""
+        for encoder in self.CANDIDATES.get(codec, ()):
+            if self.is_working(encoder):
+                return encoder
+        return ""
+
+    def clear(self):
+        """Probe the encoders again on next use"""
+        with self.__lock:
+            self.__encoders = None
+            self.__working.clear()
+
+
+ENCODER_PROBE = EncoderProbe()
+
+
+def get_encoder_probe():
+    """Return the encoder probe of the process"""
+    return ENCODER_PROBE
+
+
+async def run_subprocess_async(cmd):
+    """
+    Run the command without blocking the event loop and return the return code,
+    wait for the subprocess limiter first. The subprocess is killed if the
+    task is cancelled or timed out.
+    """
+    async with get_subprocess_limiter().get_semaphore():
+        process = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.DEVNULL)
+        try:
+            return await process.wait()
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+
+def iterate_in_thread(iterable, maxsize = 64):
+    """
+    Yield the items of the iterable, the iterable is run
+    in another thread and buffered in a queue of maxsize
+
+    If the consumer stops early, the producer stops and the
+    iterable is closed
+    """
+    items = queue.Queue(maxsize)
+    done = object()
+    stop = threading.Event()
+
+    def put(entry):
+        """Put the entry, return False if the consumer stopped"""
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    break
+            else:
+                put((done, None))
+        except BaseException as error: # pylint: disable=broad-except
+            put((done, error))
+        finally:
+            if stop.is_set() and hasattr(iterable, "close"):
+                iterable.close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def dump_result(words, text = None):
+    """
+    Return the words as a result txt like
+    KaldiRecognizer obj.Result() return
+    """
+    text = " ".join(word["word"] for word in words) if text is None else text
+    return json.dumps({"result": list(words), "text": text})
+
+
+def _recognize_window(model, sample_rate, offset, data, recognizer_factory = None,
+                      grammar = None):
+    """
+    Recognize one window of 16 bit mono PCM in a worker process
+
+    Return the list of words, start and end are shifted by offset
+    to be absolute time
+    """
+    if recognizer_factory is None:
+        get_vosk().SetLogLevel(-1)
+        rec = get_model_registry().create_recognizer(model, sample_rate, grammar)
+    elif grammar is None:
+        rec = recognizer_factory(model, sample_rate)
+    else:
+        rec = recognizer_factory(model, sample_rate, grammar)
+
+    words = []
+    chunk = sample_rate * 2 # 1 second
+    for i in range(0, len(data), chunk):
+        if rec.AcceptWaveform(data[i:i + chunk]):
+            words.extend(json.loads(rec.Result()).get("result", []))
+    words.extend(json.loads(rec.FinalResult()).get("result", []))
+
+    for word in words:
+        word["start"] = round(word["start"] + offset, 3)
+        word["end"] = round(word["end"] + offset, 3)
+    return words
+
 
 class File:
     """Abstraction for file"""
@@ -79,12 +591,15 @@ class MediaFile(File):
         self.__allowed_extensions = {"mp4","mp3"}
         self.__extension = ""
         self.__duration = 0.0
+        self.__probe = {"format": {}, "streams": []}
+        self.__keyframes = None
+        self.__probe_keyframes = False
 
     def set_file(self, file):
         """Set File , Override"""
         super().set_file(file)
         self.__set_file_extension(file)
-        self.__set_duration(file)
+        self.__set_probe(file)
 
     def set_allowed_exts(self, extensions):
         """
@@ -98,27 +613,139 @@ class MediaFile(File):
         """Set File Extension"""
         self.__extension = self.get_extension(file)
 
-    def __set_duration(self, file):
+    def set_probe_keyframes(self, probe_keyframes = True):
+        """
+        Set if the keyframes of the video are probed with the file,
+        else they are probed on first get_keyframes
         """
-        Return Full Duration of the Media File
+        self.__probe_keyframes = probe_keyframes
 
-        ```
-        durationcmd = (
-            f"ffprobe -v error -show_entries format=duration"+
-            f"-of default=noprint_wrappers=1:nokey=1 \"'{file}\""
-            )
-        ```
+    def get_probe_cmd(self, file):
+        """Return FFPROBE Command that probe the format and streams"""
+        return ['ffprobe', '-v', 'error', '-print_format', 'json=compact=1',
+                '-show_format', '-show_streams', file]
 
+    def get_keyframes_cmd(self, file):
+        """
+        Return FFPROBE Command that probe the keyframe times
+        of the first video stream, only the keyframes are decoded
         """
-        durationcmd = [
-            'ffprobe', '-v' ,'error', '-show_entries',
-            'format=duration', '-of' ,'default=noprint_wrappers=1:nokey=1', file]
-        proc = subprocess.Popen(durationcmd, stdout=subprocess.PIPE)
-        output = proc.stdout.read()
-        output = str(output).replace("\\","")
-        for char in ("b","\'","n","r"):
-            output = output.strip(char)
-        self.__duration = float(output)
+        return ['ffprobe', '-v', 'error', '-print_format', 'json=compact=1',
+                '-select_streams', 'v:0', '-skip_frame', 'nokey',
+                '-show_entries', 'frame=pts_time', file]
+
+    def run_probe(self, cmd, file):
+        """Run FFPROBE Command and return its JSON output, exit if it failed"""
+        try:
+            proc = subprocess.run(cmd, stdout=subprocess.PIPE, check=False)
+            output = json.loads(proc.stdout or b"{}") if proc.returncode == 0 else None
+        except (OSError, ValueError):
+            output = None
+        if output is None:
+            print(f"Warning: FFPROBE failed to probe ({file})")
+            sys.exit()
+        return output
+
+    def probe(self, file):
+        """
+        Return the probe of the file, dict of format and streams
+
+        The probe is cached by path, size and modified time,
+        a failed probe is never cached
+        """
+        cache = get_probe_cache()
+        probe = cache.get(file, False)
+        if probe is not None:
+            return probe
+
+        output = self.run_probe(self.get_probe_cmd(file), file)
+        probe = {"format": output.get("format", {}), "streams": output.get("streams", [])}
+        cache.put(file, False, probe)
+        return probe
+
+    def probe_keyframes(self, file):
+        """Return sorted list of the keyframe times of the file, cached like the probe"""
+        cache = get_probe_cache()
+        probe = cache.get(file, True)
+        if probe is not None:
+            return probe["keyframes"]
+
+        keyframes = []
+        if self.get_video_stream() is not None:
+            output = self.run_probe(self.get_keyframes_cmd(file), file)
+            keyframes = sorted(float(frame["pts_time"]) for frame in output.get("frames", [])
+                               if frame.get("pts_time", "N/A") != "N/A")
+        cache.put(file, True, {"keyframes": keyframes})
+        return keyframes
+
+    def __set_probe(self, file):
+        """Set the probe and the duration of the Media File"""
+        self.__probe = self.probe(file)
+        self.__keyframes = None
+        self.__duration = float(self.__probe["format"].get("duration", 0.0))
+        if self.__probe_keyframes:
+            self.get_keyframes()
+
+    def get_probe(self):
+        """Get probe, dict of format and streams"""
+        return self.__probe
+
+    def get_streams(self):
+        """Get list of streams"""
+        return self.__probe["streams"]
+
+    def get_codecs(self):
+        """Get list of codec names of the streams"""
+        return [stream.get("codec_name", "") for stream in self.get_streams()]
+
+    def get_video_stream(self):
+        """Get first video stream, None if no video"""
+        for stream in self.get_streams():
+            if (stream.get("codec_type") == "video"
+                    and not stream.get("disposition", {}).get("attached_pic")):
+                return stream
+        return None
+
+    def get_audio_stream(self):
+        """Get first audio stream, None if no audio"""
+        for stream in self.get_streams():
+            if stream.get("codec_type") == "audio":
+                return stream
+        return None
+
+    def has_video(self):
+        """Return boolean if the file has video"""
+        return self.get_video_stream() is not None
+
+    def get_sample_rate(self):
+        """Get sample rate of the audio, 0 if no audio"""
+        audio = self.get_audio_stream()
+        return int(audio.get("sample_rate", 0)) if audio else 0
+
+    def get_channels(self):
+        """Get number of channels of the audio, 0 if no audio"""
+        audio = self.get_audio_stream()
+        return int(audio.get("channels", 0)) if audio else 0
+
+    def get_channel_layout(self):
+        """Get channel layout of the audio like stereo"""
+        audio = self.get_audio_stream()
+        return audio.get("channel_layout", "") if audio else ""
+
+    def get_frame_rate(self):
+        """Get frame rate of the video, 0.0 if no video"""
+        video = self.get_video_stream()
+        if video is None:
+            return 0.0
+        numerator, _, denominator = video.get("avg_frame_rate", "0/1").partition("/")
+        return float(numerator) / float(denominator) if float(denominator or 0) else 0.0
+
+    def get_keyframes(self):
+        """Get list of keyframe times of the video in seconds, probed on first use"""
+        if self.__keyframes is None:
+            self.__keyframes = (self.probe_keyframes(self.get_file())
+                                if self.get_file() else [])
+        return self.__keyframes
 
     def get_allowed_exts(self) -> set:
         """Get allowed extension"""
@@ -137,8 +764,8 @@ class MediaFile(File):
         return self.__duration
 
     def is_allowed_ext(self, extension):
-        """Return boolen if extension is allowed"""
-        return extension in self.get_allowed_exts()
+        """Return boolen if extension is allowed, the case is ignored"""
+        return extension.lower() in {ext.lower() for ext in self.get_allowed_exts()}
 
     def check_is_allowed_ext(self, extension):
         """Check file extension, if not, print error"""
@@ -198,7 +825,7 @@ class AudioFile(MediaFile):
         super().__init__()
         self.set_allowed_exts({"mp3","wav"})
 
-class SpeechToText():
+class SpeechToText(Reporter):
     """
     SpeechToText or STT
 
@@ -209,20 +836,33 @@ class SpeechToText():
     list of results (txt)
     """
 
-    def __init__(self, model = "model"):
-        """Init speech to text"""
+    def __init__(self, model = "model", recognizer_factory = None):
+        """
+        Init speech to text
+
+        recognizer_factory = function(model, sample_rate) that return a
+        recognizer like KaldiRecognizer, to use another recognizer than the
+        Vosk model, like a stub for benchmarks. It should be picklable
+        for the parallel STT. With a grammar it is called with
+        (model, sample_rate, grammar).
+        """
         super().__init__()
-        self.check_model_exist(model)
+        self.__recognizer_factory = recognizer_factory
+        if recognizer_factory is None:
+            self.check_model_exist(model)
         self.__model = model
         self.__sample_rate=16000
         self.__video = VideoFile()
         self.__results = []
-
-        print("Setting up Recognizer for STT...")
-        SetLogLevel(0)
-        model = Model(self.get_model())
-        self.__recognizer = KaldiRecognizer(model, self.get_sample_rate())
-        self.__recognizer.SetWords(True)
+        self.__workers = 1
+        self.__window = 60.0
+        self.__overlap = 3.0
+        self.__cache = None
+        self.__vad_options = None
+        self.__vad = None
+        self.__grammar = None
+        # Created on first use, the model is shared in the model registry
+        self.__recognizer = None
 
     def set_model(self, model="model"):
         """Set language model"""
@@ -235,10 +875,92 @@ class SpeechToText():
         self.__sample_rate = sample_rate
         self.update_recognizer()
 
-    def set_video(self,video:VideoFile):
-        """Set video file """
+    def set_video(self,video:MediaFile):
+        """Set video file, can be VideoFile or AudioFile"""
         self.__video = video
 
+    def set_cache(self, cache):
+        """Set TranscriptCache of the results, None to not use cache"""
+        self.__cache = cache
+
+    def set_workers(self, workers = 1):
+        """
+        Set number of worker processes,
+        more than 1 run the parallel STT
+        """
+        self.__workers = max(1, int(workers))
+
+    def set_window(self, window = 60.0, overlap = 3.0):
+        """
+        Set the window and overlap in seconds of the parallel STT,
+        overlap should be longer than the longest word
+        """
+        if overlap * 2 >= window:
+            print(f"Warning: Overlap ({overlap}) should be less than half of the window ({window})")
+            sys.exit()
+        self.__window = float(window)
+        self.__overlap = float(overlap)
+
+    def set_vad(self, enabled = True, threshold = -45.0, padding = 0.3):
+        """
+        Set the voice activity detector, the quiet audio is not fed to
+        the recognizer, music and loud noise still are. Word times stay absolute.
+
+        threshold = energy in dBFS of speech, padding = seconds kept
+        before and after the speech
+        """
+        self.__vad_options = {"threshold": threshold, "padding": padding} if enabled else None
+
+    def set_grammar(self, grammar = None):
+        """
+        Set the grammar, list of the phrases the recognizer can only hear,
+        None for the full vocabulary. The model should support grammars,
+        like the small Vosk models.
+        """
+        self.__grammar = None if grammar is None else list(grammar)
+        self.update_recognizer()
+
+    def set_spotting(self, enabled = True, lang = "english,tagalog", words = ()):
+        """
+        Set the spotting mode, the recognizer only hears the profane words
+        of the lexicon and the words, every other word is "[unk]".
+        The results have the same word times for ProfanityExtractor,
+        compare it with the full vocabulary by benchmarks/bench_spotting.py
+        """
+        if not enabled:
+            self.set_grammar(None)
+            return
+        phrases = set(words)
+        for language in get_languages(lang):
+            phrases |= get_lexicon().get_profane(language)
+        self.set_grammar(sorted(phrases) + ["[unk]"])
+
+    def get_grammar(self):
+        """Get the grammar, None for the full vocabulary"""
+        return self.__grammar
+
+    def get_cache_variant(self):
+        """Return the variant of the model in the cache, the hash of the grammar"""
+        if self.get_grammar() is None:
+            return ""
+        digest = hashlib.sha256(json.dumps(self.get_grammar()).encode()).hexdigest()[:16]
+        return f"grammar{digest}"
+
+    def is_vad_enabled(self):
+        """Return boolean if the voice activity detector is used"""
+        return self.__vad_options is not None
+
+    def create_vad(self):
+        """Return new voice activity detector, None if not enabled"""
+        if not self.is_vad_enabled():
+            return None
+        self.__vad = VoiceActivityDetector(self.get_sample_rate(), **self.__vad_options)
+        return self.__vad
+
+    def get_vad(self):
+        """Get voice activity detector of the last STT, None if not used"""
+        return self.__vad
+
     def set_results(self,results):
         """set list of  results"""
         self.__results = list(results)
@@ -250,12 +972,32 @@ class SpeechToText():
         self.set_results(results)
 
     def update_recognizer(self):
-        """Update recognizer"""
-        SetLogLevel(0)
-        print("Updating Recognizer for STT...")
-        model = Model(self.get_model())
-        self.__recognizer = KaldiRecognizer(model, self.get_sample_rate())
-        self.__recognizer.SetWords(True)
+        """Update recognizer, the new recognizer is created on first use"""
+        self.__recognizer = None
+
+    def get_recognizer_factory(self):
+        """Get recognizer factory, None if the Vosk model is used"""
+        return self.__recognizer_factory
+
+    def check_recognizer(self):
+        """Check model if exist, when the Vosk model is used"""
+        if self.get_recognizer_factory() is None:
+            self.check_model_exist()
+
+    def create_recognizer(self):
+        """Return new recognizer of the model from the model registry"""
+        if self.get_recognizer_factory() is not None and self.get_grammar() is None:
+            return self.get_recognizer_factory()(self.get_model(), self.get_sample_rate())
+        if self.get_recognizer_factory() is not None:
+            return self.get_recognizer_factory()(self.get_model(), self.get_sample_rate(),
+                                                 self.get_grammar())
+        get_vosk().SetLogLevel(0)
+        return get_model_registry().create_recognizer(
+            self.get_model(), self.get_sample_rate(), self.get_grammar())
+
+    def preload_model(self):
+        """Load the model now instead of on first use"""
+        get_model_registry().preload(self.get_model())
 
     def get_model(self):
         """Return model"""
@@ -269,12 +1011,30 @@ class SpeechToText():
         """Get sample rate"""
         return self.__sample_rate
 
+    def get_cache(self):
+        """Get TranscriptCache of the results"""
+        return self.__cache
+
+    def get_workers(self):
+        """Get number of worker processes"""
+        return self.__workers
+
+    def get_window(self):
+        """Get window of the parallel STT in seconds"""
+        return self.__window
+
+    def get_overlap(self):
+        """Get overlap of the parallel STT in seconds"""
+        return self.__overlap
+
     def get_results(self):
         """Get results"""
         return self.__results
 
     def get_recognizer(self):
         """Get recognizer"""
+        if self.__recognizer is None:
+            self.__recognizer = self.create_recognizer()
         return self.__recognizer
 
     def get_stt_cmd(self):
@@ -298,99 +1058,560 @@ class SpeechToText():
                 )
             sys.exit()
 
-    def run(self, video):
-        """Run Speech to text"""
+    def to_absolute(self, result, vad):
+        """Return the result txt with the word times of the voice activity detector absolute"""
+        if vad is None:
+            return result
+        txt = json.loads(result)
+        words = txt.get("result", [])
+        if not words:
+            return result
+        for word in words:
+            word["start"] = round(vad.to_absolute(word["start"]), 3)
+            word["end"] = round(vad.to_absolute(word["end"], True), 3)
+        return dump_result(words, txt.get("text"))
+
+    def add_vad_metrics(self, vad):
+        """Add the audio skipped by the voice activity detector to the metrics"""
+        if vad is None:
+            return
+        metrics = self.get_metrics()
+        metrics.add("vad.skipped_seconds", vad.get_skipped_seconds())
+        metrics.set_value("vad.skipped_fraction", vad.get_skipped_fraction())
+        self.log(f"VAD skipped {vad.get_skipped_fraction():.1%} of the audio")
+
+    def stream_parallel(self, video):
+        """
+        Yield results of Speech to text in parallel
+
+        The PCM is cut into overlapping windows, each window is recognized
+        in a worker process. Words are kept in the window where its middle
+        falls in the half of the overlap, so each word is only kept once.
+        """
         self.set_video(video)
-        self.set_results([])
-        self.check_model_exist()
-        rec = self.get_recognizer()
+        self.check_recognizer()
+
+        sample_rate = self.get_sample_rate()
+        window = int(self.get_window() * sample_rate) * 2
+        overlap = int(self.get_overlap() * sample_rate) * 2
+        step = window - overlap
+        half = self.get_overlap() / 2
+
+        pending = deque()
+
+        vad = self.create_vad()
+
+        def collect(future, low, high):
+            words = [word for word in future.result()
+                     if low <= (word["start"] + word["end"]) / 2 < high]
+            if not words:
+                return None
+            result = self.to_absolute(dump_result(words), vad)
+            self.log(result)
+            return result
 
         process = subprocess.Popen(self.get_stt_cmd(),stdout=subprocess.PIPE)
+        decoded = 0
+        speech = b""
+
+        def read(size):
+            """Read size bytes of the audio, only the speech if the VAD is used"""
+            nonlocal decoded, speech
+            if vad is None:
+                chunk = process.stdout.read(size)
+                decoded += len(chunk)
+                return chunk
+            while len(speech) < size:
+                chunk = process.stdout.read(size)
+                decoded += len(chunk)
+                speech += vad.feed(chunk, len(chunk) == 0)
+                if len(chunk) == 0:
+                    break
+            chunk, speech = speech[:size], speech[size:]
+            return chunk
 
-        while True:
-            data = process.stdout.read(4000)
-            if len(data) == 0:
-                break
-            if rec.AcceptWaveform(data):
-                result = rec.Result()
-                print(result)
-                self.add_result(result)
+        try:
+            with ProcessPoolExecutor(max_workers=self.get_workers()) as executor:
+                data = b""
+                position = 0
+                while True:
+                    chunk = read(window - len(data))
+                    data += chunk
+                    is_last = len(chunk) == 0 or len(data) < window
+                    offset = position / 2 / sample_rate
+
+                    low = 0.0 if position == 0 else offset + half
+                    high = float("inf") if is_last else offset + self.get_window() - half
+                    future = executor.submit(
+                        _recognize_window, self.get_model(), sample_rate, offset, data,
+                        self.get_recognizer_factory(), self.get_grammar())
+                    pending.append((future, low, high))
+
+                    # Keep only few windows in memory
+                    while len(pending) > self.get_workers() * 2:
+                        result = collect(*pending.popleft())
+                        if result is not None:
+                            yield result
+
+                    if is_last:
+                        break
+                    data = data[step:]
+                    position += step
+
+                while pending:
+                    result = collect(*pending.popleft())
+                    if result is not None:
+                        yield result
+            self.add_vad_metrics(vad)
+        finally:
+            for future, _, _ in pending:
+                future.cancel()
+            process.kill()
+            process.wait()
+            self.get_metrics().add("stt.bytes_decoded", decoded)
+
+    def stream(self, video):
+        """
+        Yield each result of Speech to text as soon as it is final,
+        while the media is still being decoded. The results are not kept.
+
+        If the results of the media are in the cache,
+        the cached results are yielded instead
+        """
+        cache = self.get_cache()
+        if cache is None:
+            yield from self.stream_recognize(video)
+            return
+
+        cached = cache.get_results(video.get_file(), self.get_model(),
+                                   self.get_sample_rate(), self.get_cache_variant())
+        if cached is not None:
+            self.set_video(video)
+            self.log(f"Results of ({video.get_file()}) found in the cache")
+            yield from cached
+            return
+
+        results = []
+        for result in self.stream_recognize(video):
+            results.append(result)
+            yield result
+        cache.put_results(video.get_file(), self.get_model(), self.get_sample_rate(),
+                          results, self.get_cache_variant())
+
+    def stream_recognize(self, video):
+        """
+        Yield each result of Speech to text, without the cache
+
+        The wall and CPU time is the stt stage of the metrics,
+        the real time factor is the wall time over the seconds decoded
+        """
+        metrics = self.get_metrics()
+        decoded = metrics.get("stt.bytes_decoded")
+        began = time.perf_counter()
+        with metrics.stage("stt"):
+            if self.get_workers() > 1:
+                yield from self.stream_parallel(video)
             else:
-                print(rec.PartialResult())
+                yield from self.stream_serial(video)
+
+        seconds = (metrics.get("stt.bytes_decoded") - decoded) / 2 / self.get_sample_rate()
+        metrics.add("stt.media_seconds", seconds)
+        if seconds > 0:
+            metrics.set_value("stt.realtime_factor", (time.perf_counter() - began) / seconds)
+
+    def stream_serial(self, video):
+        """Yield each result of Speech to text in this process"""
+        self.set_video(video)
+        self.check_recognizer()
+        # New recognizer for each job, the model is shared
+        rec = self.create_recognizer()
+        self.__recognizer = rec
 
-        finalresult = rec.FinalResult()
-        print(finalresult)
-        self.add_result(finalresult)
+        process = subprocess.Popen(self.get_stt_cmd(),stdout=subprocess.PIPE)
+        decoded = 0
+
+        def read():
+            """Yield the chunks of the audio"""
+            nonlocal decoded
+            while True:
+                data = process.stdout.read(4000)
+                if len(data) == 0:
+                    break
+                decoded += len(data)
+                yield data
+
+        vad = self.create_vad()
+        chunks = read() if vad is None else vad.filter(read())
+
+        try:
+            for data in chunks:
+                if rec.AcceptWaveform(data):
+                    result = self.to_absolute(rec.Result(), vad)
+                    self.log(result)
+                    yield result
+                elif self.is_verbose():
+                    self.log(rec.PartialResult())
+
+            finalresult = self.to_absolute(rec.FinalResult(), vad)
+            self.log(finalresult)
+            yield finalresult
+            self.add_vad_metrics(vad)
+        finally:
+            process.kill()
+            process.wait()
+            self.get_metrics().add("stt.bytes_decoded", decoded)
 
-class ProfanityDetector():
-    """Profanity Detector"""
-    def __init__(self,lang="english"):
-        """Init profanity detector"""
+    def recognize_chunk(self, rec, data, vad = None, is_last = False):
+        """
+        Return list of the results of the chunk of audio,
+        the final result is added if is_last
+        """
+        results = []
+        for i in range(0, len(data), 4000):
+            if rec.AcceptWaveform(data[i:i + 4000]):
+                results.append(self.to_absolute(rec.Result(), vad))
+        if is_last:
+            results.append(self.to_absolute(rec.FinalResult(), vad))
+        return results
+
+    async def stream_async(self, video, executor = None):
+        """
+        Yield each result of Speech to text like stream(),
+        without blocking the event loop
+
+        FFMPEG is an asyncio subprocess limited by the subprocess limiter,
+        the recognizer runs in the executor, the default executor if None.
+        The worker processes of the parallel STT are not used.
+        """
+        loop = asyncio.get_running_loop()
+        cache = self.get_cache()
+        if cache is not None:
+            cached = await loop.run_in_executor(
+                executor, cache.get_results, video.get_file(), self.get_model(),
+                self.get_sample_rate(), self.get_cache_variant())
+            if cached is not None:
+                self.set_video(video)
+                self.log(f"Results of ({video.get_file()}) found in the cache")
+                for result in cached:
+                    yield result
+                return
+
+        self.set_video(video)
+        self.check_recognizer()
+        rec = await loop.run_in_executor(executor, self.create_recognizer)
+        self.__recognizer = rec
+        vad = self.create_vad()
+
+        metrics = self.get_metrics()
+        results = []
+        decoded = 0
+        began = time.perf_counter()
+        with metrics.stage("stt"):
+            async with get_subprocess_limiter().get_semaphore():
+                process = await asyncio.create_subprocess_exec(
+                    *self.get_stt_cmd(), stdout=asyncio.subprocess.PIPE)
+                try:
+                    is_last = False
+                    while not is_last:
+                        # 1 second of audio for each executor call
+                        data = await process.stdout.read(self.get_sample_rate() * 2)
+                        decoded += len(data)
+                        is_last = len(data) == 0
+                        if vad is not None:
+                            data = vad.feed(data, is_last)
+                        for result in await loop.run_in_executor(
+                                executor, self.recognize_chunk, rec, data, vad, is_last):
+                            self.log(result)
+                            results.append(result)
+                            yield result
+                finally:
+                    if process.returncode is None:
+                        process.kill()
+                    await process.wait()
+                    metrics.add("stt.bytes_decoded", decoded)
+
+        seconds = decoded / 2 / self.get_sample_rate()
+        metrics.add("stt.media_seconds", seconds)
+        if seconds > 0:
+            metrics.set_value("stt.realtime_factor", (time.perf_counter() - began) / seconds)
+        self.add_vad_metrics(vad)
+        if cache is not None:
+            await loop.run_in_executor(executor, cache.put_results, video.get_file(),
+                                       self.get_model(), self.get_sample_rate(),
+                                       results, self.get_cache_variant())
+
+    async def run_async(self, video, timeout = None, executor = None):
+        """
+        Run Speech to text without blocking the event loop,
+        raise asyncio.TimeoutError after timeout seconds
+        """
+        async def collect():
+            return [result async for result in self.stream_async(video, executor)]
+        self.set_results(await asyncio.wait_for(collect(), timeout))
+
+    def run_parallel(self, video):
+        """Run Speech to text in parallel, without the cache"""
+        self.set_results(self.stream_parallel(video))
+
+    def run(self, video):
+        """Run Speech to text"""
+        self.set_results(self.stream(video))
+
+class WordRecord:
+    """
+    Word of the recognizer result
+
+    Can be used like the dict of the result, word["start"]
+    """
+    __slots__ = ("word", "start", "end", "conf", "lang", "predict_prob")
+
+    def __init__(self, word, start, end, conf = 1.0, lang = "", predict_prob = 0.0):
+        """Init word record"""
+        self.word = word
+        self.start = float(start)
+        self.end = float(end)
+        self.conf = float(conf)
+        self.lang = lang
+        self.predict_prob = float(predict_prob)
+
+    @classmethod
+    def from_dict(cls, item):
+        """Return word record from dict of the result"""
+        return cls(item["word"], item["start"], item["end"], item.get("conf", 1.0),
+                   item.get("lang", ""), item.get("predict_prob", 0.0))
+
+    def to_dict(self):
+        """Return dict of the word record"""
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def get_duration(self):
+        """Get duration of the word"""
+        return self.end - self.start
+
+    def __getitem__(self, key):
+        """Get attribute like dict"""
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        """Set attribute like dict"""
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        """Return boolean if key is attribute"""
+        return key in self.__slots__
+
+    def __repr__(self):
+        """Return representation of word record"""
+        return (f"WordRecord({self.word!r}, {self.start}, {self.end},"+
+                f" conf={self.conf}, lang={self.lang!r}, predict_prob={self.predict_prob})")
+
+def get_languages(lang):
+    """
+    Return tuple of the languages, lang can be one language,
+    languages separated by comma like "english,tagalog", or a list or set
+    """
+    if isinstance(lang, str):
+        lang = lang.split(",")
+    elif isinstance(lang, (set, frozenset)):
+        lang = sorted(lang)
+    return tuple(dict.fromkeys(item.strip() for item in lang if item.strip()))
+
+def is_languages_exist(lang):
+    """Return boolean if lang has languages and each one is in LANGUAGES"""
+    langs = get_languages(lang)
+    return len(langs) > 0 and all(item in LANGUAGES for item in langs)
+
+def check_languages(lang):
+    """Check languages of lang like get_languages, if not, print error"""
+    if not is_languages_exist(lang):
+        print(f"Warning: Language ({lang}) not found."+
+              f" Please use one or more of the languages {LANGUAGES} separated by comma")
+        sys.exit()
+
+class ProfanityDetector(Reporter):
+    """
+    Profanity Detector
+
+    Words in the lexicon are decided by the lexicon. The other words are
+    classified in batch, one predict_prob call for each language
+    for all the words that are not in the word cache yet.
+    With many languages, each word is kept once with the language
+    of the highest probability.
+    A word is profanity if its probability is at least the threshold.
+    """
+    def __init__(self,lang="english", threshold=0.5):
+        """Init profanity detector, lang can be many languages like get_languages"""
+        self.__lang = lang
+        self.__langs = ()
+        self.__threshold = threshold
+        self.__lexicon = get_lexicon()
+        self.set_lang(lang)
+
+    def set_lang(self, lang):
+        """Set language, one or many like get_languages, each one in LANGUAGES"""
+        check_languages(lang)
         self.__lang = lang
+        self.__langs = get_languages(lang)
+
+    def set_threshold(self, threshold = 0.5):
+        """Set profanity probability threshold"""
+        self.__threshold = threshold
+
+    def set_lexicon(self, lexicon):
+        """Set Lexicon of the known words, None to classify every word"""
+        self.__lexicon = lexicon
 
     def get_lang(self):
         """Get language"""
         return self.__lang
 
+    def get_langs(self):
+        """Get tuple of the languages"""
+        return self.__langs
+
+    def get_lexicon(self):
+        """Get Lexicon of the known words"""
+        return self.__lexicon
+
+    def get_threshold(self):
+        """Get profanity probability threshold"""
+        return self.__threshold
+
+    def predict_probs(self, words, lang = ""):
+        """
+        Return list of profanity probability of the words (str)
+        in the language, the first language if empty
+
+        Only the words not in the lexicon or the word cache are classified,
+        in one predict_prob call
+        """
+        cache = get_word_cache()
+        lexicon = self.get_lexicon()
+        lang = lang or self.get_langs()[0]
+        probs = {}
+        known = 0
+        for word in words:
+            if word not in probs:
+                prob = None if lexicon is None else lexicon.lookup(word, lang)
+                known += prob is not None
+                probs[word] = cache.get((lang, word)) if prob is None else prob
+
+        unknown = [word for word, prob in probs.items() if prob is None]
+        metrics = self.get_metrics()
+        metrics.add("classify.lexicon", known)
+        metrics.add("classify.cached", len(probs) - known - len(unknown))
+        if unknown:
+            metrics.add("classify.calls")
+            metrics.add("classify.predicted", len(unknown))
+            with metrics.stage("classify"):
+                predicted = predict_prob(unknown, lang)
+            for word, prob in zip(unknown, predicted):
+                probs[word] = float(prob)
+                cache.put((lang, word), probs[word])
+
+        return [probs[word] for word in words]
+
+    def predict_best(self, words):
+        """
+        Return list of (lang, probability) of the words (str),
+        the language with the highest probability, the first language on a tie
+        """
+        unique = list(dict.fromkeys(words))
+        best = {word: ("", -1.0) for word in unique}
+        for lang in self.get_langs():
+            for word, prob in zip(unique, self.predict_probs(unique, lang)):
+                if prob > best[word][1]:
+                    best[word] = (lang, prob)
+        return [best[word] for word in words]
+
+    def extract_profanity(self, words):
+        """
+        Return list of profanity (WordRecord) from list of words (WordRecord),
+        a word at the same time is only returned once
+        """
+        self.get_metrics().add("classify.words", len(words))
+        profanity = []
+        found = set()
+        for word, (lang, prob) in zip(words, self.predict_best([word.word for word in words])):
+            key = (word.word, word.start, word.end)
+            if prob >= self.get_threshold() and key not in found:
+                found.add(key)
+                word.lang = lang
+                word.predict_prob = prob
+                profanity.append(word)
+        return profanity
+
     def extract_list_of_results(self,txt):
         """
         Extract the list of results
 
-        Make List of Results
+        Make List of Results, each result is a dict of word,
+        start, end and conf
         """
-        #Vosk, KaldiRecognizer obj.Result() and obj.FinalResult() return txt
-        a_char = txt.split('[')#Split the Result str in open bracket
-        b_char = a_char[1].split(']') #Get the 2nd half then Split in Closing Bracket
-        c_char = b_char[0].split(', ') #Get the 1st half then Split in comma and space
-        for i, item in enumerate(c_char):
-            item
-            c_char[i] = c_char[i].strip("{}") #remove brackets
-            c_char[i] = c_char[i].replace('\n','') #replace newline
-            c_char[i] = c_char[i].replace('\"','') #replace "
-        return c_char #return list of Results
+        #Vosk, KaldiRecognizer obj.Result() and obj.FinalResult() return json txt
+        return json.loads(txt).get("result", [])
 
     def extract_list_of_words(self,txt):
-        """Make List of Words, extracted from the list of Results"""
-        words = [] #create new list
-        if "result" in txt: #Check if there is result or words
-            for item in self.extract_list_of_results(txt):
-                attrs= item.split(',') #Split the items into attributes in comma
-                tempdict = {} #create temp dict
-                for attr in attrs:
-                    #Then Split the attributes in : separating the key and value
-                    data = attr.split(':')
-                    #data[0] is the key, data[1] is the value
-                    tempdict[data[0].strip()] = data[1].strip()
-                words.append(tempdict)
-        #To output this, you can use for loop
-        #another example: print(extract_list_of_words(txt)[0]["word"])
-        return words #return this list of words (dict)
+        """Make List of Words (WordRecord), extracted from the list of Results"""
+        #another example: print(extract_list_of_words(txt)[0].word)
+        # [unk] is every word the spotting grammar does not have
+        return [WordRecord.from_dict(item) for item in self.extract_list_of_results(txt)
+                if item.get("word") != "[unk]"]
 
     def extract_list_of_profanity(self,txt):
         """Make a list of profanity"""
-        words = self.extract_list_of_words(txt)
-        profanity = []
-        for word in words:
-            if bool(predict([word["word"]]) if self.get_lang() == "english"
-                    else predict([word["word"]], self.get_lang()) ):
-                word["lang"] = self.get_lang()
-                word["predict_prob"] = ( predict_prob([word["word"]])[0]
-                                            if self.get_lang() == "english"
-                                            else predict_prob([word["word"]], self.get_lang())[0])
-                profanity.append(word)
-        return profanity #list of dictionaries
+        return self.extract_profanity(self.extract_list_of_words(txt)) #list of WordRecord
+
+    def extract_list_of_profanity_from_results(self, results):
+        """Make a list of profanity from all the results, classified in one batch"""
+        words = []
+        for txt in results:
+            words.extend(self.extract_list_of_words(txt))
+        return self.extract_profanity(words)
 
-class ProfanityExtractor():
+class ProfanityExtractor(Reporter):
     """
     New Process
 
     Profanity Extractor should only extract profanity
     from the list of text results return by STT
+
+    lang = one language or many, like "english,tagalog" or
+    {"english", "tagalog"}, the words are scored in every language
+    in one pass
     """
-    def __init__(self, lang="english"):
+    def __init__(self, lang="english", threshold=0.5):
         """Init profanity extractor"""
         self.__profanities = []
         self.__lang = lang
+        self.__threshold = threshold
+        self.__cache = None
+        self.set_lang(lang)
+
+    def set_lang(self, lang):
+        """Set language, one or many like get_languages, each one in LANGUAGES"""
+        check_languages(lang)
+        self.__lang = lang
+
+    def set_threshold(self, threshold = 0.5):
+        """Set profanity probability threshold"""
+        self.__threshold = threshold
+
+    def set_cache(self, cache):
+        """Set TranscriptCache of the profanities, None to not use cache"""
+        self.__cache = cache
+
+    def get_threshold(self):
+        """Get profanity probability threshold"""
+        return self.__threshold
+
+    def get_cache(self):
+        """Get TranscriptCache of the profanities"""
+        return self.__cache
 
     def set_profanities(self,profanities):
         """ Set profanities """
@@ -404,6 +1625,10 @@ class ProfanityExtractor():
         """Get language"""
         return self.__lang
 
+    def get_langs(self):
+        """Get tuple of the languages"""
+        return get_languages(self.__lang)
+
     def add_profanity(self, newprofanity):
         """Add profanity"""
         profanities = self.get_profanities()
@@ -416,18 +1641,202 @@ class ProfanityExtractor():
         profanities.extend(newprofanities)
         self.set_profanities(profanities)
 
+    def get_detector(self):
+        """Return new profanity detector that share the metrics"""
+        profanity_detector = ProfanityDetector(self.get_lang(), self.get_threshold())
+        profanity_detector.set_metrics(self.get_metrics())
+        return profanity_detector
+
+    def add_extract_metrics(self, words, wall, cpu):
+        """Add the extract stage and the words classified per second"""
+        metrics = self.get_metrics()
+        metrics.add_stage("extract", wall, cpu)
+        if wall > 0:
+            metrics.set_value("extract.words_per_second", words / wall)
+
+    def save_edl(self, file, media = ""):
+        """
+        Save the profanities as edit decision list, JSON, or SRT or VTT
+        subtitles by the extension of the file
+        """
+        from .edl import EditDecisionList # pylint: disable=import-outside-toplevel
+        EditDecisionList(media, self.get_profanities()).save(file)
+
+    def stream(self, results):
+        """
+        Yield each profanity as soon as its result arrives,
+        results can be a generator like SpeechToText.stream()
+
+        The results are read in another thread, so the recognizer
+        keeps decoding while the profanities are classified.
+        Only the time spent classifying is the extract stage.
+        """
+        profanity_detector = self.get_detector()
+        metrics = self.get_metrics()
+        words = metrics.get("classify.words")
+        wall = 0.0
+        cpu = 0.0
+        try:
+            for result in iterate_in_thread(results):
+                began = time.perf_counter()
+                began_cpu = time.thread_time()
+                profanities = profanity_detector.extract_list_of_profanity(result)
+                wall += time.perf_counter() - began
+                cpu += time.thread_time() - began_cpu
+                self.extend_profanities(profanities)
+                yield from profanities
+        finally:
+            self.add_extract_metrics(metrics.get("classify.words") - words, wall, cpu)
+
     def run(self,results):
-        """Run profanity extractor"""
-        profanity_detector = ProfanityDetector(self.get_lang())
-        for result in results:
-            self.extend_profanities(
-                profanity_detector.extract_list_of_profanity(result)
-                )
+        """Run profanity extractor, use the cache if set"""
+        cache = self.get_cache()
+        detector = self.get_detector()
+        if cache is not None:
+            results = list(results)
+            # The lexicon decides words first, a change of its words changes the profanities
+            lexicon = detector.get_lexicon()
+            digest = cache.results_digest(
+                results, ",".join(self.get_langs()), self.get_threshold(),
+                "" if lexicon is None else lexicon.get_digest(self.get_langs()))
+            cached = cache.get_detections(digest)
+            if cached is not None:
+                self.extend_profanities([WordRecord.from_dict(item) for item in cached])
+                return
+
+        metrics = self.get_metrics()
+        words = metrics.get("classify.words")
+        began = time.perf_counter()
+        began_cpu = time.thread_time()
+        profanities = detector.extract_list_of_profanity_from_results(results)
+        self.add_extract_metrics(metrics.get("classify.words") - words,
+                                 time.perf_counter() - began, time.thread_time() - began_cpu)
+        self.extend_profanities(profanities)
+
+        if cache is not None:
+            cache.put_detections(digest, [word.to_dict() for word in profanities])
+
+class BleepIntervals:
+    """
+    Interval index of the spans to bleep
 
-class ProfanityBlocker:
-    """Profanity Blocker"""
-    def __init__(self):
+    The profanities are sorted, padded, and merged when they overlap or
+    the gap between them is at most merge_gap, so the number of cuts is
+    minimal. is_bleeped(t) is answered by binary search.
+    """
+
+    def __init__(self, pre_padding = 0.0, post_padding = 0.0,
+                 merge_gap = 0.1, duration = 0.0):
+        """Init bleep intervals, duration 0 means the spans are not clamped"""
+        self.__pre_padding = float(pre_padding)
+        self.__post_padding = float(post_padding)
+        self.__merge_gap = float(merge_gap)
+        self.__duration = float(duration)
+        self.__pending = []
+        self.__spans = np.zeros((0, 2))
+
+    def add(self, start, end):
+        """Add span in seconds"""
+        self.__pending.append((float(start), float(end)))
+        self.__spans = None
+
+    def extend(self, profanities):
+        """Add the spans of the profanities"""
+        for word in profanities:
+            self.add(word["start"], word["end"])
+
+    def __build(self):
+        """Sort, pad, clamp and merge the spans"""
+        spans = np.array(self.__pending, dtype=np.float64).reshape(-1, 2)
+        spans[:, 0] -= self.__pre_padding
+        spans[:, 1] += self.__post_padding
+        spans[:, 0] = np.maximum(spans[:, 0], 0.0)
+        if self.__duration > 0:
+            spans[:, 1] = np.minimum(spans[:, 1], self.__duration)
+        spans = spans[spans[:, 1] > spans[:, 0]]
+        spans = spans[np.argsort(spans[:, 0], kind="stable")]
+
+        merged = []
+        for start, end in spans.tolist():
+            if merged and start - merged[-1][1] <= self.__merge_gap:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.__spans = np.array(merged, dtype=np.float64).reshape(-1, 2)
+
+    def get_spans(self):
+        """Get the final spans, array of shape (n, 2) of start and end"""
+        if self.__spans is None:
+            self.__build()
+        return self.__spans
+
+    def is_bleeped(self, time):
+        """Return boolean if the time in seconds is bleeped"""
+        spans = self.get_spans()
+        index = np.searchsorted(spans[:, 0], time, side="right") - 1
+        return bool(index >= 0 and time < spans[index, 1])
+
+    def get_bleeped_duration(self):
+        """Get seconds bleeped"""
+        spans = self.get_spans()
+        return float(np.sum(spans[:, 1] - spans[:, 0]))
+
+    def __iter__(self):
+        """Iterate the spans as (start, end)"""
+        return iter([tuple(span) for span in self.get_spans().tolist()])
+
+    def __len__(self):
+        """Return number of spans"""
+        return len(self.get_spans())
+
+class ProfanityBlocker(Reporter):
+    """
+    Profanity Blocker
+
+    Engines:
+
+    filter = one ffmpeg pass, mutes the profanities and mixes
+    the bleep in with a generated filter_complex, video is copied
+
+    clips = split, replace and concat the clips (old process)
+
+    smart = stream copy the clean GOPs, only the GOPs with a
+    profanity are re-encoded, then joined losslessly
+
+    remux = extract the audio track once, block the audio track alone,
+    then remux it with the video stream copied
+
+    pcm = decode the audio once to NumPy, bleep the samples in memory
+    and pipe them to the encoder, the video stream is copied
+
+    The video can also be an AudioFile, the blocked file is then audio only
+    """
+
+    ENGINES = ("filter", "clips", "smart", "remux", "pcm")
+
+    # Encoder of the audio by the codec name of the source
+    AUDIO_ENCODERS = {"mp3": "libmp3lame", "opus": "libopus", "vorbis": "libvorbis"}
+
+    # Encoder of the re-encoded GOPs by the codec of the video,
+    # used if no encoder of the codec is working
+    SMART_ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+    # Pixel formats the hardware encoders can encode without conversion
+    HARDWARE_PIX_FMTS = ("yuv420p", "yuvj420p", "nv12")
+    # Preset of the hardware encoders by the libx264 preset
+    HARDWARE_PRESETS = {
+        "_nvenc": {"ultrafast": "p1", "superfast": "p1", "veryfast": "p2", "faster": "p3",
+                   "fast": "p4", "medium": "p4", "slow": "p5", "slower": "p6",
+                   "veryslow": "p7"},
+        "_qsv": {"ultrafast": "veryfast", "superfast": "veryfast"},
+    }
+    # MPEG-TS keeps the parameter sets in band, so GOPs encoded
+    # differently can be joined
+    SMART_SEGMENT_EXTENSION = "ts"
+
+    def __init__(self, engine = "filter"):
         """Init profanity blocker"""
+        self.check_engine(engine)
+        self.__engine = engine
         self.__video = VideoFile()
         self.__audio = AudioFile()
         self.__clips = []
@@ -435,11 +1844,91 @@ class ProfanityBlocker:
         self.__clips_directory = ""
         self.__save_directory = ""
         self.__file_location = ""
+        self.__workspace_root = ""
+        self.__workspace_budget = 0
+        self.__workspace = None
+        self.__reencoded_duration = 0.0
+        self.__tone = 0.0
+        self.__fade = 0.005
+        self.__attenuation = 0.0
+        self.__memory_limit = 512 * 1024 ** 2
+        self.__subprocess_timeout = 0.0
+        self.__padding = (0.0, 0.0)
+        self.__merge_gap = 0.1
+        self.__prepared = {}
+        self.__processes = []
+        self.__processes_lock = threading.Lock()
+        self.__cancelled = threading.Event()
+        self.__encoder = "auto"
+        self.__preset = "veryfast"
+        self.__threads = 0
+        self.__crf = 23
+
+    def set_engine(self, engine = "filter"):
+        """Set blocking engine"""
+        self.check_engine(engine)
+        self.__engine = engine
 
     def set_video(self, video):
         """Set video"""
         self.__video = video
 
+    def set_tone(self, frequency = 1000.0):
+        """
+        Set frequency of the sine tone of the pcm engine,
+        0 to use the bleep AudioFile instead
+        """
+        self.__tone = float(frequency)
+
+    def set_padding(self, pre_padding = 0.0, post_padding = 0.0):
+        """Set seconds bleeped before and after each profanity"""
+        self.__padding = (float(pre_padding), float(post_padding))
+
+    def set_merge_gap(self, merge_gap = 0.1):
+        """Set the longest gap in seconds between profanities bleeped as one"""
+        self.__merge_gap = float(merge_gap)
+
+    def set_fade(self, fade = 0.005):
+        """Set seconds of the crossfade at the edges of the bleep of the pcm engine"""
+        self.__fade = float(fade)
+
+    def set_attenuation(self, attenuation = 0.0):
+        """Set volume left of the profanity in the pcm engine, 0.0 is muted"""
+        self.__attenuation = float(attenuation)
+
+    def set_memory_limit(self, memory_limit):
+        """
+        Set bytes of decoded audio kept in memory by the pcm engine,
+        longer audio is memory mapped from a file in the clips directory
+        """
+        self.__memory_limit = int(memory_limit)
+
+    def set_subprocess_timeout(self, timeout = 0.0):
+        """
+        Set seconds a FFMPEG command can run before it is killed,
+        0 for 60 seconds plus 10 times the duration of the video
+        """
+        self.__subprocess_timeout = float(timeout)
+
+    def set_encoder(self, encoder = "auto", preset = "veryfast", threads = 0, crf = 23):
+        """
+        Set the video encoding of the clips and smart engines
+
+        encoder = FFMPEG encoder like libx264 or h264_nvenc, "auto" for the fastest
+        working encoder (stream copy the clips if they are cut at keyframes),
+        "copy" to stream copy the clips
+
+        preset = libx264 preset, mapped to the preset of the hardware encoders
+
+        threads = threads of the encoder, 0 for FFMPEG to decide
+
+        crf = quality, lower is better and bigger
+        """
+        self.__encoder = encoder
+        self.__preset = preset
+        self.__threads = int(threads)
+        self.__crf = int(crf)
+
     def set_audio(self, audio):
         """Set audio"""
         self.__audio = audio
@@ -458,6 +1947,16 @@ class ProfanityBlocker:
         if not os.path.exists(self.__clips_directory):
             os.makedirs(self.__clips_directory)
 
+    def set_workspace(self, root = "", budget = 0):
+        """
+        Set where the workspace of each job is made, "" for the clips directory,
+        bleepy.workspace.get_ram_directory() for RAM backed storage.
+        budget = bytes a job can write, 0 for the free space of the disk.
+        An engine that needs more falls back to the filter engine.
+        """
+        self.__workspace_root = root
+        self.__workspace_budget = int(budget)
+
     def set_save_directory(self,directory):
         """Set save directory name, if not exist, create it"""
         self.__save_directory = self.decorate_dir_name(directory)
@@ -473,6 +1972,10 @@ class ProfanityBlocker:
         directory = directory.replace("\\","/")
         return directory if "/" == directory[-1] or directory == "" else directory+"/"
 
+    def get_engine(self):
+        """Get blocking engine"""
+        return self.__engine
+
     def get_video(self):
         """Get video"""
         return self.__video
@@ -493,6 +1996,47 @@ class ProfanityBlocker:
         """Get clips directory"""
         return self.__clips_directory
 
+    def get_workspace_root(self):
+        """Get where the workspace of each job is made"""
+        return self.__workspace_root or self.get_clips_directory() or "."
+
+    def get_workspace_budget(self):
+        """Get bytes a job can write in its workspace, 0 for no limit"""
+        return self.__workspace_budget
+
+    def get_workspace(self):
+        """
+        Get workspace of the running job, if no job is running a workspace
+        is made for split, replace and concat called directly, it is removed
+        by close_workspace or when the process exit
+        """
+        if self.__workspace is None:
+            self.__workspace = Workspace(self.get_workspace_root(),
+                                         self.get_workspace_budget()).open()
+        return self.__workspace
+
+    def close_workspace(self):
+        """Remove the workspace made by get_workspace"""
+        if self.__workspace is not None:
+            self.__workspace.cleanup()
+            self.__workspace = None
+
+    @contextlib.contextmanager
+    def use_workspace(self):
+        """
+        Use the workspace of the running job, or a new workspace that is
+        removed at the end, on success, failure or interrupt
+        """
+        if self.__workspace is not None:
+            yield self.__workspace
+            return
+        with Workspace(self.get_workspace_root(), self.get_workspace_budget()) as workspace:
+            self.__workspace = workspace
+            try:
+                yield workspace
+            finally:
+                self.__workspace = None
+
     def get_save_directory(self):
         """Get save directory"""
         return self.__save_directory
@@ -501,20 +2045,382 @@ class ProfanityBlocker:
         """Get file location"""
         return self.__file_location
 
-    def get_clip_dir_for_concat(self):
-        """Get directory for concat"""
-        return "../" * self.get_clips_directory().count("/")
+    def get_padding(self):
+        """Get seconds bleeped before and after each profanity"""
+        return self.__padding
+
+    def get_merge_gap(self):
+        """Get the longest gap between profanities bleeped as one"""
+        return self.__merge_gap
+
+    def get_tone(self):
+        """Get frequency of the sine tone, 0 if the bleep AudioFile is used"""
+        return self.__tone
+
+    def get_fade(self):
+        """Get seconds of the crossfade"""
+        return self.__fade
+
+    def get_attenuation(self):
+        """Get volume left of the profanity"""
+        return self.__attenuation
+
+    def get_memory_limit(self):
+        """Get bytes of decoded audio kept in memory"""
+        return self.__memory_limit
+
+    def get_subprocess_timeout(self):
+        """Get seconds a FFMPEG command can run before it is killed"""
+        if self.__subprocess_timeout > 0:
+            return self.__subprocess_timeout
+        return 60.0 + 10.0 * self.get_video().get_duration()
+
+    def get_encoder(self):
+        """Get encoder, "auto" for the fastest working encoder"""
+        return self.__encoder
+
+    def get_preset(self):
+        """Get preset of the encoder"""
+        return self.__preset
+
+    def get_threads(self):
+        """Get threads of the encoder, 0 for FFMPEG to decide"""
+        return self.__threads
+
+    def get_crf(self):
+        """Get quality of the encoder"""
+        return self.__crf
+
+    def is_hardware_encoder(self, encoder):
+        """Return boolean if the encoder is a hardware encoder"""
+        return any(encoder.endswith(suffix) for suffix in self.HARDWARE_PRESETS)
+
+    def get_video_encoder(self, codec = "h264", stream = None):
+        """
+        Return the encoder set, or the fastest working encoder of the codec
+
+        stream = probe of the video stream the encoded video is joined with,
+        then the encoder set is only used if it encodes the same codec, and
+        a hardware encoder only if it can encode the pixel format
+        """
+        encoder = self.get_encoder()
+        probe = get_encoder_probe()
+        if stream is not None and probe.get_codec(encoder) != codec:
+            encoder = "auto"
+        if encoder in ("auto", "copy"):
+            encoder = probe.get_best(codec) or self.SMART_ENCODERS.get(codec, "libx264")
+        if (stream is not None and self.is_hardware_encoder(encoder)
+                and stream.get("pix_fmt", "yuv420p") not in self.HARDWARE_PIX_FMTS):
+            encoder = self.SMART_ENCODERS.get(codec, "libx264")
+        return encoder
+
+    def get_stream_match_args(self, encoder, stream):
+        """
+        Return FFMPEG args that encode the profile and level of the stream,
+        so the parameter sets of the re-encoded GOPs match the copied GOPs
+        """
+        args = []
+        # "High 10" is high10, "Constrained Baseline" is baseline
+        profile = "".join(char for char in stream.get("profile", "").lower()
+                          if char.isalnum()).replace("constrained", "")
+        profile = {"high444predictive": "high444"}.get(profile, profile)
+        if self.is_hardware_encoder(encoder) and profile == "high444":
+            profile = "high444p"
+        if profile:
+            args += ['-profile:v', profile]
+        # The parameter sets are repeated in band at each keyframe
+        x265_params = ["log-level=error", "repeat-headers=1"]
+        level = int(stream.get("level", 0) or 0)
+        if level > 0:
+            # H.264 levels are 10 times the level, HEVC levels are 30 times
+            level = f"{level / (30 if stream.get('codec_name') == 'hevc' else 10):.1f}"
+            if encoder == "libx265":
+                x265_params.append(f"level-idc={level}")
+            else:
+                args += ['-level', level]
+        if encoder == "libx265":
+            args += ['-x265-params', ":".join(x265_params)]
+        return args
+
+    def get_video_encode_args(self, codec = "h264", stream = None):
+        """
+        Return FFMPEG args that encode the video with the encoder, preset, threads and crf,
+        and the profile and level of the stream if it is given
+        """
+        encoder = self.get_video_encoder(codec, stream)
+        args = ['-c:v', encoder]
+        for suffix, presets in self.HARDWARE_PRESETS.items():
+            if encoder.endswith(suffix):
+                quality = '-cq' if suffix == "_nvenc" else '-global_quality'
+                args += ['-preset', presets.get(self.get_preset(), self.get_preset()),
+                         quality, str(self.get_crf())]
+                break
+        else:
+            if encoder in self.SMART_ENCODERS.values():
+                args += ['-preset', self.get_preset(), '-crf', str(self.get_crf())]
+        if self.get_threads() > 0:
+            args += ['-threads', str(self.get_threads())]
+        if stream is not None:
+            args += self.get_stream_match_args(encoder, stream)
+        return args
+
+    def add_encode_metrics(self, duration, began):
+        """
+        Add the seconds of video encoded since began (perf_counter)
+        to the metrics, the encode fps is the frames of all the encodes
+        by their wall time
+        """
+        metrics = self.get_metrics()
+        metrics.add("encode.frames", duration * self.get_video().get_frame_rate())
+        metrics.add("encode.seconds", time.perf_counter() - began)
+        if metrics.get("encode.seconds") > 0:
+            metrics.set_value("encode.fps",
+                              metrics.get("encode.frames") / metrics.get("encode.seconds"))
+
+    def get_reencoded_duration(self):
+        """Get seconds of video re-encoded by the last smart render"""
+        return self.__reencoded_duration
 
     def get_clip_duration(self,end,start):
         """Get clip duration"""
         return float(end) - float(start)
 
+    def is_engine_exist(self, engine):
+        """Return boolean if engine exist"""
+        return engine in self.ENGINES
+
+    def check_engine(self, engine):
+        """Check engine if exist"""
+        if not self.is_engine_exist(engine):
+            print (
+                f"Warning: Engine ({engine}) not found."+
+                f" Please use one of the engines {self.ENGINES}")
+            sys.exit()
+
+    def get_blocked_file_name(self):
+        """Return new file name of the blocked file in the save directory"""
+        file_ext = self.get_video().get_file_extension()
+        return f"{self.get_save_directory()}blocked{uuid.uuid4()}.{file_ext}"
+
+    def get_bleep_intervals(self, profanities):
+        """Return BleepIntervals of the profanities with the padding and merge gap"""
+        intervals = BleepIntervals(*self.get_padding(), self.get_merge_gap(),
+                                   self.get_video().get_duration())
+        intervals.extend(profanities)
+        return intervals
+
+    def get_bleep_spans(self, profanities):
+        """Return sorted list of merged (start, end) of the profanities in seconds"""
+        return list(self.get_bleep_intervals(profanities))
+
+    def get_filter_complex(self, spans, media_input = 0, bleep_input = 1):
+        """
+        Return the filter_complex that mute the spans of the
+        video audio (input 0) and mix the bleep audio (input 1) in each span
+
+        ```
+        [0:a]volume=0:enable='between(t,1.2,1.5)+...'[muted];
+        [1:a]asplit=2[b0][b1];
+        [b0]atrim=duration=0.3,asetpts=PTS-STARTPTS,adelay=1200:all=1[d0];
+        ...
+        [muted][d0][d1]amix=inputs=3:duration=first:normalize=0[aout]
+        ```
+        """
+        if not spans:
+            return f"[{media_input}:a]anull[aout]"
+
+        mute = "+".join(f"between(t,{start:.3f},{end:.3f})" for start, end in spans)
+        graph = [f"[{media_input}:a]volume=0:enable='{mute}'[muted]"]
+
+        bleeps = "".join(f"[b{i}]" for i in range(len(spans)))
+        if len(spans) == 1:
+            graph.append(f"[{bleep_input}:a]anull{bleeps}")
+        else:
+            graph.append(f"[{bleep_input}:a]asplit={len(spans)}{bleeps}")
+
+        for i, (start, end) in enumerate(spans):
+            graph.append(
+                f"[b{i}]atrim=duration={end - start:.3f},asetpts=PTS-STARTPTS,"+
+                f"adelay={round(start * 1000)}:all=1[d{i}]")
+
+        delayed = "".join(f"[d{i}]" for i in range(len(spans)))
+        graph.append(
+            f"[muted]{delayed}amix=inputs={len(spans) + 1}"+
+            ":duration=first:dropout_transition=0:normalize=0[aout]")
+        return ";".join(graph)
+
+    def get_bleep_input_args(self, spans):
+        """
+        Return FFMPEG input args of the bleep, looped just enough times to
+        cover the longest span. An endless loop split into many spans can
+        hang FFMPEG, so the input is always finite.
+        """
+        longest = max((end - start for start, end in spans), default=0.0)
+        duration = self.get_audio().get_duration()
+        loops = math.ceil(longest / duration) if duration > 0 else 0
+        return ['-stream_loop', str(loops), '-i', self.get_audio().get_file()]
+
+    def get_bleep_cmd(self, spans, blockfilename):
+        """
+        Return FFMPEG Command that block the spans in one pass
+
+        The bleep is looped so it can cover spans longer than the bleep sound
+        """
+        return ['ffmpeg', '-y', '-loglevel', 'error',
+                '-i', self.get_video().get_file(),
+                *self.get_bleep_input_args(spans),
+                '-filter_complex', self.get_filter_complex(spans),
+                '-map', '0:v?', '-map', '[aout]', '-map_metadata', '0',
+                '-c:v', 'copy', *self.get_audio_encode_args(), blockfilename]
+
     def run_subprocess(self,process):
-        """Run subprocess"""
-        while True:
-            data = process.stdout.read(4000)
-            if len(data) == 0:
-                break
+        """
+        Run subprocess, wait for it and add it to the metrics,
+        it is killed if it runs longer than the subprocess timeout
+        """
+        began = time.perf_counter()
+        timeout = self.get_subprocess_timeout()
+        timer = threading.Timer(timeout, process.kill)
+        timer.daemon = True
+        timer.start()
+        try:
+            while True:
+                data = process.stdout.read(4000)
+                if len(data) == 0:
+                    break
+            process.wait()
+        finally:
+            timer.cancel()
+        if time.perf_counter() - began >= timeout and process.returncode != 0:
+            print(f"Warning: FFMPEG was killed after {timeout:g}s ({process.args[-1]})")
+        self.add_subprocess_metrics(process.args, began, process.returncode)
+
+    def add_subprocess_metrics(self, cmd, began, returncode):
+        """Add the subprocess that started at began (perf_counter) to the metrics"""
+        if isinstance(cmd, str):
+            cmd = cmd.split(" ", 1)
+        self.get_metrics().add_subprocess(cmd, time.perf_counter() - began, returncode)
+
+    def popen(self, cmd, **kwargs):
+        """
+        Start the subprocess like subprocess.Popen, it is killed by
+        kill_subprocesses. Raise SubprocessError if the job is cancelled.
+        """
+        with self.__processes_lock:
+            if self.__cancelled.is_set():
+                raise subprocess.SubprocessError("Profanity Blocker is cancelled")
+            process = subprocess.Popen(cmd, **kwargs)
+            self.__processes = [running for running in self.__processes
+                                if running.poll() is None] + [process]
+        return process
+
+    def kill_subprocesses(self):
+        """Cancel the job, kill the running subprocesses and do not start new ones"""
+        with self.__processes_lock:
+            self.__cancelled.set()
+            for process in self.__processes:
+                if process.poll() is None:
+                    process.kill()
+            self.__processes = []
+
+    def run_ffmpeg(self, cmd):
+        """Run FFMPEG command, wait for it and return the return code"""
+        process = self.popen(cmd, stdout=subprocess.PIPE)
+        self.run_subprocess(process)
+        return process.returncode
+
+    async def run_ffmpeg_async(self, cmd):
+        """Run FFMPEG command as asyncio subprocess and return the return code"""
+        began = time.perf_counter()
+        try:
+            returncode = await asyncio.wait_for(run_subprocess_async(cmd),
+                                                self.get_subprocess_timeout())
+        except asyncio.TimeoutError:
+            print(f"Warning: FFMPEG was killed after {self.get_subprocess_timeout():g}s"+
+                  f" ({cmd[-1]})")
+            returncode = -9
+        self.add_subprocess_metrics(cmd, began, returncode)
+        return returncode
+
+    def run_steps(self, steps):
+        """Run each FFMPEG command yielded by the steps, the return code is sent back"""
+        returncode = None
+        try:
+            while True:
+                returncode = self.run_ffmpeg(steps.send(returncode))
+        except StopIteration:
+            pass
+        finally:
+            steps.close()
+
+    async def run_steps_async(self, steps):
+        """Run the steps with asyncio subprocesses, the files are removed if cancelled"""
+        returncode = None
+        try:
+            while True:
+                returncode = await self.run_ffmpeg_async(steps.send(returncode))
+        except StopIteration:
+            pass
+        finally:
+            steps.close()
+
+    def bleep(self, profanities):
+        """
+        Block the profanities in one FFMPEG pass,
+        no clips are written in the clips directory
+        """
+        self.run_steps(self.bleep_steps(profanities))
+
+    def bleep_steps(self, profanities):
+        """Yield the FFMPEG commands of the filter engine"""
+        self.log("Bleep")
+        spans = self.get_bleep_spans(profanities)
+        blockfilename = self.get_blocked_file_name()
+        cmd = self.get_bleep_cmd(spans, blockfilename)
+        self.log(" ".join(cmd))
+
+        if (yield cmd) != 0 or not os.path.exists(blockfilename):
+            print(f"Warning: FFMPEG failed to block ({self.get_video().get_file()})")
+            return
+
+        self.set_file_location(blockfilename)
+        self.log("The profanities are now block")
+
+    def get_clip_video_args(self, profanities):
+        """
+        Return FFMPEG args of the video of the clips, stream copy if
+        every cut is at a keyframe, so the clips can be joined
+        """
+        if self.get_encoder() == "copy":
+            return ['-c:v', 'copy']
+        # The keyframes are only probed if the clips could be copied
+        keyframes = self.get_video().get_keyframes() if self.get_encoder() == "auto" else []
+        cuts = [round(float(word[key]), 2) for word in profanities for key in ("start", "end")]
+        if (keyframes and
+                all(abs(keyframes[min(bisect.bisect_left(keyframes, cut - 0.01),
+                                      len(keyframes) - 1)] - cut) <= 0.01
+                    for cut in cuts)):
+            return ['-c:v', 'copy']
+        stream = self.get_video().get_video_stream() or {}
+        codec = stream.get("codec_name", "h264")
+        return self.get_video_encode_args(codec if codec in self.SMART_ENCODERS else "h264")
+
+    def get_clip_cmd(self, start, duration, name, video_args):
+        """Return FFMPEG Command that cut the clip from start"""
+        return ['ffmpeg', '-y', '-loglevel', 'error', '-ss', f"{start}",
+                '-i', self.get_video().get_file(), '-t', f"{duration}",
+                *video_args, name]
+
+    def run_clip(self, start, duration, name, video_args):
+        """Cut the clip, return boolean if it is created"""
+        cmd = self.get_clip_cmd(start, duration, name, video_args)
+        began = time.perf_counter()
+        if self.run_ffmpeg(cmd) != 0 or not os.path.exists(name):
+            return False
+        if video_args[1] != "copy":
+            self.add_encode_metrics(duration, began)
+        self.log(" ".join(cmd))
+        return True
 
     def split(self,profanities):
         """Do split"""
@@ -522,12 +2428,13 @@ class ProfanityBlocker:
 
         videoduration = self.get_video().get_duration()
         file_ext = self.get_video().get_file_extension()
-        file_location = self.get_video().get_file()
+        video_args = self.get_clip_video_args(profanities)
+        self.log(f"Video of the clips: {' '.join(video_args)}")
 
         laststart = 0.0
-        print("SPLIT")
+        self.log("SPLIT")
         for word in profanities:
-            print(word["word"])
+            self.log(word["word"])
             word["start"] = round(float(word["start"]),2)
             word["end"] = round(float(word["end"]),2)
             wordduration = round(self.get_clip_duration(word["start"],laststart),2)
@@ -538,89 +2445,62 @@ class ProfanityBlocker:
             if float(word["start"]) != float(laststart):
                 if wordduration > 1:
                     clipinfo = {
-                        # "name":self.get_clips_directory()+"not"+str(uuid.uuid4())+"."+file_ext,
-                        "name":f"{self.get_clips_directory()}not{uuid.uuid4()}.{file_ext}",
+                        "name":self.get_workspace().path(f"not{uuid.uuid4()}.{file_ext}"),
                         "isProfanity":False
                     }
 
-                    txtnoprofanity = (
-                        f"ffmpeg -i \"{file_location}\" -ss {laststart}"+
-                        f" -t {wordduration} -c:v h264_nvenc {clipinfo['name']}")
-
-                    vidprocess = subprocess.Popen(txtnoprofanity, stdout=subprocess.PIPE)
-
-                    self.run_subprocess(vidprocess)
-
-                    if os.path.exists(clipinfo["name"]):
-                        print(txtnoprofanity)
+                    if self.run_clip(laststart, wordduration, clipinfo["name"], video_args):
                         clips.append(clipinfo)
 
             clipinfo = {
-                "name":f"{self.get_clips_directory()}profanity{uuid.uuid4()}.{file_ext}",
+                "name":self.get_workspace().path(f"profanity{uuid.uuid4()}.{file_ext}"),
                 "isProfanity":True
             }
 
-            txtprofanity = "ffmpeg -i \"{}\" -ss {} -t {} -c:v h264_nvenc {}"
-
             templaststart = float(word["end"])
             if (videoduration - templaststart) < 1:
                 # If the last clip is not long enough,
                 # it will be attach already from the previous clip
+                start = word["start"]
                 duration = round(profanityduration+(videoduration - templaststart),2)
-                txtprofanity = txtprofanity.format(
-                    file_location,word["start"], duration,clipinfo["name"]
-                    )
                 laststart = videoduration
             elif wordduration < 1:
                 #If the no profanity clip is less than 1
+                start = laststart
                 duration = round(profanityduration+wordduration,2)
-                txtprofanity = txtprofanity.format(
-                    file_location,laststart, duration,clipinfo["name"]
-                    )
                 laststart = float(word["end"])
             else:
-                txtprofanity = txtprofanity.format(
-                    file_location,word["start"], profanityduration,clipinfo["name"]
-                    )
+                start = word["start"]
+                duration = profanityduration
                 laststart = float(word["end"])
 
-            vidprocess = subprocess.Popen(txtprofanity, stdout=subprocess.PIPE)
-            self.run_subprocess(vidprocess)
-
-            if os.path.exists(clipinfo["name"]):
-                print(txtprofanity)
+            if self.run_clip(start, duration, clipinfo["name"], video_args):
                 clips.append(clipinfo)
 
 
         if float(laststart) != float(videoduration):
 
             clipinfo = {
-                "name":self.get_clips_directory()+"last"+str(uuid.uuid4())+"."+file_ext,
+                "name":self.get_workspace().path(f"last{uuid.uuid4()}.{file_ext}"),
                 "isProfanity":False
             }
             duration = round((videoduration-laststart),2)
-            lastclip = (
-                f"ffmpeg -i \"{file_location}\" -ss {laststart}"+
-                f" -t {duration} -c:v h264_nvenc {clipinfo['name']}")
-
-            vidprocess = subprocess.Popen(lastclip, stdout=subprocess.PIPE)
-            self.run_subprocess(vidprocess)
 
-            if os.path.exists(clipinfo["name"]):
-                print(lastclip)
+            if self.run_clip(laststart, duration, clipinfo["name"], video_args):
                 clips.append(clipinfo)
 
         self.set_clips(clips)
         self.set_trash_clips(self.get_clips().copy())
 
     def replace(self):
+        """Replace the audio of the profanity clips with the bleep"""
         file_ext = self.get_video().get_file_extension()
 
         # trashclips = clips.copy()
         clips = self.get_clips()
         trashclips = self.get_trash_clips()
 
-        print("Replace")
+        self.log("Replace")
         audio_file_location = self.get_audio().get_file()
 
         for i in range(len(clips)):
@@ -629,16 +2509,14 @@ class ProfanityBlocker:
                 trashclips.append(clip)
 
                 #ready to be replace
-                replacename = f"{self.get_clips_directory()}replaced{uuid.uuid4()}.{file_ext}"
-                txtreplaced = (
-                    f"ffmpeg -i {clip['name']} -i \"{audio_file_location}\""+
-                    f" -map 0:v -map 1:a -c:v copy -shortest {replacename}")
+                replacename = self.get_workspace().path(f"replaced{uuid.uuid4()}.{file_ext}")
+                cmd = ['ffmpeg', '-y', '-loglevel', 'error', '-i', clip['name'],
+                       '-i', audio_file_location, '-map', '0:v', '-map', '1:a',
+                       '-c:v', 'copy', '-shortest', replacename]
 
+                self.run_ffmpeg(cmd)
 
-                vidprocess = subprocess.Popen(txtreplaced, stdout=subprocess.PIPE)
-                self.run_subprocess(vidprocess)
-
-                print(txtreplaced)
+                self.log(" ".join(cmd))
                 clip["name"] = replacename
                 clips[i] = clip
 
@@ -646,65 +2524,590 @@ class ProfanityBlocker:
         self.set_trash_clips(trashclips)
 
     def concat(self):
-        file_ext = self.get_video().get_file_extension()
+        """Concat the clips, the clips are removed with the workspace"""
         clips = self.get_clips()
-        trashclips = self.get_trash_clips()
-
-        print("Concat")
-        txtfilename = f"{self.get_clips_directory()}listofclips{uuid.uuid4()}.txt"
 
+        self.log("Concat")
+        # One write of the whole list
+        txtfilename = self.get_workspace().write_text(
+            f"listofclips{uuid.uuid4()}.txt",
+            "".join(f"file '{os.path.abspath(clip['name'])}'\n" for clip in clips))
         for clip in clips:
+            self.log(clip["name"])
 
-            try:
-                f = open(txtfilename, "a")
-                f.write(f"file {self.get_clip_dir_for_concat()}{clip['name']}\n")
-                f.close()
-            finally:
-                print(clip["name"])
+        #concat
+        self.log("\nFFMPEG CONCAT FINAL:----")
 
+        blockfilename = self.get_blocked_file_name()
 
-        #concat
-        print("\nFFMPEG CONCAT FINAL:----")
+        cmd = ['ffmpeg', '-y', '-loglevel', 'error', '-safe', '0', '-f', 'concat',
+               '-i', txtfilename, '-c', 'copy', blockfilename]
 
-        blockfilename = f"{self.get_save_directory()}blocked{uuid.uuid4()}.{file_ext}"
+        self.run_ffmpeg(cmd)
 
-        txtconcat = f"ffmpeg -safe 0 -f concat -i \"{txtfilename}\" -c copy \"{blockfilename}\""
+        self.log(" ".join(cmd))
 
-        vidprocess = subprocess.Popen(txtconcat, stdout=subprocess.PIPE)
-        self.run_subprocess(vidprocess)
+        if not os.path.exists(blockfilename):
+            print(f"Warning: FFMPEG failed to concat ({self.get_video().get_file()})")
+            return
 
-        print(txtconcat)
+        self.set_file_location(blockfilename)
+        self.log("The profanities are now block")
 
-        f = open(txtfilename, "a")
-        f.write("\n\nDeleting Clips... \n\n")
-        f.close()
+    def is_smart_render_possible(self):
+        """Return boolean if the video can be smart rendered"""
+        video = self.get_video()
+        stream = video.get_video_stream()
+        return (stream is not None and stream.get("codec_name") in self.SMART_ENCODERS
+                and len(video.get_keyframes()) > 0)
 
-        for trashclip in trashclips:
-            try:
-                f = open(txtfilename, "a")
+    def get_dirty_ranges(self, spans):
+        """
+        Return list of (start, end) of the GOPs that contain the spans,
+        start and end are keyframes or the end of the video
+        """
+        keyframes = self.get_video().get_keyframes()
+        duration = self.get_video().get_duration()
+        ranges = []
+        for start, end in spans:
+            # last keyframe at or before the start
+            index = bisect.bisect_right(keyframes, start) - 1
+            gop_start = keyframes[max(index, 0)]
+            # first keyframe at or after the end
+            index = bisect.bisect_left(keyframes, end)
+            gop_end = keyframes[index] if index < len(keyframes) else duration
+            if ranges and gop_start <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], gop_end))
+            else:
+                ranges.append((gop_start, gop_end))
+        return ranges
 
-                if os.path.exists(trashclip["name"]):
-                    os.remove(trashclip["name"])
-                    f.write(f"deleted clip {trashclip['name']}\n")
-                else:
-                    f.write(f"not_deleted clip {trashclip['name']}\n")
-            finally:
-                f.close()
+    def get_segment_cmd(self, times, pattern, listfilename = ""):
+        """
+        Return FFMPEG Command that stream copy the video into segments
+        cut at the times, which are keyframes. The segments written,
+        with their start and end, are listed as CSV in the list file.
+        """
+        # cut at the keyframe even if the time is rounded a bit above it
+        times = ",".join(f"{max(time - 0.001, 0.0):.6f}" for time in times)
+        cmd = ['ffmpeg', '-y', '-loglevel', 'error', '-i', self.get_video().get_file(),
+               '-map', '0:v:0', '-c', 'copy', '-f', 'segment', '-segment_times', times,
+               '-reset_timestamps', '1']
+        if listfilename != "":
+            cmd += ['-segment_list', listfilename, '-segment_list_type', 'csv']
+        return cmd + [pattern]
+
+    def is_segments_written(self, listfilename, names, segments):
+        """
+        Return boolean if the segments listed are the names, cut at the
+        starts of the segments within two frames. A time before the first
+        keyframe or a time dropped by the segment muxer shifts the cuts.
 
+        The cuts are compared from the first cut, the listed times
+        can be shifted by the start time of the video.
+        """
         try:
-            f = open(txtfilename, "a")
-            f.write("\n\nThe Bleeped file saved in: "+blockfilename)
-        finally:
-            f.close()
+            with open(listfilename, encoding="utf-8") as listfile:
+                written = [line.strip().rsplit(",", 2) for line in listfile if line.strip()]
+        except OSError:
+            return False
+        if len(written) != len(segments) or any(
+                os.path.basename(name) != os.path.basename(entry[0])
+                for name, entry in zip(names, written)):
+            return False
+        tolerance = max(0.1, 2 / (self.get_video().get_frame_rate() or 25))
+        cuts = [float(entry[1]) for entry in written[1:]]
+        return all(abs((cut - cuts[0]) - (start - segments[1][0])) <= tolerance
+                   for cut, (start, _, _) in zip(cuts, segments[1:]))
+
+    def get_reencode_cmd(self, start, end, name):
+        """Return FFMPEG Command that re-encode the video from start to end"""
+        stream = self.get_video().get_video_stream()
+        return ['ffmpeg', '-y', '-loglevel', 'error', '-ss', f"{start:.6f}",
+                '-i', self.get_video().get_file(), '-t', f"{end - start:.6f}",
+                '-map', '0:v:0', *self.get_video_encode_args(stream["codec_name"], stream),
+                '-pix_fmt', stream.get("pix_fmt", "yuv420p"), name]
+
+    def get_join_cmd(self, txtfilename, spans, blockfilename):
+        """
+        Return FFMPEG Command that join the video segments losslessly
+        and mux them with the audio blocked in one pass
+        """
+        return ['ffmpeg', '-y', '-loglevel', 'error',
+                '-f', 'concat', '-safe', '0', '-i', txtfilename,
+                '-i', self.get_video().get_file(),
+                *self.get_bleep_input_args(spans),
+                '-filter_complex', self.get_filter_complex(spans, 1, 2),
+                '-map', '0:v', '-map', '[aout]', '-map_metadata', '1',
+                '-c:v', 'copy', blockfilename]
+
+    def smart_render(self, profanities):
+        """
+        Block the profanities by re-encoding only the GOPs with a profanity,
+        the clean GOPs are stream copied and all are joined by concat.
+
+        The audio is not cut, it is blocked in one pass when the video
+        is joined, so it does not drift at the cuts.
+        Fall back to the filter engine if the video cannot be smart rendered.
+        """
+        self.run_steps(self.smart_render_steps(profanities))
+
+    def smart_render_steps(self, profanities):
+        """Yield the FFMPEG commands of the smart engine"""
+        if not self.is_smart_render_possible():
+            print("Warning: Video cannot be smart rendered, the filter engine is used")
+            yield from self.bleep_steps(profanities)
+            return
+
+        with self.use_workspace() as workspace:
+            # The segments are about the size of the video
+            if not workspace.reserve(os.path.getsize(self.get_video().get_file())):
+                print("Warning: Workspace is too small to smart render, the filter engine is used")
+                yield from self.bleep_steps(profanities)
+                return
+
+            self.log("Smart Render")
+            spans = self.get_bleep_spans(profanities)
+            duration = self.get_video().get_duration()
+
+            segments = []
+            position = 0.0
+            for start, end in self.get_dirty_ranges(spans) + [(duration, duration)]:
+                if start > position:
+                    segments.append((position, start, False))
+                if end > start:
+                    segments.append((start, end, True))
+                position = end
+
+            prefix = workspace.path(f"segment{uuid.uuid4()}")
+            ext = self.SMART_SEGMENT_EXTENSION
+            names = [f"{prefix}-{i:05d}.{ext}" for i in range(len(segments))]
+            self.__reencoded_duration = 0.0
+
+            # One stream copy of the whole video, cut at the keyframes
+            listfilename = f"{prefix}.csv"
+            cmd = self.get_segment_cmd([start for start, _, _ in segments[1:]],
+                                       f"{prefix}-%05d.{ext}", listfilename)
+            self.log(" ".join(cmd))
+            failed = (yield cmd) != 0
+
+            if not failed and not self.is_segments_written(listfilename, names, segments):
+                print("Warning: FFMPEG did not cut the segments at the keyframes,"+
+                      " the filter engine is used")
+                yield from self.bleep_steps(profanities)
+                return
+
+            for name, (start, end, is_dirty) in zip(names, segments):
+                if failed:
+                    break
+                if is_dirty:
+                    # Only the GOPs with a profanity are re-encoded
+                    cmd = self.get_reencode_cmd(start, end, name)
+                    self.log(" ".join(cmd))
+                    began = time.perf_counter()
+                    failed = (yield cmd) != 0 or not os.path.exists(name)
+                    if not failed:
+                        self.add_encode_metrics(end - start, began)
+                        self.__reencoded_duration += end - start
+                failed = failed or not os.path.exists(name)
+
+            if failed:
+                print("Warning: FFMPEG failed to cut the video, the filter engine is used")
+                yield from self.bleep_steps(profanities)
+                return
+
+            txtfilename = workspace.write_text(
+                f"listofclips{uuid.uuid4()}.txt",
+                "".join(f"file '{os.path.abspath(name)}'\n" for name in names))
+
+            blockfilename = self.get_blocked_file_name()
+            cmd = self.get_join_cmd(txtfilename, spans, blockfilename)
+            self.log(" ".join(cmd))
+            if (yield cmd) != 0 or not os.path.exists(blockfilename):
+                print(f"Warning: FFMPEG failed to join ({self.get_video().get_file()})")
+                return
 
         self.set_file_location(blockfilename)
-        print("The profanities are now block")
+        self.log(f"The profanities are now block, {self.get_reencoded_duration():.2f}s"+
+              f" of {duration:.2f}s re-encoded")
+
+    def get_audio_encode_args(self):
+        """Return FFMPEG args that encode the audio like the source audio"""
+        stream = self.get_video().get_audio_stream()
+        if stream is None:
+            return []
+        codec = stream.get("codec_name", "")
+        args = ['-c:a', self.AUDIO_ENCODERS.get(codec, codec)]
+        if stream.get("bit_rate"):
+            args += ['-b:a', stream["bit_rate"]]
+        return args
+
+    def get_extract_audio_cmd(self, audioname):
+        """Return FFMPEG Command that extract the audio track, stream copied"""
+        return ['ffmpeg', '-y', '-loglevel', 'error', '-i', self.get_video().get_file(),
+                '-map', '0:a:0', '-vn', '-c:a', 'copy', audioname]
+
+    def get_render_audio_cmd(self, source, spans, audioname):
+        """
+        Return FFMPEG Command that block the spans of the audio track alone,
+        the tags of the track like its language are kept
+        """
+        return ['ffmpeg', '-y', '-loglevel', 'error', '-i', source,
+                *self.get_bleep_input_args(spans),
+                '-filter_complex', self.get_filter_complex(spans),
+                '-map', '[aout]', '-map_metadata', '0', '-map_metadata:s:a:0', '0:s:a:0',
+                *self.get_audio_encode_args(), audioname]
 
-    def run(self, video:VideoFile, audio:AudioFile, profanities:list):
-        """Run Profanity Blocker"""
+    def get_remux_cmd(self, audioname, blockfilename):
+        """
+        Return FFMPEG Command that remux the blocked audio track with the
+        video, subtitles and other audio tracks stream copied
+
+        The streams keep their order, the blocked audio takes the place of
+        the first audio track and stays the default one. Data and attachment
+        streams are left out, most containers can not hold them.
+        """
+        maps = []
+        audio = 0
+        for stream in self.get_video().get_streams():
+            if stream.get("codec_type") not in ("video", "audio", "subtitle"):
+                continue
+            if stream.get("codec_type") == "audio":
+                audio += 1
+                if audio == 1:
+                    maps += ['-map', '1:a:0']
+                    continue
+            maps += ['-map', f"0:{stream['index']}"]
+        return ['ffmpeg', '-y', '-loglevel', 'error', '-i', self.get_video().get_file(),
+                '-i', audioname, *maps, '-map_metadata', '0',
+                '-disposition:a:0', 'default', '-c', 'copy', blockfilename]
+
+    def remux(self, profanities):
+        """
+        Block the profanities without touching the video stream,
+        the audio track is extracted once, blocked alone, then remuxed.
+        An AudioFile is blocked directly to the blocked file.
+        """
+        self.run_steps(self.remux_steps(profanities))
+
+    def get_audio_size(self):
+        """Return estimated bytes of the audio track of the video"""
+        video = self.get_video()
+        stream = video.get_audio_stream()
+        if stream is not None and stream.get("bit_rate"):
+            return int(int(stream["bit_rate"]) * video.get_duration() / 8)
+        return os.path.getsize(video.get_file())
+
+    def remux_steps(self, profanities):
+        """Yield the FFMPEG commands of the remux engine"""
+        self.log("Remux")
+        spans = self.get_bleep_spans(profanities)
+        blockfilename = self.get_blocked_file_name()
+        video = self.get_video()
+
+        with self.use_workspace() as workspace:
+            # The audio track extracted by prepare
+            extracted = self.__prepared.pop("audio", "")
+            if not video.has_video():
+                cmds = [self.get_render_audio_cmd(video.get_file(), spans, blockfilename)]
+            elif extracted != "":
+                rendered = workspace.path(f"blockedaudio{uuid.uuid4()}.mka")
+                cmds = [self.get_render_audio_cmd(extracted, spans, rendered),
+                        self.get_remux_cmd(rendered, blockfilename)]
+            elif workspace.reserve(self.get_audio_size() * 2):
+                extracted = workspace.path(f"audio{uuid.uuid4()}.mka")
+                rendered = workspace.path(f"blockedaudio{uuid.uuid4()}.mka")
+                cmds = [self.get_extract_audio_cmd(extracted),
+                        self.get_render_audio_cmd(extracted, spans, rendered),
+                        self.get_remux_cmd(rendered, blockfilename)]
+            else:
+                print("Warning: Workspace is too small to remux, the filter engine is used")
+                yield from self.bleep_steps(profanities)
+                return
+
+            for cmd in cmds:
+                self.log(" ".join(cmd))
+                if (yield cmd) != 0:
+                    print(f"Warning: FFMPEG failed to block ({video.get_file()})")
+                    return
+
+        if os.path.exists(blockfilename):
+            self.set_file_location(blockfilename)
+            self.log("The profanities are now block")
+
+    def get_encode_pcm_cmd(self, sample_rate, channels, blockfilename):
+        """
+        Return FFMPEG Command that encode the PCM from stdin as the audio
+        and copy the video of the source
+        """
+        return ['ffmpeg', '-y', '-loglevel', 'error', '-i', self.get_video().get_file(),
+                '-f', 's16le', '-ar', str(sample_rate), '-ac', str(channels), '-i', '-',
+                '-map', '0:v?', '-map', '1:a', '-map_metadata', '0', '-c:v', 'copy',
+                *self.get_audio_encode_args(), blockfilename]
+
+    def render_pcm(self, profanities):
+        """
+        Block the profanities in memory, the audio is decoded once to
+        16 bit PCM, the spans are bleeped by NumPy slicing and the samples
+        are piped to the encoder. No clip is written.
+        """
+        self.log("PCM Render")
+        video = self.get_video()
+        sample_rate = video.get_sample_rate() or 44100
+        channels = video.get_channels() or 1
+        spans = self.get_bleep_spans(profanities)
+        blockfilename = self.get_blocked_file_name()
+
+        with self.use_workspace() as workspace:
+            # The audio decoded by prepare
+            decoded = self.__prepared.pop("pcm", None) or self.decode_audio_pcm(workspace)
+            if decoded is None:
+                print("Warning: Workspace is too small to render the PCM,"+
+                      " the filter engine is used")
+                self.bleep(profanities)
+                return
+            pcm, memmap, returncode = decoded
+            del decoded # pcm is the only reference, so it can be unmapped
+            if returncode != 0:
+                self.release_pcm(pcm, memmap)
+                print(f"Warning: FFMPEG failed to decode ({video.get_file()}),"+
+                      " the filter engine is used")
+                self.bleep(profanities)
+                return
+            try:
+                bleep = None
+                if self.get_tone() <= 0:
+                    bleep, _ = decode_pcm(self.get_audio().get_file(), sample_rate, channels,
+                                          popen=self.popen)
+                fade = int(self.get_fade() * sample_rate)
+                for start, end in spans:
+                    start = int(start * sample_rate)
+                    end = int(end * sample_rate)
+                    tone = bleep
+                    if tone is None:
+                        tone = sine_tone(end - start, sample_rate, channels, self.get_tone())
+                    apply_bleep(pcm, start, end, tone, fade, self.get_attenuation())
+
+                cmd = self.get_encode_pcm_cmd(sample_rate, channels, blockfilename)
+                self.log(" ".join(cmd))
+                began = time.perf_counter()
+                process = self.popen(cmd, stdin=subprocess.PIPE)
+                try:
+                    for i in range(0, len(pcm), sample_rate):
+                        process.stdin.write(pcm[i:i + sample_rate].tobytes())
+                except BrokenPipeError:
+                    pass
+                finally:
+                    process.stdin.close()
+                returncode = process.wait()
+                self.add_subprocess_metrics(cmd, began, returncode)
+            finally:
+                self.release_pcm(pcm, memmap)
+                pcm = None
+
+        if returncode != 0 or not os.path.exists(blockfilename):
+            print(f"Warning: FFMPEG failed to block ({video.get_file()})")
+            return
+        self.set_file_location(blockfilename)
+        self.log("The profanities are now block")
+
+    def decode_audio_pcm(self, workspace):
+        """
+        Return (pcm, memmap, returncode) of the audio of the video decoded
+        to 16 bit PCM, memmap is the file of the samples if they are longer
+        than the memory limit, None if the workspace is too small for the file
+        """
+        video = self.get_video()
+        sample_rate = video.get_sample_rate() or 44100
+        channels = video.get_channels() or 1
+        memmap = ""
+        size = int(video.get_duration() * sample_rate * channels * 2)
+        if size > self.get_memory_limit():
+            if not workspace.reserve(size):
+                return None
+            memmap = workspace.path(f"pcm{uuid.uuid4()}.raw")
+
+        began = time.perf_counter()
+        pcm, returncode = decode_pcm(video.get_file(), sample_rate, channels, memmap,
+                                     self.popen)
+        self.add_subprocess_metrics(
+            get_decode_cmd(video.get_file(), sample_rate, channels), began, returncode)
+        self.get_metrics().add("pcm.bytes_decoded", pcm.nbytes)
+        return pcm, memmap, returncode
+
+    def release_pcm(self, pcm, memmap):
+        """
+        Unmap the samples of decode_audio_pcm and remove their file,
+        a file that is still mapped can not be removed on Windows
+        """
+        mapped = getattr(pcm, "_mmap", None) if isinstance(pcm, np.memmap) else None
+        if mapped is not None:
+            mapped.close()
+        if memmap != "" and os.path.exists(memmap):
+            os.remove(memmap)
+
+    def prepare(self):
+        """
+        Do the work of the engine that does not need the profanities, so it
+        can run while the profanities are found: the pcm engine decodes the
+        audio, the remux engine extracts the audio track, the smart and
+        clips engines probe the keyframes and the encoders.
+        Use it in use_workspace, the next run of the workspace uses the work.
+        """
+        engine = self.get_engine()
+        video = self.get_video()
+        workspace = self.get_workspace()
+        with self.get_metrics().stage("block.prepare"):
+            if engine == "pcm":
+                self.__prepared["pcm"] = self.decode_audio_pcm(workspace)
+            elif engine == "remux" and video.has_video():
+                if workspace.reserve(self.get_audio_size() * 2):
+                    extracted = workspace.path(f"audio{uuid.uuid4()}.mka")
+                    if (self.run_ffmpeg(self.get_extract_audio_cmd(extracted)) == 0
+                            and os.path.exists(extracted)):
+                        self.__prepared["audio"] = extracted
+            elif engine in ("smart", "clips") and video.has_video():
+                if engine == "smart" or self.get_encoder() == "auto":
+                    video.get_keyframes()
+                stream = video.get_video_stream()
+                self.get_video_encoder(stream.get("codec_name", "h264"), stream)
+
+    def try_prepare(self):
+        """Prepare, if it fails the run does the work itself"""
+        try:
+            self.prepare()
+        except (Exception, SystemExit): # pylint: disable=broad-except
+            self.__prepared.clear()
+
+    def run_clips(self, profanities):
+        """Run the old split, replace and concat process"""
+        with self.use_workspace() as workspace:
+            # The clips and the replaced clips are about twice the video
+            if not workspace.reserve(os.path.getsize(self.get_video().get_file()) * 2):
+                print("Warning: Workspace is too small for the clips, the filter engine is used")
+                self.bleep(profanities)
+                return
+            self.set_clips([])
+            self.set_trash_clips([])
+            self.split([{"word": "[bleep]", "start": start, "end": end}
+                        for start, end in self.get_bleep_spans(profanities)])
+            self.replace()
+            self.concat()
+
+    def run_stream(self, video:MediaFile, audio:AudioFile, profanities):
+        """
+        Run Profanity Blocker from a stream of profanities
+        like ProfanityExtractor.stream()
+
+        Only the profanities are kept in memory. The work of the engine
+        that does not need the profanities (prepare) runs in another thread
+        while they arrive, the rest starts as soon as the last one arrives.
+        """
+        self.set_video(video)
+        self.set_audio(audio)
+        with self.use_workspace():
+            preparing = threading.Thread(target=self.try_prepare, daemon=True)
+            preparing.start()
+            try:
+                profanities = list(profanities)
+            finally:
+                preparing.join()
+            try:
+                self.run(video, audio, profanities)
+            finally:
+                # The samples decoded by prepare that the run did not use
+                prepared = self.__prepared.pop("pcm", None)
+                if prepared is not None:
+                    self.release_pcm(prepared[0], prepared[1])
+                self.__prepared.clear()
+
+    def run_edl(self, video:MediaFile, audio:AudioFile, file):
+        """
+        Run Profanity Blocker from an edit decision list, JSON or SRT,
+        no model is loaded
+        """
+        from .edl import EditDecisionList # pylint: disable=import-outside-toplevel
+        edl = EditDecisionList()
+        edl.load(file)
+        self.run(video, audio, edl.get_profanities())
+
+    def run(self, video:MediaFile, audio:AudioFile, profanities:list):
+        """
+        Run Profanity Blocker, video can be VideoFile or AudioFile
+
+        The wall and CPU time is the block.<engine> stage of the metrics
+        """
         self.set_video(video)
         self.set_audio(audio)
+        self.__cancelled.clear()
+
+        with self.get_metrics().stage(f"block.{self.get_engine()}"):
+            self.run_engine(profanities)
+
+    def get_engine_steps(self, profanities):
+        """
+        Return the steps of the engine, the generator of its FFMPEG commands,
+        None for the pcm and clips engines
+        """
+        engine = self.get_engine()
+        if engine == "clips" and not self.get_video().has_video():
+            print("Warning: Audio cannot be clipped, the remux engine is used")
+            return self.remux_steps(profanities)
+        if engine in ("clips", "pcm"):
+            return None
+        if engine == "remux":
+            return self.remux_steps(profanities)
+        if engine == "smart":
+            return self.smart_render_steps(profanities)
+        return self.bleep_steps(profanities)
+
+    def run_engine(self, profanities):
+        """Block the profanities with the engine"""
+        steps = self.get_engine_steps(profanities)
+        if steps is not None:
+            self.run_steps(steps)
+        elif self.get_engine() == "pcm":
+            self.render_pcm(profanities)
+        else:
+            self.run_clips(profanities)
+
+    async def run_async(self, video:MediaFile, audio:AudioFile, profanities:list,
+                        timeout = None):
+        """
+        Run Profanity Blocker without blocking the event loop
 
-        self.split(profanities)
-        self.replace()
-        self.concat()
+        The FFMPEG commands are asyncio subprocesses limited by the
+        subprocess limiter, the pcm and clips engines run in the default executor.
+        Raise asyncio.TimeoutError after timeout seconds, the running
+        subprocesses are killed when timed out or cancelled.
+        """
+        self.set_video(video)
+        self.set_audio(audio)
+        self.__cancelled.clear()
+
+        with self.get_metrics().stage(f"block.{self.get_engine()}"):
+            await asyncio.wait_for(self.run_engine_async(list(profanities)), timeout)
+
+    async def run_engine_async(self, profanities):
+        """Block the profanities with the engine without blocking the event loop"""
+        steps = self.get_engine_steps(profanities)
+        if steps is not None:
+            await self.run_steps_async(steps)
+        elif self.get_engine() == "pcm":
+            await self.run_in_executor(self.render_pcm, profanities)
+        else:
+            await self.run_in_executor(self.run_clips, profanities)
+
+    async def run_in_executor(self, function, *args):
+        """
+        Run the function in the default executor, if cancelled its
+        subprocesses are killed and it is waited for, so its files are removed
+        """
+        future = asyncio.get_running_loop().run_in_executor(None, function, *args)
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self.kill_subprocesses()
+            with contextlib.suppress(Exception, SystemExit):
+                await future
+            raise
@@ -0,0 +1,182 @@
+"""
+Content addressed cache of bleepy
+
+The results of SpeechToText are saved by the hash of the media file
+content, the model and the sample rate. The profanities of ProfanityExtractor
+are saved by the hash of the results, the language, the threshold
+and the words of the lexicon.
+So a media file that did not change is never recognized twice.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+class TranscriptCache:
+    """
+    Transcript Cache
+
+    directory = directory of the cache
+
+    max_size = bytes the cache can use, least recently used entries are
+    removed first
+    """
+
+    def __init__(self, directory = ".bleepy-cache", max_size = 1024 ** 3):
+        """Init transcript cache"""
+        self.__directory = directory
+        self.__max_size = int(max_size)
+        self.__digests = {}
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        os.makedirs(self.__directory, exist_ok=True)
+
+    def set_max_size(self, max_size):
+        """Set bytes the cache can use"""
+        self.__max_size = int(max_size)
+        self.evict()
+
+    def get_directory(self):
+        """Get directory of the cache"""
+        return self.__directory
+
+    def get_max_size(self):
+        """Get bytes the cache can use"""
+        return self.__max_size
+
+    def get_hits(self):
+        """Get number of cache hits"""
+        return self.__hits
+
+    def get_misses(self):
+        """Get number of cache misses"""
+        return self.__misses
+
+    def get_size(self):
+        """Get bytes used by the cache"""
+        return sum(os.path.getsize(entry) for entry in self.__entries())
+
+    def file_digest(self, file):
+        """
+        Return the hash of the file content and size
+
+        The hash is kept by path, size and modified time, so a file
+        is only hashed once while it does not change
+        """
+        stat = os.stat(file)
+        key = (os.path.abspath(file), stat.st_size, stat.st_mtime_ns)
+        if key not in self.__digests:
+            digest = hashlib.sha256(str(stat.st_size).encode())
+            with open(file, "rb") as media:
+                for block in iter(lambda: media.read(1024 * 1024), b""):
+                    digest.update(block)
+            self.__digests[key] = digest.hexdigest()
+        return self.__digests[key]
+
+    def model_digest(self, model):
+        """Return the hash of the model path"""
+        return hashlib.sha256(os.path.abspath(model).encode()).hexdigest()[:16]
+
+    def results_digest(self, results, lang, threshold, lexicon = ""):
+        """
+        Return the hash of the results, language, threshold and
+        lexicon (hash of the words of the lexicon, empty if not used)
+        """
+        digest = hashlib.sha256(f"{lang}:{threshold}:{lexicon}".encode())
+        for result in results:
+            digest.update(result.encode())
+        return digest.hexdigest()
+
+    def __results_path(self, file, model, sample_rate, variant = ""):
+        """
+        Return path of the results entry, variant is a decoding option
+        of the model like the grammar, kept in the directory of the model
+        """
+        prefix = f"{variant}-" if variant else ""
+        return os.path.join(self.get_directory(), self.model_digest(model),
+                            f"{prefix}{sample_rate}-{self.file_digest(file)}.json")
+
+    def __detections_path(self, digest):
+        """Return path of the detections entry"""
+        return os.path.join(self.get_directory(), "detections", f"{digest}.json")
+
+    def __entries(self):
+        """Return list of entry paths"""
+        entries = []
+        for root, _, names in os.walk(self.get_directory()):
+            if os.path.basename(root) == "probes":
+                continue
+            entries.extend(os.path.join(root, name) for name in names
+                           if name.endswith(".json"))
+        return entries
+
+    def __read(self, path, name):
+        """Return the data of the entry or None, count hit and miss"""
+        try:
+            with open(path, encoding="utf-8") as entry:
+                data = json.load(entry)[name]
+            os.utime(path) # mark as recently used
+        except (OSError, ValueError, KeyError):
+            self.__misses += 1
+            return None
+        self.__hits += 1
+        return data
+
+    def __write(self, path, name, data):
+        """Write the entry at once, then evict"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp, "w", encoding="utf-8") as entry:
+            json.dump({name: data}, entry)
+        os.replace(temp, path)
+        self.evict()
+
+    def get_results(self, file, model, sample_rate, variant = ""):
+        """Return the cached results of SpeechToText or None"""
+        return self.__read(self.__results_path(file, model, sample_rate, variant), "results")
+
+    def put_results(self, file, model, sample_rate, results, variant = ""):
+        """Save the results of SpeechToText"""
+        self.__write(self.__results_path(file, model, sample_rate, variant), "results",
+                     list(results))
+
+    def get_detections(self, digest):
+        """Return the cached profanities (list of dict) or None"""
+        return self.__read(self.__detections_path(digest), "detections")
+
+    def put_detections(self, digest, detections):
+        """Save the profanities (list of dict)"""
+        self.__write(self.__detections_path(digest), "detections", list(detections))
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max size"""
+        with self.__lock:
+            entries = []
+            for entry in self.__entries():
+                try:
+                    stat = os.stat(entry)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry))
+            entries.sort()
+            size = sum(entry[1] for entry in entries)
+            for _, entry_size, entry in entries:
+                if size <= self.get_max_size():
+                    break
+                try:
+                    os.remove(entry)
+                except OSError:
+                    continue
+                size -= entry_size
+
+    def invalidate_model(self, model):
+        """Remove all results of the model, with all its variants"""
+        shutil.rmtree(os.path.join(self.get_directory(), self.model_digest(model)),
+                      ignore_errors=True)
+
+    def clear(self):
+        """Remove all entries"""
+        shutil.rmtree(self.get_directory(), ignore_errors=True)
+        os.makedirs(self.get_directory(), exist_ok=True)
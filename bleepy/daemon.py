@@ -0,0 +1,313 @@
+"""
+Daemon of bleepy
+
+Keep the Vosk model and the profanity classifiers loaded, and bleep the
+media files sent as jobs over localhost HTTP. The jobs wait in a bounded
+queue and run in a few worker threads that share the loaded model,
+so a job only pays for its media work.
+
+`python -m bleepy.daemon --bleep bleep.mp3 --port 8765 --workers 2`
+
+POST /jobs {"file": "video.mp4"} return the id of the job,
+503 if the queue is full. A job can also set "lang" and "engine".
+GET /jobs/<id> return the status, the output and the profanities.
+GET /status return the queue and the workers.
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .batch import get_media_file
+from .bleepy import (LANGUAGES, AudioFile, ProfanityBlocker, ProfanityDetector,
+                     ProfanityExtractor, SpeechToText, get_languages,
+                     get_model_registry, is_languages_exist)
+from .metrics import Metrics
+
+
+class BleepyDaemon:
+    """
+    Bleepy Daemon
+
+    workers = number of jobs run at the same time
+
+    max_queue = number of jobs that can wait, more jobs are refused
+
+    recognizer_factory = like SpeechToText, to not use the Vosk model
+
+    A job can only choose the JOB_OPTIONS, the paths like the model and
+    the directories are options of the daemon
+    """
+
+    # Options a job can set, the other options are kept by the daemon
+    JOB_OPTIONS = ("lang", "engine")
+    # Status of the jobs that can be removed from the list of jobs
+    FINISHED = ("done", "failed")
+
+    def __init__(self, model = "model", lang = "english", workers = 2, max_queue = 16,
+                 recognizer_factory = None):
+        """Init daemon"""
+        self.__workers = max(1, int(workers))
+        self.__queue = queue.Queue(max(1, int(max_queue)))
+        self.__jobs = OrderedDict()
+        self.__max_jobs = 1000
+        self.__lock = threading.Lock()
+        self.__threads = []
+        self.__server = None
+        self.__recognizer_factory = recognizer_factory
+        self.__options = {
+            "model": model,
+            "lang": lang,
+            "engine": "filter",
+            "bleep": "",
+            "save_directory": "bleeped video",
+            "clips_directory": "clips",
+            "vad": False,
+        }
+
+    def set_option(self, name, value):
+        """
+        Set default option of the jobs
+
+        model, lang, engine, bleep, save_directory, clips_directory, vad
+        """
+        if name not in self.__options:
+            print(f"Warning: Option ({name}) not found. Options are {list(self.__options)}")
+            sys.exit()
+        self.__options[name] = value
+
+    def get_options(self):
+        """Get default options of the jobs"""
+        return self.__options
+
+    def get_workers(self):
+        """Get number of workers"""
+        return self.__workers
+
+    def get_queue_size(self):
+        """Get number of jobs waiting"""
+        return self.__queue.qsize()
+
+    def warm_up(self):
+        """Load the model and the classifiers before the first job"""
+        began = time.time()
+        if self.__recognizer_factory is None:
+            get_model_registry().preload(self.__options["model"])
+        # profanity_check loads its models on import, a first call warms them
+        ProfanityDetector(self.__options["lang"]).predict_best(["bleepy"])
+        print(f"Daemon: warmed up in {time.time() - began:.1f}s")
+
+    def submit(self, job):
+        """
+        Queue the job, dict of file and options, return the job status,
+        None if the queue is full
+        """
+        options = dict(self.__options)
+        options.update({name: value for name, value in job.items()
+                        if name in self.JOB_OPTIONS})
+        status = {"id": str(uuid.uuid4()), "status": "queued", "file": job["file"],
+                  "queued": time.time()}
+        with self.__lock:
+            try:
+                self.__queue.put_nowait((status["id"], job["file"], options))
+            except queue.Full:
+                return None
+            self.__jobs[status["id"]] = status
+            # Only the oldest finished jobs are forgotten
+            finished = [job_id for job_id, job_status in self.__jobs.items()
+                        if job_status["status"] in self.FINISHED]
+            for job_id in finished[:max(0, len(self.__jobs) - self.__max_jobs)]:
+                del self.__jobs[job_id]
+        return dict(status)
+
+    def get_job(self, job_id):
+        """Get status of the job, None if not found"""
+        with self.__lock:
+            status = self.__jobs.get(job_id)
+            return None if status is None else dict(status)
+
+    def get_status(self):
+        """Get status of the daemon"""
+        with self.__lock:
+            counts = {}
+            for status in self.__jobs.values():
+                counts[status["status"]] = counts.get(status["status"], 0) + 1
+        return {"workers": self.get_workers(), "queued": self.get_queue_size(),
+                "max_queue": self.__queue.maxsize, "jobs": counts,
+                "models": get_model_registry().get_loaded_models()}
+
+    def update_job(self, job_id, **values):
+        """Update status of the job"""
+        with self.__lock:
+            if job_id in self.__jobs:
+                self.__jobs[job_id].update(values)
+
+    def run_job(self, file, options):
+        """Run the pipeline of one file, return the values of the job status"""
+        media = get_media_file(file)
+        bleep = AudioFile()
+        bleep.set_file(options["bleep"])
+
+        metrics = Metrics()
+        stt = SpeechToText(options["model"], self.__recognizer_factory)
+        stt.set_vad(options["vad"])
+        extractor = ProfanityExtractor(get_languages(options["lang"]))
+        blocker = ProfanityBlocker(options["engine"])
+        blocker.set_save_directory(options["save_directory"])
+        blocker.set_clips_directory(options["clips_directory"])
+        for stage in (stt, extractor, blocker):
+            stage.set_metrics(metrics)
+            stage.set_verbose(False)
+
+        blocker.run_stream(media, bleep, extractor.stream(stt.stream(media)))
+        if blocker.get_file_location() == "":
+            return {"status": "failed", "error": "Blocked file was not created"}
+        return {"status": "done", "output": os.path.abspath(blocker.get_file_location()),
+                "duration": media.get_duration(),
+                "profanities": [word.to_dict() for word in extractor.get_profanities()],
+                "metrics": metrics.to_dict()}
+
+    def work(self):
+        """Run the queued jobs until None is queued"""
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                break
+            job_id, file, options = item
+            began = time.time()
+            self.update_job(job_id, status="running", started=began)
+            try:
+                values = self.run_job(file, options)
+            except (Exception, SystemExit) as error: # pylint: disable=broad-except
+                values = {"status": "failed", "error": repr(error)}
+            self.update_job(job_id, finished=time.time(), seconds=time.time() - began,
+                            **values)
+            print(f"Daemon: {values['status']} ({file}) in {time.time() - began:.1f}s")
+
+    def start(self, host = "127.0.0.1", port = 8765):
+        """Warm up, start the workers and the HTTP server"""
+        self.warm_up()
+        for _ in range(self.get_workers()):
+            thread = threading.Thread(target=self.work, daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+        self.__server = ThreadingHTTPServer((host, port), DaemonRequestHandler)
+        self.__server.bleepy = self
+        print(f"Daemon: listening on http://{host}:{self.__server.server_port}")
+
+    def get_port(self):
+        """Get port of the HTTP server"""
+        return self.__server.server_port
+
+    def serve_forever(self):
+        """Serve the HTTP requests until stop"""
+        self.__server.serve_forever()
+
+    def stop(self):
+        """Stop the HTTP server, the workers finish the running jobs"""
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+        for _ in self.__threads:
+            self.__queue.put(None)
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """HTTP requests of the daemon"""
+
+    def send_json(self, code, body):
+        """Send the body as JSON"""
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if code == 503:
+            self.send_header("Retry-After", "5")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self): # pylint: disable=invalid-name
+        """Get status of a job or of the daemon"""
+        daemon = self.server.bleepy
+        if self.path == "/status":
+            self.send_json(200, daemon.get_status())
+        elif self.path.startswith("/jobs/"):
+            status = daemon.get_job(self.path[len("/jobs/"):])
+            if status is None:
+                self.send_json(404, {"error": "Job not found"})
+            else:
+                self.send_json(200, status)
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self): # pylint: disable=invalid-name
+        """Queue a job"""
+        if self.path != "/jobs":
+            self.send_json(404, {"error": "Not found"})
+            return
+        try:
+            job = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            self.send_json(400, {"error": "Body should be JSON"})
+            return
+        if not isinstance(job, dict) or not os.path.isfile(str(job.get("file", ""))):
+            self.send_json(400, {"error": "File not found"})
+            return
+        if (job.get("engine", "filter") not in ProfanityBlocker.ENGINES
+                or not isinstance(job.get("lang", "english"), str)
+                or not is_languages_exist(job.get("lang", "english"))):
+            self.send_json(400, {"error": f"Engine should be one of {ProfanityBlocker.ENGINES}"+
+                                          f" and lang languages of {LANGUAGES}"+
+                                          " separated by comma"})
+            return
+        status = self.server.bleepy.submit(job)
+        if status is None:
+            self.send_json(503, {"error": "Queue is full"})
+        else:
+            self.send_json(202, status)
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        """Do not print each request"""
+
+
+def main():
+    """Run daemon from the command line"""
+    parser = argparse.ArgumentParser(description="Bleep profanity with warm models")
+    parser.add_argument("--bleep", required=True, help="bleep sound")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue", type=int, default=16, help="jobs that can wait")
+    parser.add_argument("--model", default="model")
+    parser.add_argument("--lang", default="english",
+                        help="languages separated by comma, like english,tagalog")
+    parser.add_argument("--engine", default="filter", choices=ProfanityBlocker.ENGINES)
+    parser.add_argument("--save-directory", default="bleeped video")
+    parser.add_argument("--clips-directory", default="clips")
+    parser.add_argument("--vad", action="store_true",
+                        help="skip the audio without speech in the STT")
+    args = parser.parse_args()
+
+    daemon = BleepyDaemon(args.model, args.lang, args.workers, args.queue)
+    for name in ("engine", "bleep", "save_directory", "clips_directory", "vad"):
+        daemon.set_option(name, getattr(args, name))
+    daemon.start(args.host, args.port)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Edit decision list of bleepy
+
+The profanities found by ProfanityExtractor are saved as a JSON edit
+decision list, or as an SRT or VTT sidecar. A reviewer can edit the list,
+then ProfanityBlocker renders from it without loading any model.
+
+`python -m bleepy.edl video.edl.json --bleep bleep.mp3`
+`python -m bleepy.edl video.srt --media video.mp4 --bleep bleep.mp3 --engine remux`
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import timedelta
+
+import srt
+
+from .batch import get_media_file
+from .bleepy import AudioFile, ProfanityBlocker, WordRecord
+
+EDL_VERSION = 1
+
+
+class EditDecisionList:
+    """
+    Edit Decision List
+
+    media = media file the profanities are from
+
+    profanities = list of WordRecord
+    """
+
+    def __init__(self, media = "", profanities = None):
+        """Init edit decision list"""
+        self.__media = media
+        self.__profanities = list(profanities or [])
+
+    def set_media(self, media):
+        """Set media file"""
+        self.__media = media
+
+    def set_profanities(self, profanities):
+        """Set profanities, list of WordRecord or dict"""
+        self.__profanities = [word if isinstance(word, WordRecord) else WordRecord.from_dict(word)
+                              for word in profanities]
+
+    def get_media(self):
+        """Get media file"""
+        return self.__media
+
+    def get_profanities(self):
+        """Get profanities sorted by start"""
+        return sorted(self.__profanities, key=lambda word: (word.start, word.end))
+
+    def get_format(self, file):
+        """Return format of the file by its extension, json, srt or vtt"""
+        ext = os.path.splitext(file)[1].lower().lstrip(".")
+        return ext if ext in ("srt", "vtt") else "json"
+
+    def to_dict(self):
+        """Return the edit decision list as dict"""
+        return {"version": EDL_VERSION, "media": self.get_media(), "created": time.time(),
+                "profanities": [word.to_dict() for word in self.get_profanities()]}
+
+    def get_cue(self, word):
+        """Return text of the subtitle of the word, the word first"""
+        return f"{word.word} ({word.lang} {word.predict_prob:.2f})"
+
+    def to_srt(self):
+        """Return the profanities as SRT subtitles"""
+        return srt.compose([
+            srt.Subtitle(index, timedelta(seconds=word.start), timedelta(seconds=word.end),
+                         self.get_cue(word))
+            for index, word in enumerate(self.get_profanities(), start=1)])
+
+    def to_vtt(self):
+        """Return the profanities as WebVTT subtitles"""
+        cues = []
+        for word in self.get_profanities():
+            start = srt.timedelta_to_srt_timestamp(timedelta(seconds=word.start))
+            end = srt.timedelta_to_srt_timestamp(timedelta(seconds=word.end))
+            cues.append(f"{start.replace(',', '.')} --> {end.replace(',', '.')}\n"+
+                        f"{self.get_cue(word)}\n")
+        return "WEBVTT\n\n" + "\n".join(cues)
+
+    def save(self, file):
+        """Save as JSON, SRT or VTT by the extension of the file"""
+        file_format = self.get_format(file)
+        with open(file, "w", encoding="utf-8") as output:
+            if file_format == "srt":
+                output.write(self.to_srt())
+            elif file_format == "vtt":
+                output.write(self.to_vtt())
+            else:
+                json.dump(self.to_dict(), output, indent=2)
+
+    def load(self, file):
+        """
+        Load JSON or SRT by the extension of the file,
+        the word of a subtitle is its first word
+        """
+        if not os.path.exists(file):
+            print(f"Warning: Edit decision list not found ({file})")
+            sys.exit()
+        with open(file, encoding="utf-8") as edlfile:
+            if self.get_format(file) == "srt":
+                self.set_profanities([
+                    WordRecord((subtitle.content.split() or [""])[0],
+                               subtitle.start.total_seconds(), subtitle.end.total_seconds())
+                    for subtitle in srt.parse(edlfile.read())])
+                return
+            if self.get_format(file) == "vtt":
+                print(f"Warning: VTT cannot be loaded, use JSON or SRT ({file})")
+                sys.exit()
+            edl = json.load(edlfile)
+        self.set_media(edl.get("media", ""))
+        self.set_profanities(edl.get("profanities", []))
+
+
+def main():
+    """Render a media file from an edit decision list"""
+    parser = argparse.ArgumentParser(
+        description="Bleep the profanities of an edit decision list, no model is loaded")
+    parser.add_argument("edl", help="JSON or SRT edit decision list")
+    parser.add_argument("--media", default="", help="media file, the media of the list if empty")
+    parser.add_argument("--bleep", required=True, help="bleep sound")
+    parser.add_argument("--engine", default="filter", choices=ProfanityBlocker.ENGINES)
+    parser.add_argument("--save-directory", default="bleeped video")
+    parser.add_argument("--clips-directory", default="clips")
+    args = parser.parse_args()
+
+    edl = EditDecisionList()
+    edl.load(args.edl)
+    media = get_media_file(args.media or edl.get_media())
+    bleep = AudioFile()
+    bleep.set_file(args.bleep)
+
+    blocker = ProfanityBlocker(args.engine)
+    blocker.set_save_directory(args.save_directory)
+    blocker.set_clips_directory(args.clips_directory)
+    blocker.set_verbose(False)
+    blocker.run(media, bleep, edl.get_profanities())
+    if blocker.get_file_location() == "":
+        print(f"Warning: Blocked file was not created ({media.get_file()})")
+        sys.exit(1)
+    print(f"Bleeped {len(edl.get_profanities())} profanities in ({blocker.get_file_location()})")
+
+
+if __name__ == "__main__":
+    main()
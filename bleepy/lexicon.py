@@ -0,0 +1,208 @@
+"""
+Lexicon of bleepy
+
+Known profane words and known clean words of each language, looked up
+in a hash set before the words are sent to the profanity_check classifier.
+Only the words not in the lexicon are classified.
+
+The lexicon can be extended with word lists and saved as a compact
+gzip JSON file, which loads faster than the word lists.
+
+`python -m bleepy.lexicon --lang tagalog --profane words.txt --output lexicon.json.gz`
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+
+# Words the English and Tagalog classifiers flag, and their variants
+PROFANE_WORDS = {
+    "english": (
+        "fuck fucks fucking fuckin fucked fucker fuckers motherfucker motherfuckers "
+        "motherfucking shit shits shitty bullshit bitch bitches asshole assholes "
+        "bastard bastards cunt cunts dick dickhead dicks pussy cock whore slut "
+        "goddamn dumbass jackass nigger faggot fag twat wanker"
+    ),
+    "tagalog": (
+        "putangina putanginamo tangina tanginamo puta gago gaga ulol ulul tarantado "
+        "tarantada punyeta pakyu pokpok kupal kingina hinayupak leche bobo tanga "
+        "lintik pucha putcha yawa burat pekpek titi puke"
+    ),
+}
+
+# Common words that are never profanity
+CLEAN_WORDS = {
+    "english": (
+        "the be to of and a in that have i it for not on with he as you do at this "
+        "but his by from they we say her she or an will my one all would there their "
+        "what so up out if about who get which go me when make can like time no just "
+        "him know take people into year your good some could them see other than then "
+        "now look only come its over think also back after use two how our work first "
+        "well way even new want because any these give day most us is are was were "
+        "been has had did said says going got yeah yes okay oh hey hi hello thank "
+        "thanks please right really very much here where why let mean something thing "
+        "things little lot more never always need tell man woman guy guys mom dad love "
+        "life world home today tonight again still down off too should may might must "
+        "am im dont thats youre ive theyre cant wont didnt doesnt isnt"
+    ),
+    "tagalog": (
+        "ang ng sa na mga ay at si ni kay ko mo niya namin natin nila ito iyan iyon "
+        "dito diyan doon ako ikaw ka siya kami tayo kayo sila hindi oo opo po ba pa "
+        "lang naman din rin nga kasi pero kung para may wala meron ano sino saan "
+        "kailan bakit paano ganito ganyan ganoon talaga sige tara salamat mahal bahay "
+        "tao araw gabi kain kumain tubig bata nanay tatay kuya ate lola lolo ngayon "
+        "bukas kahapon dahil yung yun sana siguro baka tapos muna ulit lahat isa "
+        "dalawa tatlo"
+    ),
+}
+
+class Lexicon:
+    """
+    Lexicon, thread safe
+
+    lookup return 1.0 for a profane word, 0.0 for a clean word,
+    None if the word should be classified
+    """
+
+    def __init__(self, defaults = True):
+        """Init lexicon, defaults adds the built in words"""
+        self.__profane = {}
+        self.__clean = {}
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        if defaults:
+            for lang, words in PROFANE_WORDS.items():
+                self.add_profane(words.split(), lang)
+            for lang, words in CLEAN_WORDS.items():
+                self.add_clean(words.split(), lang)
+
+    def normalize(self, word):
+        """Return the word as it is kept in the lexicon"""
+        return word.strip().lower()
+
+    def add_profane(self, words, lang = "english"):
+        """Add profane words, a profane word is not clean anymore"""
+        words = {self.normalize(word) for word in words} - {""}
+        with self.__lock:
+            self.__profane.setdefault(lang, set()).update(words)
+            self.__clean.setdefault(lang, set()).difference_update(words)
+
+    def add_clean(self, words, lang = "english"):
+        """Add clean words, a clean word is not profane anymore"""
+        words = {self.normalize(word) for word in words} - {""}
+        with self.__lock:
+            self.__clean.setdefault(lang, set()).update(words)
+            self.__profane.setdefault(lang, set()).difference_update(words)
+
+    def remove(self, words, lang = "english"):
+        """Remove words, they are classified again"""
+        words = {self.normalize(word) for word in words}
+        with self.__lock:
+            self.__profane.get(lang, set()).difference_update(words)
+            self.__clean.get(lang, set()).difference_update(words)
+
+    def get_profane(self, lang = "english"):
+        """Get set of the profane words"""
+        return set(self.__profane.get(lang, ()))
+
+    def get_clean(self, lang = "english"):
+        """Get set of the clean words"""
+        return set(self.__clean.get(lang, ()))
+
+    def get_hits(self):
+        """Get number of words found in the lexicon"""
+        return self.__hits
+
+    def get_misses(self):
+        """Get number of words not found in the lexicon"""
+        return self.__misses
+
+    def lookup(self, word, lang = "english"):
+        """Return 1.0 if profane, 0.0 if clean, None if not in the lexicon"""
+        word = self.normalize(word)
+        if word in self.__profane.get(lang, ()):
+            self.__hits += 1
+            return 1.0
+        if word in self.__clean.get(lang, ()):
+            self.__hits += 1
+            return 0.0
+        self.__misses += 1
+        return None
+
+    def load_words(self, file, lang = "english", profane = True):
+        """Add the words of a text file, one word each line, # is a comment"""
+        with open(file, encoding="utf-8") as txtfile:
+            words = [line.split("#", 1)[0] for line in txtfile]
+        if profane:
+            self.add_profane(words, lang)
+        else:
+            self.add_clean(words, lang)
+
+    def to_dict(self):
+        """Return the lexicon as dict"""
+        with self.__lock:
+            return {
+                "profane": {lang: sorted(words) for lang, words in self.__profane.items()},
+                "clean": {lang: sorted(words) for lang, words in self.__clean.items()},
+            }
+
+    def get_digest(self, langs = ("english",)):
+        """Return the hash of the profane and clean words of the languages"""
+        with self.__lock:
+            words = {lang: (sorted(self.__profane.get(lang, ())),
+                            sorted(self.__clean.get(lang, ()))) for lang in langs}
+        return hashlib.sha256(json.dumps(words, sort_keys=True).encode()).hexdigest()
+
+    def save(self, file):
+        """Save the lexicon as gzip JSON"""
+        with gzip.open(file, "wt", encoding="utf-8") as output:
+            json.dump(self.to_dict(), output, separators=(",", ":"))
+
+    def load(self, file):
+        """Add the words of a lexicon saved by save"""
+        with gzip.open(file, "rt", encoding="utf-8") as lexiconfile:
+            lexicon = json.load(lexiconfile)
+        for lang, words in lexicon.get("profane", {}).items():
+            self.add_profane(words, lang)
+        for lang, words in lexicon.get("clean", {}).items():
+            self.add_clean(words, lang)
+
+
+LEXICON = Lexicon()
+
+
+def get_lexicon():
+    """Return the lexicon of the process"""
+    return LEXICON
+
+
+def main():
+    """Build a lexicon file from word lists"""
+    parser = argparse.ArgumentParser(description="Build a bleepy lexicon file")
+    parser.add_argument("--lang", default="english")
+    parser.add_argument("--profane", nargs="*", default=[], help="text files of profane words")
+    parser.add_argument("--clean", nargs="*", default=[], help="text files of clean words")
+    parser.add_argument("--base", default="", help="lexicon file to extend")
+    parser.add_argument("--no-defaults", action="store_true",
+                        help="do not include the built in words")
+    parser.add_argument("--output", default="lexicon.json.gz")
+    args = parser.parse_args()
+
+    lexicon = Lexicon(not args.no_defaults)
+    if args.base:
+        lexicon.load(args.base)
+    for file in args.profane:
+        lexicon.load_words(file, args.lang, True)
+    for file in args.clean:
+        lexicon.load_words(file, args.lang, False)
+    lexicon.save(args.output)
+
+    for lang, words in lexicon.to_dict()["profane"].items():
+        print(f"{lang}: {len(words)} profane, {len(lexicon.get_clean(lang))} clean")
+    print(f"Lexicon saved in ({args.output})")
+
+
+if __name__ == "__main__":
+    main()
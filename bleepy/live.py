@@ -0,0 +1,276 @@
+"""
+Live bleeping of audio streams
+
+The source is read by FFMPEG, so it can be a named pipe, a growing file
+or any url FFMPEG can read. The audio is held in a delay buffer, words are
+classified in another thread as soon as the partial results of the
+recognizer stabilize, so the source is read while the words are classified,
+and the bleeped audio is written continuously after the delay.
+
+To try it with a local file played as a live source
+
+```
+mkfifo live.pipe
+ffmpeg -re -i video.mp4 -f mpegts -y live.pipe &
+python -m bleepy.live live.pipe bleeped.mp3 --delay 2
+```
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .bleepy import ProfanityDetector, WordRecord, get_model_registry
+from .pcm import apply_bleep, sine_tone
+
+
+class LiveBleeper:
+    """
+    Live Bleeper
+
+    delay = seconds of audio held before it is written,
+    a profanity is only bleeped if it is detected within the delay
+    """
+
+    def __init__(self, model = "model", lang = "english", delay = 2.0):
+        """Init live bleeper"""
+        if not os.path.exists(model):
+            print (
+                f"Warning: Model Directory not found ({model})."+
+                " Please download the model from https://alphacephei.com/vosk/models")
+            sys.exit()
+        self.__model = model
+        self.__detector = ProfanityDetector(lang)
+        self.__delay = float(delay)
+        self.__sample_rate = 16000
+        self.__chunk = 0.1
+        self.__stable_partials = 3
+        self.__follow = False
+        self.__frequency = 1000.0
+        self.__fade = 0.005
+        self.__profanities = []
+        self.__missed = []
+        self.__max_lag = 0.0
+
+    def set_delay(self, delay = 2.0):
+        """Set delay buffer in seconds"""
+        self.__delay = float(delay)
+
+    def set_sample_rate(self, sample_rate = 16000):
+        """Set sample rate of the recognizer and the output"""
+        self.__sample_rate = int(sample_rate)
+
+    def set_stable_partials(self, stable_partials = 3):
+        """Set how many partial results a word should stay the same to be stable"""
+        self.__stable_partials = max(1, int(stable_partials))
+
+    def set_follow(self, follow = True):
+        """Set if the source is a growing file that should be followed"""
+        self.__follow = follow
+
+    def set_frequency(self, frequency = 1000.0):
+        """Set frequency of the bleep tone"""
+        self.__frequency = float(frequency)
+
+    def get_delay(self):
+        """Get delay buffer in seconds"""
+        return self.__delay
+
+    def get_sample_rate(self):
+        """Get sample rate"""
+        return self.__sample_rate
+
+    def get_stable_partials(self):
+        """Get how many partial results a word should stay the same to be stable"""
+        return self.__stable_partials
+
+    def get_profanities(self):
+        """Get profanities that were bleeped"""
+        return self.__profanities
+
+    def get_missed(self):
+        """Get profanities detected after its audio was already written"""
+        return self.__missed
+
+    def get_max_lag(self):
+        """
+        Get the longest time in seconds from the end of a profanity
+        until it was detected, should be less than the delay
+        """
+        return self.__max_lag
+
+    def get_live_cmd(self, source):
+        """Return FFMPEG Command that decode the live source"""
+        cmd = ['ffmpeg', '-loglevel', 'quiet']
+        if self.__follow:
+            cmd += ['-follow', '1']
+        return cmd + ['-i', source, '-vn', '-ar', str(self.get_sample_rate()),
+                      '-ac', '1', '-f', 's16le', '-']
+
+    def get_output_cmd(self, output):
+        """Return FFMPEG Command that encode the bleeped PCM to output"""
+        return ['ffmpeg', '-y', '-loglevel', 'error', '-f', 's16le',
+                '-ar', str(self.get_sample_rate()), '-ac', '1', '-i', '-', output]
+
+    def __open_output(self, output):
+        """Return (writable, process) of output, process is None for raw PCM"""
+        if output == "-":
+            return sys.stdout.buffer, None
+        if isinstance(output, str):
+            process = subprocess.Popen(self.get_output_cmd(output), stdin=subprocess.PIPE)
+            return process.stdin, process
+        return output, None
+
+    def __classify(self, words, received):
+        """Classify the words, return the spans (start, end) in frames to bleep"""
+        spans = []
+        sample_rate = self.get_sample_rate()
+        profanities = self.__detector.extract_profanity(words)
+        for word in profanities:
+            self.__max_lag = max(self.__max_lag, received - word.end)
+            spans.append((int(word.start * sample_rate), int(word.end * sample_rate)))
+        return profanities, spans
+
+    def run(self, source, output = "-"):
+        """
+        Run live bleeper until the source ends
+
+        output = file name encoded by FFMPEG, "-" for raw PCM in stdout,
+        or a binary writable for raw PCM
+        """
+        sample_rate = self.get_sample_rate()
+        chunk = int(self.__chunk * sample_rate) * 2
+        delay = int(self.get_delay() * sample_rate)
+        fade = int(self.__fade * sample_rate)
+
+        rec = get_model_registry().create_recognizer(self.__model, sample_rate)
+        rec.SetPartialWords(True)
+
+        decoder = subprocess.Popen(self.get_live_cmd(source), stdout=subprocess.PIPE)
+        writable, encoder = self.__open_output(output)
+
+        buffer = np.zeros((0, 1), dtype=np.int16)
+        written = 0 # frames written
+        spans = [] # spans in frames not written yet
+        seen = {} # (word, start) of partial result, how many times seen
+        decided = set() # (word, start) already classified, since the last final result
+        lock = threading.Lock() # written and spans, shared with the classifier
+        classifier = ThreadPoolExecutor(max_workers=1)
+        classifying = [] # futures of the words sent to the classifier
+
+        def classify(words):
+            received = (written + len(buffer)) / sample_rate
+            profanities, newspans = self.__classify(words, received)
+            with lock:
+                for profanity, span in zip(profanities, newspans):
+                    if span[0] < written:
+                        self.__missed.append(profanity)
+                    self.__profanities.append(profanity)
+                    spans.append(span)
+
+        def decide(items):
+            words = []
+            for item in items:
+                key = (item["word"], round(item["start"], 2))
+                if key not in decided and item["word"] != "[unk]":
+                    decided.add(key)
+                    words.append(WordRecord.from_dict(item))
+            if words:
+                classifying.append(classifier.submit(classify, words))
+            # Raise the error of a failed classification
+            while classifying and classifying[0].done():
+                classifying.pop(0).result()
+
+        def finalize(received):
+            # The recognizer will not return the words before the last chunk again
+            finalized = round(received - self.__chunk, 2)
+            decided.difference_update([key for key in decided if key[1] < finalized])
+
+        def write(frames):
+            nonlocal buffer, written
+            block = buffer[:frames].copy()
+            with lock:
+                for start, end in spans:
+                    if start < written + frames and end > written:
+                        tone = sine_tone(end - start, sample_rate, 1, self.__frequency)
+                        offset = start - written
+                        apply_bleep(block, offset, end - written, tone[max(0, -offset):],
+                                    fade, edges=(offset >= 0, end <= written + frames))
+                written += frames
+                spans[:] = [span for span in spans if span[1] > written]
+            writable.write(block.tobytes())
+            buffer = buffer[frames:]
+
+        try:
+            while True:
+                data = decoder.stdout.read(chunk)
+                if len(data) == 0:
+                    break
+                buffer = np.concatenate(
+                    (buffer, np.frombuffer(data, dtype=np.int16).reshape(-1, 1)))
+                received = (written + len(buffer)) / sample_rate
+
+                if rec.AcceptWaveform(data):
+                    decide(json.loads(rec.Result()).get("result", []))
+                    finalize(received)
+                    seen.clear()
+                else:
+                    partial = json.loads(rec.PartialResult()).get("partial_result", [])
+                    stable = []
+                    current = {}
+                    for item in partial:
+                        key = (item["word"], round(item["start"], 2))
+                        current[key] = seen.get(key, 0) + 1
+                        if current[key] >= self.get_stable_partials():
+                            stable.append(item)
+                    seen = current
+                    decide(stable)
+
+                if len(buffer) > delay:
+                    write(len(buffer) - delay)
+                    writable.flush()
+
+            decide(json.loads(rec.FinalResult()).get("result", []))
+            for future in classifying:
+                future.result()
+            write(len(buffer))
+            writable.flush()
+        finally:
+            classifier.shutdown(cancel_futures=True)
+            decoder.kill()
+            decoder.wait()
+            if encoder is not None:
+                encoder.stdin.close()
+                encoder.wait()
+
+
+def main():
+    """Run live bleeper from the command line"""
+    parser = argparse.ArgumentParser(description="Bleep profanity in a live audio stream")
+    parser.add_argument("source", help="named pipe, growing file or url of the live source")
+    parser.add_argument("output", nargs="?", default="-",
+                        help="output file, - for raw 16 bit PCM in stdout")
+    parser.add_argument("--model", default="model")
+    parser.add_argument("--lang", default="english",
+                        help="languages separated by comma, like english,tagalog")
+    parser.add_argument("--delay", type=float, default=2.0, help="delay buffer in seconds")
+    parser.add_argument("--follow", action="store_true", help="follow a growing file")
+    args = parser.parse_args()
+
+    bleeper = LiveBleeper(args.model, args.lang, args.delay)
+    bleeper.set_follow(args.follow)
+    began = time.time()
+    bleeper.run(args.source, args.output)
+    print(f"Bleeped {len(bleeper.get_profanities())} profanities in"+
+          f" {time.time() - began:.1f}s, missed {len(bleeper.get_missed())},"+
+          f" max lag {bleeper.get_max_lag():.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Metrics of bleepy
+
+Wall and CPU time of each stage, counters like the bytes decoded and
+the words classified, and every FFMPEG subprocess with its duration.
+The metrics can be read as a dict or written as JSON lines,
+hooks are called with each event as it happens.
+"""
+import contextlib
+import json
+import threading
+import time
+
+class Metrics:
+    """
+    Metrics of a run, thread safe
+
+    stage = wall and CPU time, CPU time is of the thread that ran the stage
+    so the FFMPEG and worker processes are not included
+
+    counter = number added up, like bytes decoded
+
+    value = last value set, like the real time factor
+    """
+
+    def __init__(self):
+        """Init metrics"""
+        self.__stages = {}
+        self.__counters = {}
+        self.__values = {}
+        self.__subprocesses = []
+        self.__events = []
+        self.__hooks = []
+        self.__lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """Add hook, function called with each event (dict)"""
+        self.__hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """Remove hook"""
+        if hook in self.__hooks:
+            self.__hooks.remove(hook)
+
+    def emit(self, event):
+        """Keep the event and call the hooks"""
+        event["time"] = time.time()
+        with self.__lock:
+            self.__events.append(event)
+        for hook in list(self.__hooks):
+            hook(event)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Measure wall and CPU time of the with block as the stage"""
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def add_stage(self, name, wall, cpu = 0.0):
+        """Add wall and CPU time in seconds to the stage"""
+        with self.__lock:
+            stage = self.__stages.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0})
+            stage["calls"] += 1
+            stage["wall"] += wall
+            stage["cpu"] += cpu
+        self.emit({"event": "stage", "name": name, "wall": wall, "cpu": cpu})
+
+    def add(self, name, amount = 1):
+        """Add amount to the counter, no event so it can be on the hot path"""
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + amount
+
+    def set_value(self, name, value):
+        """Set value"""
+        with self.__lock:
+            self.__values[name] = value
+        self.emit({"event": "value", "name": name, "value": value})
+
+    def add_subprocess(self, cmd, wall, returncode = 0):
+        """Add subprocess, cmd is the list of the command"""
+        subprocess = {"program": str(cmd[0]) if len(cmd) > 0 else "",
+                      "wall": wall, "returncode": returncode}
+        with self.__lock:
+            self.__subprocesses.append(subprocess)
+        self.emit({"event": "subprocess", **subprocess})
+
+    def get_stage(self, name):
+        """Get calls, wall and CPU time of the stage"""
+        with self.__lock:
+            return dict(self.__stages.get(name, {"calls": 0, "wall": 0.0, "cpu": 0.0}))
+
+    def get(self, name, default = 0):
+        """Get counter"""
+        return self.__counters.get(name, default)
+
+    def get_value(self, name, default = None):
+        """Get value"""
+        return self.__values.get(name, default)
+
+    def get_subprocesses(self):
+        """Get list of the subprocesses"""
+        with self.__lock:
+            return list(self.__subprocesses)
+
+    def get_events(self):
+        """Get list of the events"""
+        with self.__lock:
+            return list(self.__events)
+
+    def reset(self):
+        """Remove all the metrics, the hooks are kept"""
+        with self.__lock:
+            self.__stages.clear()
+            self.__counters.clear()
+            self.__values.clear()
+            self.__subprocesses.clear()
+            self.__events.clear()
+
+    def to_dict(self):
+        """Return the metrics as dict"""
+        with self.__lock:
+            programs = {}
+            for subprocess in self.__subprocesses:
+                program = programs.setdefault(subprocess["program"], {"count": 0, "wall": 0.0})
+                program["count"] += 1
+                program["wall"] += subprocess["wall"]
+            return {
+                "stages": {name: dict(stage) for name, stage in self.__stages.items()},
+                "counters": dict(self.__counters),
+                "values": dict(self.__values),
+                "subprocesses": programs,
+            }
+
+    def to_json_lines(self):
+        """Return the events as JSON lines"""
+        return "".join(json.dumps(event) + "\n" for event in self.get_events())
+
+    def write_json_lines(self, file):
+        """Write the events as JSON lines to the file"""
+        with open(file, "w", encoding="utf-8") as output:
+            output.write(self.to_json_lines())
+
+class Reporter:
+    """
+    Metrics and progress printing of a class
+
+    Not verbose keeps print off the hot path,
+    the warnings are printed anyway
+    """
+    __metrics = None
+    __verbose = True
+
+    def set_metrics(self, metrics:Metrics):
+        """Set metrics, share one Metrics to collect the whole pipeline"""
+        self.__metrics = metrics
+
+    def get_metrics(self):
+        """Get metrics, created on first use"""
+        if self.__metrics is None:
+            self.__metrics = Metrics()
+        return self.__metrics
+
+    def set_verbose(self, verbose = True):
+        """Set verbose, False to not print the progress"""
+        self.__verbose = bool(verbose)
+
+    def is_verbose(self):
+        """Return boolean if the progress is printed"""
+        return self.__verbose
+
+    def log(self, *args):
+        """Print the progress if verbose"""
+        if self.__verbose:
+            print(*args)
@@ -0,0 +1,263 @@
+"""PCM helpers of bleepy, 16 bit signed samples in NumPy arrays"""
+import bisect
+import os
+import subprocess
+
+import numpy as np
+
+INT16_MIN = -32768
+INT16_MAX = 32767
+
+
+def get_decode_cmd(file, sample_rate = 16000, channels = 1):
+    """Return FFMPEG Command that decode the file to 16 bit PCM"""
+    return ['ffmpeg', '-loglevel', 'quiet', '-i', file, '-vn',
+            '-ar', str(sample_rate), '-ac', str(channels), '-f', 's16le', '-']
+
+
+def decode_pcm(file, sample_rate = 16000, channels = 1, memmap = "",
+               popen = subprocess.Popen):
+    """
+    Return (samples, returncode) of the file decoded by FFMPEG,
+    the samples have shape (frames, channels)
+
+    memmap = file name, the samples are decoded to this file and memory
+    mapped instead of kept in memory, for long files
+
+    popen = function that start the FFMPEG subprocess, like subprocess.Popen
+    """
+    cmd = get_decode_cmd(file, sample_rate, channels)
+    if memmap != "":
+        returncode = popen(cmd[:-1] + ['-y', memmap]).wait()
+        if not os.path.exists(memmap) or os.path.getsize(memmap) < 2 * channels:
+            return np.zeros((0, channels), dtype=np.int16), returncode
+        return np.memmap(memmap, dtype=np.int16, mode="r+").reshape(-1, channels), returncode
+
+    # Read into one growing bytearray, the array is a writable view of it,
+    # so it can be bleeped in place without a copy of the samples
+    process = popen(cmd, stdout=subprocess.PIPE)
+    data = bytearray()
+    while True:
+        chunk = process.stdout.read(1 << 20)
+        if not chunk:
+            break
+        data += chunk
+    returncode = process.wait()
+    frames = len(data) // (2 * channels)
+    pcm = np.frombuffer(data, dtype=np.int16, count=frames * channels)
+    return pcm.reshape(-1, channels), returncode
+
+
+def sine_tone(frames, sample_rate = 16000, channels = 1,
+              frequency = 1000.0, volume = 0.5):
+    """Return a sine tone, shape (frames, channels)"""
+    time = np.arange(frames, dtype=np.float32) / sample_rate
+    tone = np.sin(2 * np.pi * frequency * time) * (volume * INT16_MAX)
+    return np.repeat(tone.astype(np.int16)[:, None], channels, axis=1)
+
+
+def fit_bleep(bleep, frames):
+    """Return the bleep samples looped or cut to the frames"""
+    if len(bleep) == 0:
+        return np.zeros((frames, bleep.shape[1]), dtype=np.int16)
+    if len(bleep) < frames:
+        bleep = np.tile(bleep, (-(-frames // len(bleep)), 1))
+    return bleep[:frames]
+
+
+def apply_bleep(pcm, start, end, bleep = None, fade = 0, attenuation = 0.0,
+                edges = (True, True)):
+    """
+    Bleep the frames start to end of the pcm in place
+
+    pcm = samples, shape (frames, channels)
+
+    bleep = samples mixed in the range, same channels, None for silence
+
+    fade = frames of the crossfade at both edges of the range
+
+    attenuation = volume left of the original samples, 0.0 is muted
+
+    edges = if the start and the end are fade, (False, True) when the
+    range continues from the previous block
+    """
+    start = max(0, int(start))
+    end = min(len(pcm), int(end))
+    if end <= start:
+        return pcm
+
+    frames = end - start
+    original = pcm[start:end].astype(np.float32)
+    replaced = original * attenuation
+    if bleep is not None:
+        replaced += fit_bleep(bleep, frames).astype(np.float32)
+
+    # gain of the replaced samples, ramps at both edges
+    gain = np.ones(frames, dtype=np.float32)
+    fade = min(int(fade), frames // 2)
+    if fade > 0:
+        ramp = np.linspace(0.0, 1.0, fade, endpoint=False, dtype=np.float32)
+        if edges[0]:
+            gain[:fade] = ramp
+        if edges[1]:
+            gain[frames - fade:] = ramp[::-1]
+    gain = gain[:, None]
+
+    mixed = original * (1.0 - gain) + replaced * gain
+    pcm[start:end] = np.clip(mixed, INT16_MIN, INT16_MAX).astype(np.int16)
+    return pcm
+
+
+def get_speech_frames(samples, frame_size, threshold = -45.0, zcr_threshold = 0.25):
+    """
+    Return boolean array, True for each frame of the mono samples with speech
+
+    A frame is speech if its energy is above the threshold (dBFS),
+    or if it is at most 10 dB under the threshold with a zero crossing rate
+    above zcr_threshold, like the quiet fricatives (s, f, sh).
+    The zero crossing rate only keeps quiet frames, it does not tell
+    music from speech, every loud frame is speech.
+    """
+    frames = len(samples) // frame_size
+    if frames == 0:
+        return np.zeros(0, dtype=bool)
+    data = samples[:frames * frame_size].reshape(frames, frame_size).astype(np.float32)
+    data /= -INT16_MIN
+    energy = 10 * np.log10(np.mean(data * data, axis=1) + 1e-10)
+    crossings = np.mean(np.signbit(data[:, 1:]) != np.signbit(data[:, :-1]), axis=1)
+    return (energy > threshold) | ((energy > threshold - 10) & (crossings > zcr_threshold))
+
+
+class VoiceActivityDetector:
+    """
+    Energy and zero crossing rate voice activity detector of a 16 bit mono
+    PCM stream
+
+    The frames without speech are skipped, the speech is padded by padding
+    seconds at both sides so only silences longer than 2 * padding are skipped.
+    The time of the speech fed to the recognizer is mapped back to the
+    absolute time of the media with to_absolute.
+
+    Only quiet audio is skipped. Music, a music bed under the speech or
+    loud noise is above the threshold and is fed like speech, so the VAD
+    saves the most on audio with long silences, like podcasts and lectures.
+    """
+
+    def __init__(self, sample_rate = 16000, threshold = -45.0, padding = 0.3,
+                 frame = 0.02):
+        """Init voice activity detector"""
+        self.__sample_rate = sample_rate
+        self.__threshold = float(threshold)
+        self.__frame_size = max(1, int(frame * sample_rate))
+        self.__padding = max(0, int(round(padding * sample_rate / self.__frame_size)))
+        self.__buffer = b""
+        self.__position = 0 # first frame of the buffer
+        self.__last_speech = -1 - self.__padding # last frame with speech
+        self.__fed = 0 # samples fed
+        self.__total = 0 # bytes read
+        self.__is_skipping = False
+        # fed time and absolute time of each speech after a skip, in samples
+        self.__fed_starts = [0]
+        self.__absolute_starts = [0]
+
+    def get_sample_rate(self):
+        """Get sample rate"""
+        return self.__sample_rate
+
+    def get_threshold(self):
+        """Get energy threshold in dBFS"""
+        return self.__threshold
+
+    def get_skipped_seconds(self):
+        """Get seconds skipped"""
+        return (self.__total // 2 - self.__fed) / self.__sample_rate
+
+    def get_skipped_fraction(self):
+        """Get fraction of the audio skipped, 0.0 to 1.0"""
+        total = self.__total // 2
+        return (total - self.__fed) / total if total else 0.0
+
+    def get_breakpoints(self):
+        """Get list of (fed, absolute) seconds where the speech starts after a skip"""
+        return [(fed / self.__sample_rate, absolute / self.__sample_rate)
+                for fed, absolute in zip(self.__fed_starts, self.__absolute_starts)]
+
+    def to_absolute(self, time, is_end = False):
+        """
+        Return the absolute time in seconds of the fed time in seconds,
+        is_end keeps the end of a word at a skip before the skip
+        """
+        sample = time * self.__sample_rate
+        if is_end:
+            index = bisect.bisect_left(self.__fed_starts, sample) - 1
+        else:
+            index = bisect.bisect_right(self.__fed_starts, sample) - 1
+        index = max(0, index)
+        return (sample - self.__fed_starts[index] + self.__absolute_starts[index]) / self.__sample_rate
+
+    def __add_breakpoint(self, absolute):
+        """Add breakpoint, the next fed sample is the absolute sample"""
+        if self.__fed_starts[-1] == self.__fed:
+            self.__absolute_starts[-1] = absolute
+        else:
+            self.__fed_starts.append(self.__fed)
+            self.__absolute_starts.append(absolute)
+
+    def __decide(self, frames, speech, is_last):
+        """Return the bytes of the kept frames, the decided frames leave the buffer"""
+        size = self.__frame_size
+        decided = frames if is_last else max(0, frames - self.__padding)
+        if decided == 0:
+            return b""
+
+        # speech is padded at both sides, inside the buffer by convolution,
+        # before the buffer by the last frame with speech
+        width = 2 * self.__padding + 1
+        kept = np.convolve(speech.astype(np.int32), np.ones(width, dtype=np.int32)
+                           )[self.__padding:self.__padding + decided] > 0
+        kept[:max(0, self.__last_speech + self.__padding + 1 - self.__position)] = True
+        if np.any(speech[:decided]):
+            self.__last_speech = self.__position + int(np.flatnonzero(speech[:decided])[-1])
+
+        # runs of kept frames, start and end
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], kept.astype(np.int8), [0]))))
+        output = []
+        for start, end in edges.reshape(-1, 2).tolist():
+            if start > 0 or self.__is_skipping:
+                self.__add_breakpoint((self.__position + start) * size)
+            self.__fed += (end - start) * size
+            output.append(self.__buffer[start * size * 2:end * size * 2])
+        self.__is_skipping = not kept[-1]
+
+        self.__buffer = self.__buffer[decided * size * 2:]
+        self.__position += decided
+        return b"".join(output)
+
+    def feed(self, data, is_last = False):
+        """
+        Return the bytes of speech of the data, 16 bit mono PCM,
+        the frames are returned once padding seconds after them are read
+        """
+        self.__buffer += data
+        self.__total += len(data)
+        samples = np.frombuffer(self.__buffer[:len(self.__buffer) // 2 * 2], dtype=np.int16)
+        speech = get_speech_frames(samples, self.__frame_size, self.__threshold)
+        output = self.__decide(len(speech), speech, is_last)
+        if is_last:
+            # the samples after the last full frame
+            tail = self.__buffer[:len(self.__buffer) // 2 * 2]
+            self.__buffer = b""
+            if len(tail) > 0 and not self.__is_skipping:
+                self.__fed += len(tail) // 2
+                output += tail
+        return output
+
+    def filter(self, chunks):
+        """Yield the bytes of speech of the chunks of 16 bit mono PCM"""
+        for data in chunks:
+            output = self.feed(data)
+            if len(output) > 0:
+                yield output
+        output = self.feed(b"", True)
+        if len(output) > 0:
+            yield output
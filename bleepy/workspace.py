@@ -0,0 +1,236 @@
+"""
+Workspace of bleepy
+
+Each job of ProfanityBlocker writes its intermediate files, like the
+segments of the smart engine or the audio of the remux engine, in its own
+workspace directory. The directory is removed when the job ends, on
+success, failure or interrupt, and the bytes the job can write are
+reserved first, so concurrent jobs never collide or fill the disk.
+
+The reservations are kept in a file of the root directory, locked while
+it is changed, so the jobs of other processes like the batch workers
+see them too.
+"""
+import atexit
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt # pylint: disable=import-error
+
+RESERVATIONS_FILE = ".bleepy-reservations.json"
+RESERVATIONS_LOCK_FILE = ".bleepy-reservations.lock"
+RESERVED_LOCK = threading.Lock()
+WORKSPACES = weakref.WeakSet()
+
+
+def get_ram_directory():
+    """Return /dev/shm if it can be written (RAM backed), else the temp directory"""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+def is_process_running(pid):
+    """Return boolean if the process is running"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+@contextlib.contextmanager
+def lock_reservations(root):
+    """
+    Lock the reservations of the root for every process and yield them,
+    dict of workspace name to pid and bytes. The changes are saved.
+    The reservations of stopped processes are removed.
+    """
+    with RESERVED_LOCK, open(os.path.join(root, RESERVATIONS_LOCK_FILE), "a+b") as lockfile:
+        if fcntl is not None:
+            fcntl.flock(lockfile.fileno(), fcntl.LOCK_EX)
+        else:
+            lockfile.seek(0)
+            msvcrt.locking(lockfile.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            path = os.path.join(root, RESERVATIONS_FILE)
+            try:
+                with open(path, encoding="utf-8") as reservationsfile:
+                    reservations = json.load(reservationsfile)
+            except (OSError, ValueError):
+                reservations = {}
+            reservations = {name: entry for name, entry in reservations.items()
+                            if is_process_running(entry["pid"])
+                            and os.path.isdir(os.path.join(root, name))}
+            yield reservations
+            temp = f"{path}.{os.getpid()}.tmp"
+            with open(temp, "w", encoding="utf-8") as reservationsfile:
+                json.dump(reservations, reservationsfile)
+            os.replace(temp, path)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lockfile.fileno(), fcntl.LOCK_UN)
+            else:
+                lockfile.seek(0)
+                msvcrt.locking(lockfile.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def remove_stale_workspaces(root, prefix = "bleepy-"):
+    """
+    Remove the workspaces of the processes that are not running anymore,
+    left by a killed process. Return the number of workspaces removed.
+    """
+    removed = 0
+    if not os.path.isdir(root):
+        return removed
+    for entry in os.scandir(root):
+        parts = entry.name[len(prefix):].split("-", 1)
+        if (not entry.is_dir() or not entry.name.startswith(prefix)
+                or not parts[0].isdigit()):
+            continue
+        if int(parts[0]) != os.getpid() and not is_process_running(int(parts[0])):
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+class Workspace:
+    """
+    Workspace, directory of the intermediate files of one job
+
+    root = directory where the workspace is made, "" for the temp directory,
+    get_ram_directory() for RAM backed storage
+
+    budget = bytes the workspace can reserve, 0 for no limit,
+    the free space of the disk is always a limit
+
+    Use it with "with", the directory is removed at the end
+    """
+
+    def __init__(self, root = "", budget = 0, prefix = "bleepy-"):
+        """Init workspace"""
+        self.__root = root or tempfile.gettempdir()
+        self.__budget = int(budget)
+        self.__prefix = prefix
+        self.__directory = ""
+        self.__reserved = 0
+
+    def get_root(self):
+        """Get root directory"""
+        return self.__root
+
+    def get_budget(self):
+        """Get bytes the workspace can reserve, 0 for no limit"""
+        return self.__budget
+
+    def get_reserved(self):
+        """Get bytes reserved"""
+        return self.__reserved
+
+    def get_directory(self):
+        """Get directory of the workspace, with / at the end"""
+        return self.__directory
+
+    def get_size(self):
+        """Get bytes used by the files of the workspace"""
+        return sum(entry.stat().st_size for entry in os.scandir(self.__directory)
+                   if entry.is_file())
+
+    def open(self):
+        """Make the directory of the workspace, unique for each job"""
+        if self.__directory == "":
+            os.makedirs(self.__root, exist_ok=True)
+            directory = tempfile.mkdtemp(prefix=f"{self.__prefix}{os.getpid()}-",
+                                         dir=self.__root)
+            self.__directory = os.path.join(directory, "")
+            WORKSPACES.add(self)
+        return self
+
+    def get_name(self):
+        """Get name of the workspace directory in the root"""
+        return os.path.basename(os.path.dirname(self.__directory))
+
+    def path(self, name):
+        """Return path of the file name in the workspace"""
+        return f"{self.__directory}{name}"
+
+    def reserve(self, size):
+        """
+        Reserve bytes before writing them, return False if the budget
+        or the free space of the disk is not enough
+        """
+        size = int(size)
+        if self.__budget > 0 and self.__reserved + size > self.__budget:
+            return False
+        with lock_reservations(self.__root) as reservations:
+            others = sum(entry["size"] for name, entry in reservations.items()
+                         if name != self.get_name())
+            if size > shutil.disk_usage(self.__directory).free - others:
+                return False
+            self.__reserved += size
+            reservations[self.get_name()] = {"pid": os.getpid(), "size": self.__reserved}
+        return True
+
+    def release(self):
+        """Release the bytes reserved"""
+        if self.__reserved > 0:
+            with lock_reservations(self.__root) as reservations:
+                reservations.pop(self.get_name(), None)
+            self.__reserved = 0
+
+    def write_text(self, name, text):
+        """Write the text file in one write, return its path"""
+        path = self.path(name)
+        with open(path, "w", encoding="utf-8") as txtfile:
+            txtfile.write(text)
+        return path
+
+    def remove(self, path):
+        """Remove a file of the workspace if it exist"""
+        if os.path.exists(path):
+            os.remove(path)
+
+    def cleanup(self):
+        """
+        Remove the workspace, it is renamed first so a half removed
+        workspace is never used
+        """
+        self.release()
+        if self.__directory == "":
+            return
+        directory = os.path.dirname(self.__directory)
+        removed = f"{directory}.removed{time.time_ns()}"
+        try:
+            os.rename(directory, removed)
+        except OSError:
+            removed = directory
+        shutil.rmtree(removed, ignore_errors=True)
+        self.__directory = ""
+        WORKSPACES.discard(self)
+
+    def __enter__(self):
+        """Open the workspace"""
+        return self.open()
+
+    def __exit__(self, *args):
+        """Remove the workspace"""
+        self.cleanup()
+
+
+@atexit.register
+def cleanup_workspaces():
+    """Remove the workspaces still open when the process exit"""
+    for workspace in list(WORKSPACES):
+        workspace.cleanup()
@@ -0,0 +1,119 @@
+"""Tests of the TranscriptCache"""
+import os
+
+import pytest
+
+from bleepy import ProfanityExtractor, TranscriptCache, get_lexicon
+
+
+@pytest.fixture(name="cache")
+def fixture_cache(tmp_path):
+    """Return empty cache in a temporary directory"""
+    return TranscriptCache(str(tmp_path / "cache"))
+
+
+@pytest.fixture(name="media")
+def fixture_media(tmp_path):
+    """Return file name of a media file"""
+    media = tmp_path / "video.mp4"
+    media.write_bytes(b"media content")
+    return str(media)
+
+
+def test_results_miss_then_hit(cache, media):
+    assert cache.get_results(media, "model", 16000) is None
+    cache.put_results(media, "model", 16000, ['{"text": "hello"}'])
+    assert cache.get_results(media, "model", 16000) == ['{"text": "hello"}']
+    assert (cache.get_hits(), cache.get_misses()) == (1, 1)
+
+
+def test_results_key_is_the_content(cache, media, tmp_path):
+    cache.put_results(media, "model", 16000, ["first"])
+    assert cache.get_results(media, "model", 8000) is None
+    assert cache.get_results(media, "other model", 16000) is None
+    assert cache.get_results(media, "model", 16000, "grammar0123") is None
+
+    copy = tmp_path / "copy.mp4"
+    copy.write_bytes(b"media content")
+    assert cache.get_results(str(copy), "model", 16000) == ["first"]
+
+    with open(media, "ab") as file:
+        file.write(b" changed")
+    os.utime(media, ns=(0, 0)) # a new modified time, so it is hashed again
+    assert cache.get_results(media, "model", 16000) is None
+
+
+def test_detections(cache):
+    digest = cache.results_digest(["result"], "english", 0.5)
+    assert digest != cache.results_digest(["result"], "tagalog", 0.5)
+    assert digest != cache.results_digest(["result"], "english", 0.6)
+    assert cache.get_detections(digest) is None
+    cache.put_detections(digest, [{"word": "fuck", "start": 1.0, "end": 1.2}])
+    assert cache.get_detections(digest) == [{"word": "fuck", "start": 1.0, "end": 1.2}]
+
+
+def get_entries(cache):
+    """Return set of the entry paths of the cache"""
+    return {os.path.join(root, name) for root, _, names in os.walk(cache.get_directory())
+            for name in names}
+
+
+def test_least_recently_used_is_evicted(cache, tmp_path):
+    files = []
+    for index in range(3):
+        media = tmp_path / f"video{index}.mp4"
+        media.write_bytes(f"media {index}".encode())
+        files.append(str(media))
+        entries = get_entries(cache)
+        cache.put_results(str(media), "model", 16000, ["x" * 100])
+        for path in get_entries(cache) - entries:
+            os.utime(path, (1000 + index, 1000 + index))
+    # the first file is used last
+    cache.get_results(files[0], "model", 16000)
+
+    cache.set_max_size(cache.get_size() - 1)
+    assert cache.get_results(files[1], "model", 16000) is None
+    assert cache.get_results(files[0], "model", 16000) is not None
+    assert cache.get_results(files[2], "model", 16000) is not None
+
+
+def test_invalidate_model_removes_its_variants(cache, media):
+    cache.put_results(media, "model", 16000, ["full"])
+    cache.put_results(media, "model", 16000, ["spotting"], "grammar0123")
+    cache.put_results(media, "other model", 16000, ["other"])
+    cache.invalidate_model("model")
+    assert cache.get_results(media, "model", 16000) is None
+    assert cache.get_results(media, "model", 16000, "grammar0123") is None
+    assert cache.get_results(media, "other model", 16000) == ["other"]
+
+
+def test_clear(cache, media):
+    cache.put_results(media, "model", 16000, ["full"])
+    cache.clear()
+    assert cache.get_size() == 0
+    assert cache.get_results(media, "model", 16000) is None
+
+
+def test_detections_key_has_the_lexicon(cache):
+    digest = cache.results_digest(["result"], "english", 0.5)
+    assert digest != cache.results_digest(["result"], "english", 0.5, "lexicon digest")
+
+
+def test_lexicon_change_is_not_served_from_the_cache(cache):
+    results = ['{"result": [{"word": "the", "start": 0.0, "end": 0.2},'
+               ' {"word": "frak", "start": 0.3, "end": 0.6}]}']
+    lexicon = get_lexicon()
+    try:
+        lexicon.add_clean(["frak"])
+        extractor = ProfanityExtractor()
+        extractor.set_cache(cache)
+        extractor.run(results)
+        assert extractor.get_profanities() == []
+
+        lexicon.add_profane(["frak"])
+        extractor = ProfanityExtractor()
+        extractor.set_cache(cache)
+        extractor.run(results)
+        assert [word.word for word in extractor.get_profanities()] == ["frak"]
+    finally:
+        lexicon.remove(["frak"])
@@ -0,0 +1,63 @@
+"""Tests of the EditDecisionList"""
+import json
+
+import pytest
+
+from bleepy import EditDecisionList, WordRecord
+
+
+def get_profanities():
+    """Return profanities, not sorted"""
+    return [WordRecord("gago", 3.25, 3.75, 0.9, "tagalog", 0.87),
+            WordRecord("fuck", 1.0, 1.5, 1.0, "english", 1.0)]
+
+
+def test_json_round_trip(tmp_path):
+    file = str(tmp_path / "video.edl.json")
+    EditDecisionList("video.mp4", get_profanities()).save(file)
+    with open(file, encoding="utf-8") as edlfile:
+        assert json.load(edlfile)["version"] == 1
+
+    edl = EditDecisionList()
+    edl.load(file)
+    assert edl.get_media() == "video.mp4"
+    assert [word.to_dict() for word in edl.get_profanities()] == [
+        word.to_dict() for word in sorted(get_profanities(), key=lambda word: word.start)]
+
+
+def test_srt_round_trip_keeps_words_and_times(tmp_path):
+    file = str(tmp_path / "video.srt")
+    EditDecisionList("video.mp4", get_profanities()).save(file)
+
+    edl = EditDecisionList()
+    edl.load(file)
+    assert [(word.word, word.start, word.end) for word in edl.get_profanities()] == [
+        ("fuck", 1.0, 1.5), ("gago", 3.25, 3.75)]
+
+
+def test_edited_srt_is_loaded(tmp_path):
+    file = tmp_path / "video.srt"
+    file.write_text("1\n00:00:02,000 --> 00:00:02,400\nshit added by a reviewer\n\n",
+                    encoding="utf-8")
+    edl = EditDecisionList()
+    edl.load(str(file))
+    assert [(word.word, word.start, word.end) for word in edl.get_profanities()] == [
+        ("shit", 2.0, 2.4)]
+
+
+def test_vtt_is_saved_but_not_loaded(tmp_path):
+    file = str(tmp_path / "video.vtt")
+    EditDecisionList("video.mp4", get_profanities()).save(file)
+    with open(file, encoding="utf-8") as vttfile:
+        lines = vttfile.read().splitlines()
+    assert lines[0] == "WEBVTT"
+    assert lines[2] == "00:00:01.000 --> 00:00:01.500"
+    assert lines[3] == "fuck (english 1.00)"
+
+    with pytest.raises(SystemExit):
+        EditDecisionList().load(file)
+
+
+def test_missing_file_exits(tmp_path):
+    with pytest.raises(SystemExit):
+        EditDecisionList().load(str(tmp_path / "missing.edl.json"))
@@ -0,0 +1,94 @@
+"""Tests of BleepIntervals and the filter_complex made from its spans"""
+import pytest
+
+from bleepy import BleepIntervals, ProfanityBlocker, WordRecord
+
+
+def test_spans_are_sorted_and_merged():
+    intervals = BleepIntervals(merge_gap=0.1)
+    intervals.add(5.0, 5.5)
+    intervals.add(1.0, 1.5)
+    intervals.add(1.4, 2.0) # overlap
+    intervals.add(2.05, 2.5) # gap under merge_gap
+    intervals.add(3.0, 3.2) # gap over merge_gap
+    assert list(intervals) == [(1.0, 2.5), (3.0, 3.2), (5.0, 5.5)]
+    assert len(intervals) == 3
+
+
+def test_padding_merges_close_spans_and_is_clamped():
+    intervals = BleepIntervals(pre_padding=0.2, post_padding=0.3, merge_gap=0.0,
+                               duration=4.0)
+    intervals.add(0.1, 0.5)
+    intervals.add(0.9, 1.0) # 0.7 after padding, overlaps 0.8
+    intervals.add(3.9, 3.95)
+    assert intervals.get_spans().ravel().tolist() == pytest.approx([0.0, 1.3, 3.7, 4.0])
+
+
+def test_empty_span_after_clamp_is_dropped():
+    intervals = BleepIntervals(duration=2.0)
+    intervals.add(2.5, 3.0)
+    assert len(intervals) == 0
+    assert intervals.get_bleeped_duration() == 0.0
+
+
+def test_is_bleeped_and_duration():
+    intervals = BleepIntervals(merge_gap=0.0)
+    intervals.extend([WordRecord("a", 1.0, 2.0), WordRecord("b", 4.0, 4.5)])
+    assert intervals.is_bleeped(1.0)
+    assert intervals.is_bleeped(1.99)
+    assert not intervals.is_bleeped(2.0)
+    assert not intervals.is_bleeped(0.5)
+    assert intervals.is_bleeped(4.25)
+    assert not intervals.is_bleeped(5.0)
+    assert intervals.get_bleeped_duration() == 1.5
+
+
+def test_spans_are_rebuilt_after_add():
+    intervals = BleepIntervals(merge_gap=0.0)
+    intervals.add(1.0, 2.0)
+    assert len(intervals) == 1
+    intervals.add(1.5, 3.0)
+    assert list(intervals) == [(1.0, 3.0)]
+
+
+def test_filter_complex_without_spans_copies_audio():
+    assert ProfanityBlocker().get_filter_complex([]) == "[0:a]anull[aout]"
+
+
+def test_filter_complex_of_one_span():
+    graph = ProfanityBlocker().get_filter_complex([(1.2, 1.5)])
+    assert graph == ("[0:a]volume=0:enable='between(t,1.200,1.500)'[muted];"
+                     "[1:a]anull[b0];"
+                     "[b0]atrim=duration=0.300,asetpts=PTS-STARTPTS,adelay=1200:all=1[d0];"
+                     "[muted][d0]amix=inputs=2:duration=first:dropout_transition=0"
+                     ":normalize=0[aout]")
+
+
+def test_filter_complex_of_many_spans():
+    graph = ProfanityBlocker().get_filter_complex([(1.2, 1.5), (3.0, 3.25)], 2, 0)
+    filters = graph.split(";")
+    assert filters[0] == ("[2:a]volume=0:enable="
+                          "'between(t,1.200,1.500)+between(t,3.000,3.250)'[muted]")
+    assert filters[1] == "[0:a]asplit=2[b0][b1]"
+    assert "atrim=duration=0.250" in filters[3] and "adelay=3000:all=1[d1]" in filters[3]
+    assert filters[-1].startswith("[muted][d0][d1]amix=inputs=3:")
+
+
+class Bleep:
+    """Bleep sound of a known duration, not probed"""
+
+    def get_file(self):
+        return "bleep.mp3"
+
+    def get_duration(self):
+        return 0.5
+
+
+def test_bleep_is_looped_a_finite_number_of_times():
+    blocker = ProfanityBlocker()
+    blocker.set_audio(Bleep())
+    assert blocker.get_bleep_input_args([]) == ["-stream_loop", "0", "-i", "bleep.mp3"]
+    assert blocker.get_bleep_input_args([(1.0, 1.4)]) == [
+        "-stream_loop", "1", "-i", "bleep.mp3"]
+    assert blocker.get_bleep_input_args([(1.0, 1.4), (3.1, 4.3)]) == [
+        "-stream_loop", "3", "-i", "bleep.mp3"]
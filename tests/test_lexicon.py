@@ -0,0 +1,82 @@
+"""Tests of the Lexicon and its fast path in the ProfanityDetector"""
+from bleepy import Lexicon, ProfanityDetector, WordRecord
+
+
+def test_built_in_words_and_their_variants():
+    lexicon = Lexicon()
+    for word in ("fuck", "fucking", "motherfucker", "bullshit"):
+        assert lexicon.lookup(word) == 1.0
+    for word in ("putangina", "tanginamo", "gago"):
+        assert lexicon.lookup(word, "tagalog") == 1.0
+    assert lexicon.lookup("the") == 0.0
+    assert lexicon.lookup("unknownword") is None
+
+
+def test_lookup_is_normalized():
+    lexicon = Lexicon()
+    assert lexicon.lookup("FUCK") == 1.0
+    assert lexicon.lookup("  Shit ") == 1.0
+    lexicon.add_profane([" Frak "])
+    assert lexicon.lookup("frak") == 1.0
+
+
+def test_languages_are_separate():
+    lexicon = Lexicon(defaults=False)
+    lexicon.add_profane(["gago"], "tagalog")
+    assert lexicon.lookup("gago", "tagalog") == 1.0
+    assert lexicon.lookup("gago", "english") is None
+
+
+def test_profane_and_clean_override_each_other():
+    lexicon = Lexicon(defaults=False)
+    lexicon.add_profane(["bloody"])
+    lexicon.add_clean(["bloody"])
+    assert lexicon.lookup("bloody") == 0.0
+    assert "bloody" not in lexicon.get_profane()
+    lexicon.add_profane(["bloody"])
+    assert lexicon.lookup("bloody") == 1.0
+    lexicon.remove(["bloody"])
+    assert lexicon.lookup("bloody") is None
+
+
+def test_hits_and_misses():
+    lexicon = Lexicon()
+    lexicon.lookup("fuck")
+    lexicon.lookup("the")
+    lexicon.lookup("unknownword")
+    assert (lexicon.get_hits(), lexicon.get_misses()) == (2, 1)
+
+
+def test_load_words_and_save_load(tmp_path):
+    words = tmp_path / "words.txt"
+    words.write_text("frak # from a series\n\nGorram\n", encoding="utf-8")
+    lexicon = Lexicon(defaults=False)
+    lexicon.load_words(str(words))
+    lexicon.add_clean(["shiny"])
+    assert lexicon.get_profane() == {"frak", "gorram"}
+
+    saved = tmp_path / "lexicon.json.gz"
+    lexicon.save(str(saved))
+    loaded = Lexicon(defaults=False)
+    loaded.load(str(saved))
+    assert loaded.to_dict() == lexicon.to_dict()
+
+
+def test_detector_decides_known_words_without_the_classifier():
+    detector = ProfanityDetector()
+    detector.set_lexicon(Lexicon())
+    words = [WordRecord("the", 0.0, 0.2), WordRecord("Fuck", 0.3, 0.6),
+             WordRecord("and", 0.7, 0.8)]
+    profanities = detector.extract_profanity(words)
+    assert [(word.word, word.lang, word.predict_prob) for word in profanities] == [
+        ("Fuck", "english", 1.0)]
+
+
+def test_digest_changes_with_the_words_of_the_languages():
+    lexicon = Lexicon()
+    digest = lexicon.get_digest(("english",))
+    assert digest == Lexicon().get_digest(("english",))
+    lexicon.add_profane(["gago"], "tagalog")
+    assert lexicon.get_digest(("english",)) == digest
+    lexicon.add_profane(["frak"])
+    assert lexicon.get_digest(("english",)) != digest
@@ -0,0 +1,58 @@
+"""Tests of the LiveBleeper"""
+import json
+import sys
+
+import numpy as np
+
+from bleepy import LiveBleeper, get_model_registry
+from bleepy import bleepy as core
+
+
+class Recognizer:
+    """Recognizer that never hears a word"""
+
+    def __init__(self, model, sample_rate, *grammar):
+        self.model = model
+
+    def SetWords(self, enabled): # pylint: disable=invalid-name
+        pass
+
+    def SetPartialWords(self, enabled): # pylint: disable=invalid-name
+        pass
+
+    def AcceptWaveform(self, data): # pylint: disable=invalid-name
+        return False
+
+    def PartialResult(self): # pylint: disable=invalid-name
+        return json.dumps({"partial_result": []})
+
+    def FinalResult(self): # pylint: disable=invalid-name
+        return json.dumps({"result": []})
+
+
+class Vosk:
+    """Vosk module of the Recognizer"""
+    Model = staticmethod(lambda model: model)
+    KaldiRecognizer = Recognizer
+
+
+def test_stdout_holds_only_pcm(tmp_path, monkeypatch, capfdbinary):
+    pcm = (np.arange(16000, dtype=np.int16) % 200 - 100).tobytes()
+    source = tmp_path / "source.raw"
+    source.write_bytes(pcm)
+    monkeypatch.setattr(core, "get_vosk", Vosk)
+    monkeypatch.setattr(LiveBleeper, "get_live_cmd", lambda self, source: [
+        sys.executable, "-c",
+        f"import sys; sys.stdout.buffer.write(open({source!r}, 'rb').read())"])
+
+    model = str(tmp_path / "model")
+    (tmp_path / "model").mkdir()
+    bleeper = LiveBleeper(model, delay=0.5)
+    try:
+        bleeper.run(str(source), "-")
+    finally:
+        get_model_registry().unload(model)
+
+    captured = capfdbinary.readouterr()
+    assert captured.out == pcm
+    assert b"Loading Model" in captured.err
@@ -0,0 +1,25 @@
+"""Tests of the PCM helpers and the samples of the pcm engine"""
+import numpy as np
+
+from bleepy import ProfanityBlocker
+from bleepy.pcm import apply_bleep
+
+
+def test_apply_bleep_mutes_only_the_range():
+    pcm = np.full((10, 2), 1000, dtype=np.int16)
+    apply_bleep(pcm, 2, 5)
+    assert pcm[:, 0].tolist() == [1000, 1000, 0, 0, 0, 1000, 1000, 1000, 1000, 1000]
+
+
+def test_release_pcm_unmaps_before_the_file_is_removed(tmp_path):
+    memmap = str(tmp_path / "pcm.raw")
+    np.zeros(8, dtype=np.int16).tofile(memmap)
+    pcm = np.memmap(memmap, dtype=np.int16, mode="r+").reshape(-1, 2)
+    mapped = getattr(pcm, "_mmap")
+    ProfanityBlocker().release_pcm(pcm, memmap)
+    assert mapped.closed
+    assert not (tmp_path / "pcm.raw").exists()
+
+
+def test_release_pcm_in_memory():
+    ProfanityBlocker().release_pcm(np.zeros((4, 1), dtype=np.int16), "")
@@ -0,0 +1,61 @@
+"""Tests of the VoiceActivityDetector and its mapping to the absolute time"""
+import numpy as np
+import pytest
+
+from bleepy.pcm import VoiceActivityDetector, get_speech_frames, sine_tone
+
+SAMPLE_RATE = 16000
+
+
+def get_pcm(*parts):
+    """Return mono PCM of (seconds, is_tone) parts"""
+    return np.concatenate([
+        sine_tone(int(seconds * SAMPLE_RATE), SAMPLE_RATE, 1, 440.0)[:, 0] if is_tone
+        else np.zeros(int(seconds * SAMPLE_RATE), dtype=np.int16)
+        for seconds, is_tone in parts])
+
+
+def run_vad(pcm, chunk = 0.1):
+    """Return the VAD and the bytes it fed, pcm is read in chunks of seconds"""
+    vad = VoiceActivityDetector(SAMPLE_RATE, padding=0.3)
+    data = pcm.tobytes()
+    size = int(chunk * SAMPLE_RATE) * 2
+    fed = b"".join(vad.filter(data[i:i + size] for i in range(0, len(data), size)))
+    return vad, fed
+
+
+def test_speech_frames():
+    pcm = get_pcm((0.1, True), (0.1, False))
+    assert get_speech_frames(pcm, 320).tolist() == [True] * 5 + [False] * 5
+
+
+def test_silence_is_skipped_and_mapped_back():
+    # speech 0-1s, silence 1-3s, speech 3-4s
+    vad, fed = run_vad(get_pcm((1.0, True), (2.0, False), (1.0, True)))
+    # the padded speech 0-1.3s and 2.7-4s is fed
+    assert len(fed) // 2 / SAMPLE_RATE == pytest.approx(2.6)
+    assert vad.get_skipped_seconds() == pytest.approx(1.4)
+    assert vad.get_skipped_fraction() == pytest.approx(0.35)
+    assert vad.get_breakpoints() == pytest.approx([(0.0, 0.0), (1.3, 2.7)])
+
+    assert vad.to_absolute(0.5) == pytest.approx(0.5)
+    assert vad.to_absolute(1.5) == pytest.approx(2.9)
+    # a word that starts at the skip starts after it,
+    # a word that ends at the skip ends before it
+    assert vad.to_absolute(1.3) == pytest.approx(2.7)
+    assert vad.to_absolute(1.3, is_end=True) == pytest.approx(1.3)
+
+
+def test_short_silence_is_kept():
+    vad, fed = run_vad(get_pcm((1.0, True), (0.4, False), (1.0, True)))
+    assert len(fed) // 2 / SAMPLE_RATE == pytest.approx(2.4)
+    assert vad.get_skipped_seconds() == 0.0
+    assert vad.to_absolute(2.0) == pytest.approx(2.0)
+
+
+def test_chunk_size_does_not_change_the_mapping():
+    pcm = get_pcm((0.5, False), (1.0, True), (2.0, False), (0.7, True), (1.0, False))
+    small, small_fed = run_vad(pcm, 0.02)
+    large, large_fed = run_vad(pcm, 1.0)
+    assert small_fed == large_fed
+    assert small.get_breakpoints() == large.get_breakpoints()